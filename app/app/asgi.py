@@ -2,6 +2,8 @@
 ASGI config for app project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Sync code of every request runs on a bounded number of threads, see
+core/asgi.py.
 
 For more information on this file, see
 https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
@@ -9,8 +11,20 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
+from core.asgi import (SyncChainHandler, ThreadPoolApplication)
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'app.settings')
 
-application = get_asgi_application()
+# sets django up, serves the async views
+async_application = get_asgi_application()
+
+application = ThreadPoolApplication(
+    SyncChainHandler(),
+    threads=settings.ASGI['THREADS'],
+    buffer_size=settings.ASGI['BUFFER_SIZE'],
+    buffer_total=settings.ASGI['BUFFER_TOTAL'],
+    async_application=async_application,
+)
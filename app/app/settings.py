@@ -37,6 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     'core',
     'rest_framework',
     'rest_framework.authtoken',
@@ -47,6 +48,7 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -90,6 +92,83 @@ DATABASES = {
 }
 
 
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    # per user response cache of the recipe api, see recipe/cache.py
+    'api': {
+        'BACKEND': os.environ.get(
+            'API_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get('API_CACHE_LOCATION', 'recipe-api'),
+        'TIMEOUT': int(os.environ.get('API_CACHE_TIMEOUT', 300)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('API_CACHE_MAX_ENTRIES', 10000)),
+            'CULL_FREQUENCY': 3,
+        },
+    },
+    # token to user lookups, see core/authentication.py
+    'auth': {
+        'BACKEND': os.environ.get(
+            'AUTH_CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache',
+        ),
+        'LOCATION': os.environ.get('AUTH_CACHE_LOCATION', 'recipe-auth'),
+        'TIMEOUT': int(os.environ.get('AUTH_CACHE_TIMEOUT', 60)),
+        'OPTIONS': {
+            'MAX_ENTRIES': int(os.environ.get('AUTH_CACHE_MAX_ENTRIES', 10000)),
+        },
+    },
+}
+
+# background image processing, see recipe/images.py
+IMAGE_PROCESSING = {
+    # thread, process or sync
+    'BACKEND': os.environ.get('IMAGE_PROCESSING_BACKEND', 'thread'),
+    'WORKERS': int(os.environ.get('IMAGE_PROCESSING_WORKERS', 2)),
+}
+
+# resumable image uploads, see recipe/uploads.py
+UPLOAD_SESSIONS = {
+    'ROOT': os.environ.get('UPLOAD_SESSION_ROOT', '/vol/web/upload-sessions'),
+    'TTL': int(os.environ.get('UPLOAD_SESSION_TTL', 24 * 60 * 60)),
+    'MAX_SIZE': int(
+        os.environ.get('UPLOAD_SESSION_MAX_SIZE', 20 * 1024 * 1024)
+    ),
+}
+
+# asgi serving, see core/asgi.py
+ASGI = {
+    # requests running sync code at once, each on a thread of its own
+    'THREADS': int(os.environ.get('ASGI_THREADS', 32)),
+    # request body bytes received before a request takes a thread
+    'BUFFER_SIZE': int(os.environ.get('ASGI_BUFFER_SIZE', 2621440)),
+    # request body bytes buffered by all requests of a process together
+    'BUFFER_TOTAL': int(os.environ.get('ASGI_BUFFER_TOTAL', 67108864)),
+}
+
+# api response compression, see core/middleware.py
+COMPRESSION = {
+    'PATHS': ('/api/',),
+    # media type, or a prefix ending in /, to the minimum size compressed.
+    # anything not listed, like images, is sent as is
+    'TYPES': {
+        'application/json': 860,
+        'application/vnd.oai.openapi': 860,
+        'application/vnd.oai.openapi+json': 860,
+        'application/msgpack': 2048,
+        'text/': 860,
+    },
+    'GZIP_LEVEL': int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6)),
+    'BROTLI_QUALITY': int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4)),
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -139,6 +218,22 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 AUTH_USER_MODEL = 'core.User'
 REST_FRAMEWORK = {
     'DEFAULT_SCHEMA_CLASS': 'drf_spectacular.openapi.AutoSchema',
+    'DEFAULT_RENDERER_CLASSES': [
+        'core.renderers.ORJSONRenderer',
+        'core.renderers.MessagePackRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'core.parsers.ORJSONParser',
+        'core.parsers.MessagePackParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    'TEST_REQUEST_RENDERER_CLASSES': [
+        'rest_framework.renderers.MultiPartRenderer',
+        'rest_framework.renderers.JSONRenderer',
+        'core.renderers.MessagePackRenderer',
+    ],
 }
 
 SPECTACULAR_SETTINGS={
@@ -20,6 +20,7 @@ from drf_spectacular.views import (
 from django.contrib import admin
 from django.urls import path, include
 from django.conf.urls.static import static
+from django.contrib.staticfiles.urls import staticfiles_urlpatterns
 from django.conf import settings
 
 urlpatterns = [
@@ -40,3 +41,5 @@ if settings.DEBUG:
         settings.MEDIA_URL,
         document_root = settings.MEDIA_ROOT,
     )
+    # served by runserver on its own, not by uvicorn
+    urlpatterns += staticfiles_urlpatterns()
@@ -0,0 +1,139 @@
+"""
+asgi serving with a bounded number of threads for sync code
+
+django 3.2 runs the sync views and middleware of an asgi process on one
+shared thread, so requests would be served one at a time. the wrapper
+gives every request a thread of its own for its sync code, with at most
+``ASGI['THREADS']`` requests holding one at a time, which also bounds the
+database connections of a process. up to ``ASGI['BUFFER_SIZE']`` bytes of
+a request body are received before a thread is taken, so slow uploads
+wait on the event loop instead of on a thread. the requests of a process
+buffer at most ``ASGI['BUFFER_TOTAL']`` bytes together, past it they wait
+for a thread without receiving their body, so memory stays bounded however
+many requests queue up.
+
+requests for sync views go through ``SyncChainHandler``, everything else,
+like the async image variant view, through the stock async handler.
+"""
+import asyncio
+
+from asgiref.sync import (ThreadSensitiveContext, sync_to_async)
+from django.core.handlers.asgi import ASGIHandler
+from django.urls import (Resolver404, resolve)
+
+
+class SyncChainHandler(ASGIHandler):
+    """asgi handler running the middleware and view in one thread call
+
+    with an async capable middleware chain the stock handler moves every
+    middleware hook to the thread on its own, about ten switches for a
+    sync view.
+    """
+
+    def __init__(self):
+        super(ASGIHandler, self).__init__()
+        self.load_middleware()
+
+    async def get_response_async(self, request):
+        return await sync_to_async(
+            self.get_response,
+            thread_sensitive=True,
+        )(request)
+
+
+class ThreadPoolApplication:
+    """wrap a django asgi application, see the module docstring"""
+
+    def __init__(self, application, threads, buffer_size,
+                 async_application=None, buffer_total=None):
+        self.application = application
+        self.async_application = async_application
+        self.threads = threads
+        self.buffer_size = buffer_size
+        # by default as much as the requests holding a thread may buffer
+        self.buffer_total = (
+            threads * buffer_size if buffer_total is None else buffer_total
+        )
+        self._slots = None
+        # body bytes buffered by the requests of the process
+        self._buffered = 0
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self._lifespan(receive, send)
+        if scope['type'] != 'http':
+            return await self.application(scope, receive, send)
+        if self._slots is None:
+            # bound to the loop of the server, which calls us first
+            self._slots = asyncio.Semaphore(self.threads)
+        application = self.application
+        if self.async_application is not None and self.is_async_view(scope):
+            application = self.async_application
+        messages = []
+        try:
+            await self._buffer_body(receive, messages)
+            async with self._slots:
+                # sync_to_async(thread_sensitive=True) calls of the request
+                # run on one new thread, so its connection and transaction
+                # stay on it
+                async with ThreadSensitiveContext():
+                    await application(
+                        scope,
+                        self._replay(messages, receive),
+                        send,
+                    )
+        finally:
+            self._buffered -= sum(
+                len(message.get('body', b'')) for message in messages
+            )
+
+    def is_async_view(self, scope):
+        """return if the path of a request resolves to an async view"""
+        path = scope['path']
+        root_path = scope.get('root_path', '')
+        if root_path and path.startswith(root_path):
+            path = path[len(root_path):]
+        try:
+            match = resolve(path)
+        except Resolver404:
+            return False
+        return asyncio.iscoroutinefunction(match.func)
+
+    async def _buffer_body(self, receive, messages):
+        """receive the start of the body into messages
+
+        stops at the buffer size of a request or once the requests of the
+        process buffer the total, which one message may overshoot.
+        """
+        size = 0
+        while size < self.buffer_size and \
+                self._buffered < self.buffer_total:
+            message = await receive()
+            messages.append(message)
+            body_size = len(message.get('body', b''))
+            size += body_size
+            self._buffered += body_size
+            if message['type'] != 'http.request' or \
+                    not message.get('more_body', False):
+                break
+
+    @staticmethod
+    def _replay(messages, receive):
+        """return a receive callable replaying messages first"""
+        pending = iter(messages)
+
+        async def replay():
+            for message in pending:
+                return message
+            return await receive()
+        return replay
+
+    async def _lifespan(self, receive, send):
+        """acknowledge the server lifespan events, django has no hooks"""
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
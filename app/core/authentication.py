@@ -0,0 +1,42 @@
+"""
+authentication backends for the api
+"""
+import hashlib
+
+from django.core.cache import caches
+
+from rest_framework.authentication import TokenAuthentication
+
+
+AUTH_CACHE_ALIAS = 'auth'
+
+
+def token_cache_key(key):
+    """return the cache key of a token without exposing the token"""
+    return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+
+def invalidate_tokens(*keys):
+    """forget cached lookups of the given token keys"""
+    caches[AUTH_CACHE_ALIAS].delete_many([token_cache_key(k) for k in keys])
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """token authentication with a cached token to user lookup
+
+    lookups are kept in the ``auth`` cache, bounded by its TIMEOUT and
+    MAX_ENTRIES. entries are dropped when the token is deleted or the user
+    is saved, which covers deactivation and password changes; with a per
+    process backend other processes notice within TIMEOUT seconds.
+    """
+
+    def authenticate_credentials(self, key):
+        auth_cache = caches[AUTH_CACHE_ALIAS]
+        cache_key = token_cache_key(key)
+        cached = auth_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+        user, token = super().authenticate_credentials(key)
+        auth_cache.set(cache_key, (user, token))
+        return user, token
@@ -0,0 +1,154 @@
+"""
+bulk writes of recipes and their relations
+
+on postgresql new rows, m2m rows included, are streamed with COPY,
+elsewhere they are written with bulk_create. these writes bypass the model
+and m2m signals, callers send ``core.signals.recipes_bulk_changed``
+afterwards.
+"""
+import io
+
+from django.db import connection
+
+from core.models import (Recipe, normalize_name)
+
+
+# keeps IN lists below the sqlite limit on bound parameters
+BATCH_SIZE = 500
+
+
+def resolve_names(model, user, names):
+    """return a name to object map for the user, creating missing names
+
+    names are matched by their normalized form, so names differing only
+    in case or spacing share one row. missing rows are inserted with ON
+    CONFLICT DO NOTHING and read back, a row a concurrent writer inserted
+    first is read back the same as one inserted here.
+    """
+    keys = {name: normalize_name(name) for name in names}
+    # the first spelling of a new name is the one stored
+    spellings = {}
+    for name, key in keys.items():
+        spellings.setdefault(key, name)
+    spellings = list(spellings.items())
+    found = {}
+    for start in range(0, len(spellings), BATCH_SIZE):
+        batch = dict(spellings[start:start + BATCH_SIZE])
+        rows = model.objects.filter(user=user)
+        found.update(
+            (obj.normalized_name, obj)
+            for obj in rows.filter(normalized_name__in=batch)
+        )
+        missing = [key for key in batch if key not in found]
+        if not missing:
+            continue
+        model.objects.bulk_create([
+            model(user=user, name=batch[key], normalized_name=key)
+            for key in missing
+        ], ignore_conflicts=True)
+        # ignore_conflicts never returns ids, rows lost to a concurrent
+        # insert are the other writer's
+        found.update(
+            (obj.normalized_name, obj)
+            for obj in rows.filter(normalized_name__in=missing)
+        )
+    return {name: found[key] for name, key in keys.items()}
+
+
+def _csv_field(value):
+    """return a value as a COPY csv field, None as an unquoted NULL"""
+    if value is None:
+        return ''
+    # anything else is quoted, so empty strings stay apart from NULL
+    return '"' + str(value).replace('"', '""') + '"'
+
+
+def _copy(cursor, table, columns, rows):
+    """stream rows into a table with COPY"""
+    buffer = io.StringIO()
+    for row in rows:
+        buffer.write(','.join(_csv_field(value) for value in row))
+        buffer.write('\n')
+    buffer.seek(0)
+    cursor.copy_expert(
+        f'COPY {table} ({", ".join(columns)}) FROM STDIN WITH (FORMAT csv)',
+        buffer,
+    )
+
+
+def _copy_objects(model, objs):
+    """insert new rows with COPY using ids reserved from the sequence"""
+    table = model._meta.db_table
+    fields = model._meta.concrete_fields
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT nextval(pg_get_serial_sequence(%s, %s)) '
+            'FROM generate_series(1, %s)',
+            [table, model._meta.pk.column, len(objs)],
+        )
+        for obj, (pk,) in zip(objs, cursor.fetchall()):
+            obj.pk = pk
+        _copy(
+            cursor,
+            table,
+            [field.column for field in fields],
+            (
+                [
+                    field.get_db_prep_save(
+                        field.pre_save(obj, True),
+                        connection,
+                    )
+                    for field in fields
+                ]
+                for obj in objs
+            ),
+        )
+
+
+def insert_objects(model, objs):
+    """insert new rows of any model, bypassing save and its signals
+
+    ids are set on postgresql and on databases returning them from bulk
+    inserts, elsewhere callers read them back.
+    """
+    if not objs:
+        return objs
+    if connection.vendor == 'postgresql':
+        _copy_objects(model, objs)
+    else:
+        model.objects.bulk_create(objs)
+    return objs
+
+
+def insert_recipes(recipes):
+    """insert new recipes, setting their ids"""
+    if not recipes:
+        return recipes
+    if connection.vendor == 'postgresql':
+        _copy_objects(Recipe, recipes)
+    elif connection.features.can_return_rows_from_bulk_insert:
+        Recipe.objects.bulk_create(recipes)
+    else:
+        for recipe in recipes:
+            # receivers of recipes_bulk_changed account for these
+            recipe._bulk_insert = True
+            recipe.save(force_insert=True)
+    return recipes
+
+
+def link_recipes(field_name, links):
+    """insert m2m rows for new (recipe id, related id) pairs"""
+    links = list(dict.fromkeys(links))
+    if not links:
+        return
+    field = Recipe._meta.get_field(field_name)
+    through = field.remote_field.through
+    source, target = field.m2m_column_name(), field.m2m_reverse_name()
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            _copy(cursor, through._meta.db_table, [source, target], links)
+    else:
+        through.objects.bulk_create([
+            through(**{source: recipe_id, target: related_id})
+            for recipe_id, related_id in links
+        ], ignore_conflicts=True)
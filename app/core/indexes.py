@@ -0,0 +1,64 @@
+"""
+indexes django 3.2 cannot declare, rendered for each database
+
+they are declared in ``Meta.indexes`` like any other index, so migrations
+track them and sqlite table rebuilds recreate them. both index their last
+field within the leading ones, like the names of a user.
+"""
+from django.db import models
+from django.db.backends.ddl_references import (Statement, Table)
+
+
+class PrefixIndex(models.Index):
+    """case insensitive prefix index serving ``__istartswith``
+
+    postgresql compares ``UPPER(name::text) LIKE 'TEXT%'``, which needs
+    text_pattern_ops whatever the collation, sqlite ``name LIKE 'text%'``,
+    which needs a NOCASE index.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        fields = [model._meta.get_field(name) for name in self.fields]
+        if schema_editor.connection.vendor != 'postgresql':
+            return schema_editor._create_index_sql(
+                model,
+                fields=fields,
+                name=self.name,
+                col_suffixes=[''] * (len(fields) - 1) + ['COLLATE NOCASE'],
+            )
+        quote = schema_editor.quote_name
+        *leading, last = [quote(field.column) for field in fields]
+        return Statement(
+            'CREATE INDEX %(name)s ON %(table)s (%(columns)s)',
+            name=quote(self.name),
+            table=Table(model._meta.db_table, quote),
+            columns=', '.join(
+                leading + [f'upper({last}::text) text_pattern_ops'],
+            ),
+        )
+
+
+class TrigramIndex(models.Index):
+    """pg_trgm index serving ``__trigram_similar``
+
+    a gin index keeping the leading fields with btree_gin, so a query
+    filtering on them reads their trigrams only. databases without
+    trigrams get an empty partial index of the same name.
+    """
+
+    def create_sql(self, model, schema_editor, using='', **kwargs):
+        fields = [model._meta.get_field(name) for name in self.fields]
+        if schema_editor.connection.vendor != 'postgresql':
+            return schema_editor._create_index_sql(
+                model,
+                fields=fields,
+                name=self.name,
+                condition='0',
+            )
+        return schema_editor._create_index_sql(
+            model,
+            fields=fields,
+            name=self.name,
+            using=' USING gin',
+            col_suffixes=[''] * (len(fields) - 1) + ['gin_trgm_ops'],
+        )
@@ -0,0 +1,355 @@
+"""
+weighted load tests of the user and recipe apis
+
+a run draws requests from ``SCENARIOS`` by weight and sends them either in
+process through the django test client or over http to a running server.
+every scenario gets its request count, errors, throughput, latency
+percentiles and, in process, database queries per request. results are
+plain dicts, saved as json they are the baseline of later runs.
+"""
+import http.client
+import json
+import random
+import threading
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.bulk import (insert_recipes, link_recipes, resolve_names)
+from core.models import (Ingredient, Recipe, Tag)
+from core.signals import recipes_bulk_changed
+
+
+LOADTEST_EMAIL = 'loadtest@example.com'
+WORDS = (
+    'tomato', 'basil', 'garlic', 'chicken', 'rice', 'lemon', 'pepper',
+    'onion', 'butter', 'flour', 'curry', 'ginger', 'salmon', 'spinach',
+    'pasta', 'cheese', 'quick', 'roasted', 'spicy', 'vegan', 'soup',
+)
+TAG_COUNT = 20
+INGREDIENT_COUNT = 60
+# latency changes below this are noise, whatever the threshold
+MIN_LATENCY_DELTA_MS = 1.0
+# percentiles of fewer requests are not compared
+MIN_SAMPLES = 20
+
+
+def _title(rng, words):
+    """return a random title cased name"""
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).title()
+
+
+def _recipe_payload(fixture, rng):
+    """return the payload of a new recipe"""
+    return {
+        'title': _title(rng, 3),
+        'time_minutes': rng.randint(5, 180),
+        'price': f'{rng.randint(100, 5000) / 100:.2f}',
+        'tags': [{'name': n} for n in rng.sample(fixture['tags'], 2)],
+        'ingredients': [
+            {'name': n} for n in rng.sample(fixture['ingredients'], 4)
+        ],
+    }
+
+
+def _recipe_detail(fixture, rng):
+    return reverse('recipe:recipe-detail', args=[
+        rng.choice(fixture['recipe_ids']),
+    ])
+
+
+SCENARIOS = {
+    # name: (default weight, request of (method, path, data))
+    'user-me': (5, lambda f, rng: ('GET', reverse('user:me'), None)),
+    'user-update': (1, lambda f, rng: (
+        'PATCH',
+        reverse('user:me'),
+        {'name': _title(rng, 2)},
+    )),
+    'user-token': (1, lambda f, rng: (
+        'POST',
+        reverse('user:token'),
+        {'email': f['email'], 'password': f['password']},
+    )),
+    'recipe-list': (25, lambda f, rng: (
+        'GET',
+        reverse('recipe:recipe-list'),
+        None,
+    )),
+    'recipe-search': (5, lambda f, rng: (
+        'GET',
+        f'{reverse("recipe:recipe-list")}?search={rng.choice(WORDS)}',
+        None,
+    )),
+    'recipe-detail': (20, lambda f, rng: (
+        'GET',
+        _recipe_detail(f, rng),
+        None,
+    )),
+    'recipe-create': (5, lambda f, rng: (
+        'POST',
+        reverse('recipe:recipe-list'),
+        _recipe_payload(f, rng),
+    )),
+    'recipe-update': (5, lambda f, rng: (
+        'PATCH',
+        _recipe_detail(f, rng),
+        {'title': _title(rng, 3)},
+    )),
+    'recipe-stats': (3, lambda f, rng: (
+        'GET',
+        reverse('recipe:stats'),
+        None,
+    )),
+    'tag-list': (10, lambda f, rng: ('GET', reverse('recipe:tag-list'), None)),
+    'tag-suggest': (5, lambda f, rng: (
+        'GET',
+        f'{reverse("recipe:tag-suggest")}?q={rng.choice(f["tags"])[:2]}',
+        None,
+    )),
+    'ingredient-list': (10, lambda f, rng: (
+        'GET',
+        reverse('recipe:ingredient-list'),
+        None,
+    )),
+    'ingredient-suggest': (5, lambda f, rng: (
+        'GET',
+        f'{reverse("recipe:ingredient-suggest")}'
+        f'?q={rng.choice(f["ingredients"])[:3]}',
+        None,
+    )),
+}
+
+
+def create_fixture(recipes, seed=0):
+    """create the user and recipes the requests are sent as and about"""
+    rng = random.Random(seed)
+    get_user_model().objects.filter(email=LOADTEST_EMAIL).delete()
+    password = f'loadtest-{rng.randrange(10 ** 12)}'
+    user = get_user_model().objects.create_user(LOADTEST_EMAIL, password)
+    tags = resolve_names(Tag, user, [
+        f'{word.title()} {index}'
+        for index, word in enumerate(rng.choices(WORDS, k=TAG_COUNT))
+    ])
+    ingredients = resolve_names(Ingredient, user, [
+        f'{word.title()} {index}'
+        for index, word in enumerate(rng.choices(WORDS, k=INGREDIENT_COUNT))
+    ])
+    rows = [
+        (
+            Recipe(
+                user=user,
+                title=_title(rng, 3),
+                time_minutes=rng.randint(5, 180),
+                price=Decimal(rng.randint(100, 5000)) / 100,
+            ),
+            rng.sample(list(tags.values()), rng.randint(0, 3)),
+            rng.sample(list(ingredients.values()), rng.randint(2, 8)),
+        )
+        for _ in range(recipes)
+    ]
+    created = insert_recipes([row[0] for row in rows])
+    for index, field_name in enumerate(('tags', 'ingredients'), 1):
+        link_recipes(field_name, [
+            (row[0].pk, obj.pk) for row in rows for obj in row[index]
+        ])
+    recipes_bulk_changed.send(
+        sender=Recipe,
+        user_ids={user.pk},
+        recipe_ids=[recipe.pk for recipe in created],
+    )
+    return {
+        'user': user,
+        'email': LOADTEST_EMAIL,
+        'password': password,
+        'token': Token.objects.create(user=user).key,
+        'recipe_ids': [recipe.pk for recipe in created],
+        'tags': list(tags),
+        'ingredients': list(ingredients),
+    }
+
+
+def delete_fixture(fixture):
+    """delete the user of a fixture with everything it owns"""
+    fixture['user'].delete()
+
+
+def _allowed_host():
+    """return a host name the settings accept"""
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+class InProcessClient:
+    """send requests through the django test client, counting queries"""
+
+    def __init__(self, token):
+        self.client = APIClient(SERVER_NAME=_allowed_host())
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {token}')
+
+    def request(self, method, path, data):
+        """return the status, seconds and queries of a request"""
+        with CaptureQueriesContext(connection) as queries:
+            start = time.perf_counter()
+            response = self.client.generic(
+                method,
+                path,
+                json.dumps(data) if data is not None else '',
+                content_type='application/json',
+                HTTP_ACCEPT='application/json',
+            )
+            elapsed = time.perf_counter() - start
+        return response.status_code, elapsed, len(queries)
+
+
+class HttpClient:
+    """send requests to a server over keep-alive connections"""
+
+    def __init__(self, url, token):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port
+        self.prefix = parts.path.rstrip('/')
+        self.headers = {
+            'Authorization': f'Token {token}',
+            'Accept': 'application/json',
+            'Content-Type': 'application/json',
+        }
+        self._local = threading.local()
+
+    def _connection(self):
+        """return the connection of the calling thread"""
+        if getattr(self._local, 'connection', None) is None:
+            self._local.connection = http.client.HTTPConnection(
+                self.host,
+                self.port,
+                timeout=30,
+            )
+        return self._local.connection
+
+    def request(self, method, path, data):
+        """return the status and seconds of a request, queries unknown"""
+        body = json.dumps(data) if data is not None else None
+        start = time.perf_counter()
+        try:
+            conn = self._connection()
+            conn.request(method, self.prefix + path, body, self.headers)
+            response = conn.getresponse()
+            response.read()
+            status = response.status
+        except (OSError, http.client.HTTPException):
+            self._local.connection.close()
+            self._local.connection = None
+            status = None
+        return status, time.perf_counter() - start, None
+
+
+def plan_requests(fixture, weights, requests, seed=0):
+    """return the (scenario, method, path, data) requests of a run"""
+    rng = random.Random(seed)
+    names = [name for name, weight in weights.items() if weight > 0]
+    return [
+        (name, *SCENARIOS[name][1](fixture, rng))
+        for name in rng.choices(
+            names,
+            weights=[weights[name] for name in names],
+            k=requests,
+        )
+    ]
+
+
+def percentile(values, fraction):
+    """return a nearest rank percentile of sorted values"""
+    if not values:
+        return None
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def run(client, plan, concurrency=1):
+    """send the planned requests, returning the summary of the run"""
+    def send(call):
+        return call[0], client.request(*call[1:])
+
+    start = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(concurrency) as pool:
+            samples = list(pool.map(send, plan))
+    else:
+        samples = [send(call) for call in plan]
+    duration = time.perf_counter() - start
+
+    by_name = defaultdict(list)
+    for name, sample in samples:
+        by_name[name].append(sample)
+    endpoints = {}
+    for name, results in sorted(by_name.items()):
+        latencies = sorted(elapsed * 1000 for _, elapsed, _ in results)
+        queries = [count for _, _, count in results if count is not None]
+        endpoints[name] = {
+            'requests': len(results),
+            'errors': sum(
+                1 for status, _, _ in results
+                if status is None or status >= 400
+            ),
+            'throughput': round(len(results) / duration, 2),
+            'p50_ms': round(percentile(latencies, 0.5), 3),
+            'p95_ms': round(percentile(latencies, 0.95), 3),
+            'p99_ms': round(percentile(latencies, 0.99), 3),
+            'queries_per_request': (
+                round(sum(queries) / len(queries), 2) if queries else None
+            ),
+        }
+    return {
+        'requests': len(samples),
+        'duration': round(duration, 3),
+        'throughput': round(len(samples) / duration, 2),
+        'endpoints': endpoints,
+    }
+
+
+def compare(result, baseline, threshold):
+    """return the regressions of a run against a baseline run
+
+    latency percentiles and queries per request may grow, and throughput
+    may drop, by ``threshold`` percent before they count. latencies of
+    rarely sent scenarios are skipped. errors count when the baseline had
+    none.
+    """
+    limit = 1 + threshold / 100
+    regressions = []
+    for name, current in result['endpoints'].items():
+        previous = baseline.get('endpoints', {}).get(name)
+        if previous is None:
+            continue
+        sampled = min(current['requests'], previous['requests'])
+        for metric in ('p50_ms', 'p95_ms', 'p99_ms'):
+            old, new = previous.get(metric), current.get(metric)
+            if old is None or new is None or sampled < MIN_SAMPLES:
+                continue
+            if new > old * limit and new - old >= MIN_LATENCY_DELTA_MS:
+                regressions.append(f'{name} {metric}: {old} -> {new}')
+        old = previous.get('queries_per_request')
+        new = current.get('queries_per_request')
+        if old is not None and new is not None and new > old * limit:
+            regressions.append(f'{name} queries_per_request: {old} -> {new}')
+        if current['throughput'] * limit < previous['throughput']:
+            regressions.append(
+                f'{name} throughput: {previous["throughput"]} -> '
+                f'{current["throughput"]}'
+            )
+        if current['errors'] and not previous['errors']:
+            regressions.append(f'{name} errors: 0 -> {current["errors"]}')
+    return regressions
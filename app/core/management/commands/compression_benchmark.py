@@ -0,0 +1,139 @@
+"""
+django command to compare compression settings on api payloads
+"""
+import gzip
+import random
+import time
+from decimal import Decimal
+
+import brotli
+from django.core.management.base import (BaseCommand, CommandError)
+
+from core.renderers import (MessagePackRenderer, ORJSONRenderer)
+
+
+RENDERERS = {
+    'json': ORJSONRenderer,
+    'msgpack': MessagePackRenderer,
+}
+GZIP_LEVELS = (1, 6, 9)
+BROTLI_QUALITIES = (1, 4, 6, 11)
+WORDS = (
+    'tomato', 'basil', 'garlic', 'chicken', 'rice', 'lemon', 'pepper',
+    'onion', 'butter', 'flour', 'curry', 'ginger', 'salmon', 'spinach',
+    'pasta', 'cheese', 'quick', 'roasted', 'spicy', 'vegan', 'soup',
+)
+
+
+def _name(rng, words):
+    """return a random title cased name"""
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).title()
+
+
+def recipe_list(count, seed=0):
+    """return a recipe list page shaped like the api response"""
+    rng = random.Random(seed)
+    tags = [{'id': i, 'name': _name(rng, 1)} for i in range(1, 31)]
+    ingredients = [{'id': i, 'name': _name(rng, 2)} for i in range(1, 201)]
+    results = []
+    for pk in range(1, count + 1):
+        results.append({
+            'id': pk,
+            'title': _name(rng, 4),
+            'time_minutes': rng.randint(5, 180),
+            'price': Decimal(rng.randint(100, 5000)) / 100,
+            'link': f'https://example.com/recipes/{pk}',
+            'tags': rng.sample(tags, rng.randint(0, 4)),
+            'ingredients': rng.sample(ingredients, rng.randint(2, 12)),
+            'image_variants': None,
+        })
+    return {'next': '/api/recipe/recipes/?cursor=cD0y', 'previous': None,
+            'results': results}
+
+
+def _codecs():
+    """return the label, compress and decompress function of each codec"""
+    for level in GZIP_LEVELS:
+        yield (
+            f'gzip-{level}',
+            lambda data, level=level: gzip.compress(data, level),
+            gzip.decompress,
+        )
+    for quality in BROTLI_QUALITIES:
+        yield (
+            f'br-{quality}',
+            lambda data, quality=quality: brotli.compress(
+                data,
+                mode=brotli.MODE_TEXT,
+                quality=quality,
+            ),
+            brotli.decompress,
+        )
+
+
+def _timed(function, data, repeat):
+    """return the result and the best time in seconds of a call"""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(data)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return result, best
+
+
+class Command(BaseCommand):
+    """django command to measure wire size against cpu time
+
+    a synthetic recipe list is rendered in every api format and compressed
+    with each codec and level. the table shows the compressed size, the
+    ratio to the raw payload and the compress and decompress times.
+    """
+    help = 'compare response compression settings on api payloads'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--recipes',
+            type=int,
+            nargs='+',
+            default=[10, 100, 1000],
+            help='recipes per payload',
+        )
+        parser.add_argument('--repeat', type=int, default=5)
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        """entry point for command"""
+        if options['repeat'] < 1 or min(options['recipes']) < 1:
+            raise CommandError('--recipes and --repeat must be positive')
+        self.stdout.write(
+            f'{"format":<8} {"recipes":>7} {"codec":<8} {"bytes":>9} '
+            f'{"ratio":>6} {"comp ms":>8} {"MB/s":>7} {"decomp ms":>9}'
+        )
+        for count in options['recipes']:
+            data = recipe_list(count, options['seed'])
+            for fmt, renderer_class in RENDERERS.items():
+                payload = renderer_class().render(data)
+                self._row(fmt, count, 'none', len(payload), len(payload))
+                for label, compress, decompress in _codecs():
+                    compressed, comp = _timed(
+                        compress,
+                        payload,
+                        options['repeat'],
+                    )
+                    _, decomp = _timed(
+                        decompress,
+                        compressed,
+                        options['repeat'],
+                    )
+                    self._row(fmt, count, label, len(compressed),
+                              len(payload), comp, decomp)
+
+    def _row(self, fmt, count, codec, size, raw, comp=0.0, decomp=0.0):
+        """write one line of the results table"""
+        speed = f'{raw / comp / 1e6:7.1f}' if comp else f'{"-":>7}'
+        self.stdout.write(
+            f'{fmt:<8} {count:>7} {codec:<8} {size:>9} '
+            f'{size / raw:>6.3f} {comp * 1000:>8.3f} {speed} '
+            f'{decomp * 1000:>9.3f}'
+        )
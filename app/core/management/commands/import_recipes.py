@@ -0,0 +1,197 @@
+"""
+django command to bulk import recipes from NDJSON or CSV
+"""
+import csv
+import itertools
+import json
+import sys
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ValidationError
+from django.core.management.base import (BaseCommand, CommandError)
+from django.db import transaction
+
+from core.bulk import (insert_recipes, link_recipes, resolve_names)
+from core.models import (ImportCheckpoint, Ingredient, Recipe, Tag)
+from core.signals import recipes_bulk_changed
+
+
+FORMATS = ('ndjson', 'csv')
+RECIPE_FIELDS = ('title', 'time_minutes', 'price', 'link', 'description')
+# fields not coming from the input, skipped when validating records
+NOT_IMPORTED = ('user', 'image', 'search_vector')
+# separates tag and ingredient names inside a csv cell
+CSV_LIST_SEPARATOR = '|'
+
+
+def _names(value):
+    """return the names of a tag or ingredient list"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = value.split(CSV_LIST_SEPARATOR)
+    names = [
+        item['name'] if isinstance(item, dict) else item
+        for item in value
+    ]
+    return [str(name).strip() for name in names if str(name).strip()]
+
+
+class Command(BaseCommand):
+    """django command to import recipes in batches
+
+    records are read lazily and written one batch at a time, so memory
+    use depends on the batch size only. every batch stores the number of
+    consumed records in the named checkpoint in its own transaction, an
+    interrupted import continues from there with ``--resume`` and never
+    writes a batch twice.
+    """
+    help = 'import recipes from an NDJSON or CSV file or stdin'
+    stealth_options = ('stdin',)
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='-',
+            help='file to import, "-" reads stdin',
+        )
+        parser.add_argument('--user', required=True, help='owner email')
+        parser.add_argument('--format', choices=FORMATS)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--checkpoint',
+            help='checkpoint name, stored in the database',
+        )
+        parser.add_argument(
+            '--resume',
+            action='store_true',
+            help='skip the records recorded in the checkpoint',
+        )
+
+    def handle(self, *args, **options):
+        """entry point for command"""
+        path = options['path']
+        fmt = options['format']
+        if fmt is None:
+            fmt = 'csv' if path.lower().endswith('.csv') else 'ndjson'
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        if options['resume'] and not options['checkpoint']:
+            raise CommandError('--resume requires --checkpoint')
+        try:
+            user = get_user_model().objects.get(email=options['user'])
+        except get_user_model().DoesNotExist:
+            raise CommandError(f'unknown user {options["user"]}')
+
+        done = 0
+        if options['resume']:
+            done = ImportCheckpoint.objects.filter(
+                name=options['checkpoint'],
+            ).values_list('records', flat=True).first() or 0
+
+        if path == '-':
+            stream = options.get('stdin', sys.stdin)
+            self._import(stream, fmt, user, done, options)
+        else:
+            with open(path, newline='', encoding='utf-8') as stream:
+                self._import(stream, fmt, user, done, options)
+
+    def _import(self, stream, fmt, user, done, options):
+        """import the records of a stream in batches"""
+        records = self._records(stream, fmt)
+        records = itertools.islice(records, done, None)
+        imported = 0
+        started = time.monotonic()
+        while True:
+            batch = list(itertools.islice(records, options['batch_size']))
+            if not batch:
+                break
+            self._write_batch(user, batch, done, options['checkpoint'])
+            done += len(batch)
+            imported += len(batch)
+            rate = imported / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'{imported} recipes imported ({rate:.0f} rows/sec)'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Imported {imported} recipes, {done} records processed'
+        ))
+
+    def _records(self, stream, fmt):
+        """yield the records of a stream as dicts"""
+        if fmt == 'csv':
+            yield from csv.DictReader(stream)
+            return
+        for number, line in enumerate(stream, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except ValueError as exc:
+                raise CommandError(f'line {number}: invalid json ({exc})')
+
+    def _build(self, user, record, number):
+        """return an unsaved recipe and its tag and ingredient names"""
+        if not isinstance(record, dict):
+            raise CommandError(f'record {number}: expected an object')
+        recipe = Recipe(user=user, **{
+            field: record[field]
+            for field in RECIPE_FIELDS
+            if record.get(field) not in (None, '')
+        })
+        try:
+            recipe.full_clean(exclude=NOT_IMPORTED, validate_unique=False)
+        except ValidationError as exc:
+            raise CommandError(f'record {number}: {exc.message_dict}')
+        return (
+            recipe,
+            _names(record.get('tags')),
+            _names(record.get('ingredients')),
+        )
+
+    def _write_batch(self, user, records, done, checkpoint):
+        """insert a batch of records in a single transaction
+
+        ``done`` records were consumed before the batch, the checkpoint
+        moves past the batch in the same transaction.
+        """
+        rows = [
+            self._build(user, record, number)
+            for number, record in enumerate(records, done + 1)
+        ]
+        with transaction.atomic():
+            tags = resolve_names(
+                Tag,
+                user,
+                [name for row in rows for name in row[1]],
+            )
+            ingredients = resolve_names(
+                Ingredient,
+                user,
+                [name for row in rows for name in row[2]],
+            )
+            recipes = insert_recipes([row[0] for row in rows])
+            link_recipes('tags', [
+                (recipe.pk, tags[name].pk)
+                for recipe, names, _ in rows for name in names
+            ])
+            link_recipes('ingredients', [
+                (recipe.pk, ingredients[name].pk)
+                for recipe, _, names in rows for name in names
+            ])
+            recipes_bulk_changed.send(
+                sender=Recipe,
+                user_ids={user.pk},
+                recipe_ids=[recipe.pk for recipe in recipes],
+            )
+            if checkpoint:
+                self._save_checkpoint(checkpoint, done + len(rows))
+
+    def _save_checkpoint(self, name, records):
+        """record the number of consumed records in a checkpoint"""
+        ImportCheckpoint.objects.update_or_create(
+            name=name,
+            defaults={'records': records},
+        )
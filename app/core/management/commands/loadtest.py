@@ -0,0 +1,161 @@
+"""
+django command to load test the user and recipe apis
+"""
+import json
+import subprocess
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.core.management.base import (BaseCommand, CommandError)
+
+from core.loadtest import (
+    SCENARIOS,
+    HttpClient,
+    InProcessClient,
+    compare,
+    create_fixture,
+    delete_fixture,
+    plan_requests,
+    run,
+)
+
+
+def _weight(value):
+    """parse a NAME=WEIGHT argument"""
+    name, _, weight = value.partition('=')
+    if name not in SCENARIOS:
+        raise ValueError(f'unknown scenario {name}')
+    return name, int(weight)
+
+
+def _commit():
+    """return the checked out commit, None outside a git checkout"""
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', 'HEAD'],
+            cwd=settings.BASE_DIR,
+            capture_output=True,
+            check=True,
+            text=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    """django command running a weighted mix of api requests
+
+    requests go through the django test client unless ``--url`` points at
+    a running server using the same database. the user, tags, ingredients
+    and recipes the requests need are created first and deleted after.
+    with ``--baseline`` the run is compared with a saved one and the
+    command fails when any scenario regressed by more than ``--threshold``
+    percent.
+    """
+    help = 'load test the user and recipe apis with a weighted workload'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=1000)
+        parser.add_argument('--warmup', type=int, default=50,
+                            help='requests sent before measuring')
+        parser.add_argument('--url', help='base url of a running server')
+        parser.add_argument('--concurrency', type=int, default=1,
+                            help='parallel connections, with --url only')
+        parser.add_argument('--recipes', type=int, default=200,
+                            help='recipes of the load test user')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--weight',
+            type=_weight,
+            action='append',
+            default=[],
+            metavar='SCENARIO=WEIGHT',
+            help=f'change a weight, 0 disables: {", ".join(SCENARIOS)}',
+        )
+        parser.add_argument('--output', help='save the results as json')
+        parser.add_argument('--baseline', help='results to compare with')
+        parser.add_argument('--threshold', type=float, default=20.0,
+                            help='percent a metric may worsen')
+
+    def handle(self, *args, **options):
+        """entry point for command"""
+        if options['requests'] < 1 or options['concurrency'] < 1:
+            raise CommandError('--requests and --concurrency must be positive')
+        if options['concurrency'] > 1 and not options['url']:
+            raise CommandError('--concurrency needs --url')
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as baseline_file:
+                    baseline = json.load(baseline_file)
+            except (OSError, ValueError) as exc:
+                raise CommandError(f'can not read baseline: {exc}')
+        weights = {name: weight for name, (weight, _) in SCENARIOS.items()}
+        weights.update(options['weight'])
+        if not any(weights.values()):
+            raise CommandError('every scenario is disabled')
+
+        fixture = create_fixture(options['recipes'], options['seed'])
+        try:
+            if options['url']:
+                client = HttpClient(options['url'], fixture['token'])
+            else:
+                client = InProcessClient(fixture['token'])
+            if options['warmup']:
+                run(client, plan_requests(
+                    fixture,
+                    weights,
+                    options['warmup'],
+                    options['seed'] + 1,
+                ), options['concurrency'])
+            result = run(client, plan_requests(
+                fixture,
+                weights,
+                options['requests'],
+                options['seed'],
+            ), options['concurrency'])
+        finally:
+            delete_fixture(fixture)
+
+        result.update({
+            'created': datetime.now(timezone.utc).isoformat(),
+            'commit': _commit(),
+            'target': options['url'] or 'in-process',
+            'concurrency': options['concurrency'],
+            'seed': options['seed'],
+            'weights': weights,
+        })
+        self._report(result)
+        if options['output']:
+            with open(options['output'], 'w') as output:
+                json.dump(result, output, indent=2, sort_keys=True)
+        if baseline is not None:
+            regressions = compare(result, baseline, options['threshold'])
+            for regression in regressions:
+                self.stderr.write(f'regression: {regression}')
+            if regressions:
+                raise CommandError(
+                    f'{len(regressions)} regressions against '
+                    f'{options["baseline"]}'
+                )
+            self.stdout.write(f'No regressions against {options["baseline"]}')
+
+    def _report(self, result):
+        """write the results table"""
+        self.stdout.write(
+            f'{"scenario":<20} {"requests":>8} {"errors":>6} {"req/s":>8} '
+            f'{"p50 ms":>8} {"p95 ms":>8} {"p99 ms":>8} {"queries":>7}'
+        )
+        for name, endpoint in result['endpoints'].items():
+            queries = endpoint['queries_per_request']
+            self.stdout.write(
+                f'{name:<20} {endpoint["requests"]:>8} '
+                f'{endpoint["errors"]:>6} {endpoint["throughput"]:>8.1f} '
+                f'{endpoint["p50_ms"]:>8.2f} {endpoint["p95_ms"]:>8.2f} '
+                f'{endpoint["p99_ms"]:>8.2f} '
+                f'{"-" if queries is None else f"{queries:.1f}":>7}'
+            )
+        self.stdout.write(
+            f'{result["requests"]} requests in {result["duration"]:.2f}s, '
+            f'{result["throughput"]:.1f} req/s'
+        )
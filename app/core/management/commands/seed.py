@@ -0,0 +1,83 @@
+"""
+django command to fill the database with synthetic users and recipes
+"""
+import os
+import time
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import (BaseCommand, CommandError)
+
+from core.seed import (EMAIL_DOMAIN, distribution, seed_email, seed_users)
+
+
+class Command(BaseCommand):
+    """django command creating seeded users with recipes in bulk
+
+    counts per user and per recipe are distributions: ``N``, ``LOW-HIGH``
+    or ``exp:MEAN``. the same ``--seed`` creates the same data, the
+    users of a seed can only be created once.
+    """
+    help = 'create synthetic users with recipes, tags and ingredients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('users', type=int, help='number of users')
+        parser.add_argument('--recipes', type=distribution, default='exp:50',
+                            help='recipes per user')
+        parser.add_argument('--tags', type=distribution, default='5-30',
+                            help='tags per user')
+        parser.add_argument('--ingredients', type=distribution,
+                            default='20-120', help='ingredients per user')
+        parser.add_argument('--tags-per-recipe', type=distribution,
+                            default='0-4')
+        parser.add_argument('--ingredients-per-recipe', type=distribution,
+                            default='3-12')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='users written per transaction')
+        parser.add_argument('--processes', type=int,
+                            default=os.cpu_count() or 1,
+                            help='processes hashing passwords')
+        parser.add_argument('--password', default='password',
+                            help='password of every user')
+        parser.add_argument(
+            '--hash-once',
+            action='store_true',
+            help='share one password hash, hashing dominates large runs',
+        )
+
+    def handle(self, *args, **options):
+        """entry point for command"""
+        if options['users'] < 1 or options['batch_size'] < 1:
+            raise CommandError('users and --batch-size must be positive')
+        if get_user_model().objects.filter(
+            email=seed_email(options['seed'], 0),
+        ).exists():
+            raise CommandError(
+                f'users of seed {options["seed"]} exist already, '
+                f'delete the @{EMAIL_DOMAIN} users or use another --seed'
+            )
+
+        users = recipes = 0
+        started = time.monotonic()
+        for batch_users, batch_recipes in seed_users(
+            options['users'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            processes=options['processes'],
+            password=options['password'],
+            hash_once=options['hash_once'],
+            recipes=options['recipes'],
+            tags=options['tags'],
+            ingredients=options['ingredients'],
+            tags_per_recipe=options['tags_per_recipe'],
+            ingredients_per_recipe=options['ingredients_per_recipe'],
+        ):
+            users += batch_users
+            recipes += batch_recipes
+            rate = recipes / max(time.monotonic() - started, 1e-6)
+            self.stdout.write(
+                f'{users} users, {recipes} recipes ({rate:.0f} recipes/sec)'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Seeded {users} users with {recipes} recipes'
+        ))
@@ -0,0 +1,228 @@
+"""
+django command to compare serving the api over asgi and wsgi
+"""
+import asyncio
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import (BaseCommand, CommandError)
+from django.urls import reverse
+
+from rest_framework.authtoken.models import Token
+
+from core.models import Recipe
+
+
+BENCHMARK_EMAIL = 'serving-benchmark@example.com'
+READY_TIMEOUT = 30
+
+
+def server_command(mode, host, port, workers):
+    """return the command line serving the api in a mode"""
+    if mode == 'asgi':
+        return [
+            sys.executable, '-m', 'uvicorn', 'app.asgi:application',
+            '--host', host, '--port', str(port),
+            '--workers', str(workers),
+            '--log-level', 'warning', '--no-access-log',
+        ]
+    # the threaded wsgi server of app/wsgi.py the container runs
+    return [
+        sys.executable, 'manage.py', 'runserver', '--noreload',
+        f'{host}:{port}',
+    ]
+
+
+def percentile(values, fraction):
+    """return a percentile of sorted values"""
+    if not values:
+        return 0.0
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+async def _read_response(reader):
+    """read one response, returning the status and if it may be reused"""
+    head = await reader.readuntil(b'\r\n\r\n')
+    lines = head.decode('latin-1').split('\r\n')
+    status = int(lines[0].split()[1])
+    headers = {}
+    for line in lines[1:]:
+        name, _, value = line.partition(':')
+        headers[name.strip().lower()] = value.strip()
+    if 'content-length' in headers:
+        await reader.readexactly(int(headers['content-length']))
+        return status, headers.get('connection') != 'close'
+    await reader.read()
+    return status, False
+
+
+async def _connection(host, port, request, deadline, latencies, errors):
+    """send requests over one keep-alive connection until the deadline"""
+    writer = None
+    while time.monotonic() < deadline:
+        start = time.monotonic()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(request)
+            status, reusable = await _read_response(reader)
+        except (OSError, asyncio.IncompleteReadError, ValueError):
+            errors.append(None)
+            if writer is not None:
+                writer.close()
+            writer = None
+            await asyncio.sleep(0.01)
+            continue
+        if status >= 400:
+            errors.append(status)
+        else:
+            latencies.append(time.monotonic() - start)
+        if not reusable:
+            writer.close()
+            writer = None
+    if writer is not None:
+        writer.close()
+
+
+async def run_load(host, port, path, token, concurrency, duration):
+    """load a server, returning the latencies and errors of the requests"""
+    request = (
+        f'GET {path} HTTP/1.1\r\n'
+        f'Host: {host}:{port}\r\n'
+        f'Authorization: Token {token}\r\n'
+        'Accept: application/json\r\n'
+        'Connection: keep-alive\r\n\r\n'
+    ).encode()
+    latencies, errors = [], []
+    deadline = time.monotonic() + duration
+    await asyncio.gather(*(
+        _connection(host, port, request, deadline, latencies, errors)
+        for _ in range(concurrency)
+    ))
+    return sorted(latencies), errors
+
+
+class Command(BaseCommand):
+    """django command to measure throughput and latency per serving mode
+
+    every mode is started as a server process against the configured
+    database and loaded with keep-alive connections at each concurrency
+    level for a fixed duration. failed requests, like those refused once
+    the database runs out of connections, are counted as errors.
+    """
+    help = 'compare serving the api over asgi and wsgi'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            nargs='+',
+            default=[10, 100, 1000],
+            help='open connections per run',
+        )
+        parser.add_argument(
+            '--modes',
+            nargs='+',
+            choices=['asgi', 'wsgi'],
+            default=['asgi', 'wsgi'],
+        )
+        parser.add_argument('--duration', type=float, default=10.0,
+                            help='seconds per run')
+        parser.add_argument('--path', help='defaults to the recipe list')
+        parser.add_argument('--recipes', type=int, default=50,
+                            help='recipes of the benchmark user')
+        parser.add_argument('--workers', type=int, default=1,
+                            help='asgi worker processes')
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8765)
+
+    def handle(self, *args, **options):
+        """entry point for command"""
+        if options['duration'] <= 0 or min(options['concurrency']) < 1:
+            raise CommandError('--duration and --concurrency must be positive')
+        # every connection is a file descriptor on both ends
+        _, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+        options['path'] = options['path'] or reverse('recipe:recipe-list')
+        user, token = self._create_user(options['recipes'])
+        try:
+            self.stdout.write(
+                f'{"mode":<5} {"conns":>6} {"requests":>9} {"req/s":>8} '
+                f'{"p50 ms":>8} {"p99 ms":>8} {"errors":>7}'
+            )
+            for mode in options['modes']:
+                self._benchmark(mode, token.key, options)
+        finally:
+            user.delete()
+
+    def _create_user(self, recipes):
+        """create the user the requests are sent as"""
+        get_user_model().objects.filter(email=BENCHMARK_EMAIL).delete()
+        user = get_user_model().objects.create_user(
+            BENCHMARK_EMAIL,
+            os.urandom(16).hex(),
+        )
+        Recipe.objects.bulk_create([
+            Recipe(
+                user=user,
+                title=f'Benchmark recipe {index}',
+                time_minutes=10 + index % 50,
+                price=Decimal('5.00'),
+            )
+            for index in range(recipes)
+        ])
+        return user, Token.objects.create(user=user)
+
+    def _benchmark(self, mode, token, options):
+        """start a server in a mode and load it at every concurrency"""
+        host, port = options['host'], options['port']
+        server = subprocess.Popen(
+            server_command(mode, host, port, options['workers']),
+            cwd=settings.BASE_DIR,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        try:
+            self._wait_ready(server, host, port)
+            for concurrency in options['concurrency']:
+                latencies, errors = asyncio.run(run_load(
+                    host,
+                    port,
+                    options['path'],
+                    token,
+                    concurrency,
+                    options['duration'],
+                ))
+                self.stdout.write(
+                    f'{mode:<5} {concurrency:>6} {len(latencies):>9} '
+                    f'{len(latencies) / options["duration"]:>8.1f} '
+                    f'{percentile(latencies, 0.5) * 1000:>8.1f} '
+                    f'{percentile(latencies, 0.99) * 1000:>8.1f} '
+                    f'{len(errors):>7}'
+                )
+        finally:
+            server.terminate()
+            server.wait()
+
+    def _wait_ready(self, server, host, port):
+        """wait until the server accepts connections"""
+        deadline = time.monotonic() + READY_TIMEOUT
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(
+                    f'server exited with status {server.returncode}'
+                )
+            try:
+                socket.create_connection((host, port), timeout=1).close()
+                return
+            except OSError:
+                time.sleep(0.2)
+        raise CommandError(f'server not ready after {READY_TIMEOUT}s')
@@ -0,0 +1,165 @@
+"""
+response compression for the api
+
+responses under the configured paths are compressed with brotli or gzip,
+whichever the client prefers. only listed content types are compressed,
+each with its own minimum size, so images and other compressed media pass
+through untouched. streamed responses are compressed chunk by chunk.
+"""
+import re
+import zlib
+
+import brotli
+from django.conf import settings
+from django.utils.cache import patch_vary_headers
+from django.utils.deprecation import MiddlewareMixin
+
+
+# preferred first when the client accepts several with the same quality
+CODINGS = ('br', 'gzip')
+ETAG_SUFFIX = re.compile(r'-(%s)"' % '|'.join(CODINGS))
+
+
+def accepted_coding(header):
+    """return the preferred content coding of an Accept-Encoding header"""
+    qualities = {}
+    for part in header.split(','):
+        coding, _, params = part.strip().partition(';')
+        quality = 1.0
+        match = re.search(r'q=([0-9.]+)', params)
+        if match:
+            try:
+                quality = float(match.group(1))
+            except ValueError:
+                continue
+        qualities[coding.strip().lower()] = quality
+    best, best_quality = None, 0
+    for coding in CODINGS:
+        quality = qualities.get(coding, qualities.get('*', 0))
+        if quality > best_quality:
+            best, best_quality = coding, quality
+    return best
+
+
+def _compressor(coding):
+    """return the compress, flush and finish functions of a coding"""
+    options = settings.COMPRESSION
+    if coding == 'br':
+        compressor = brotli.Compressor(
+            mode=brotli.MODE_TEXT,
+            quality=options['BROTLI_QUALITY'],
+        )
+        return compressor.process, compressor.flush, compressor.finish
+    # wbits 31 writes a gzip header and trailer
+    compressor = zlib.compressobj(options['GZIP_LEVEL'], zlib.DEFLATED, 31)
+    return (
+        compressor.compress,
+        lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+        compressor.flush,
+    )
+
+
+def compress(content, coding):
+    """return content compressed with a content coding"""
+    process, _, finish = _compressor(coding)
+    return process(content) + finish()
+
+
+def compress_stream(chunks, coding):
+    """compress an iterable of chunks, flushing after every chunk"""
+    process, flush, finish = _compressor(coding)
+    for chunk in chunks:
+        data = process(chunk) + flush()
+        if data:
+            yield data
+    yield finish()
+
+
+def minimum_size(content_type):
+    """return the minimum size to compress a content type, None to skip"""
+    media_type = content_type.split(';')[0].strip().lower()
+    types = settings.COMPRESSION['TYPES']
+    if media_type in types:
+        return types[media_type]
+    for prefix, size in types.items():
+        if prefix.endswith('/') and media_type.startswith(prefix):
+            return size
+    return None
+
+
+class CompressionMiddleware(MiddlewareMixin):
+    """compress api responses with brotli or gzip
+
+    ETags of compressed responses get the coding appended, so each
+    encoding has its own strong validator. the suffix is stripped from
+    conditional request headers again before views compare them. based on
+    MiddlewareMixin so async views stay async under asgi.
+    """
+
+    def _applies(self, request):
+        return request.path.startswith(settings.COMPRESSION['PATHS'])
+
+    def process_request(self, request):
+        """strip the coding suffix from conditional request headers"""
+        if not self._applies(request):
+            return
+        # codings of the etags the client validates a 304 against
+        request.compression_validated = ETAG_SUFFIX.findall(
+            request.META.get('HTTP_IF_NONE_MATCH', ''),
+        )
+        for header in ('HTTP_IF_MATCH', 'HTTP_IF_NONE_MATCH'):
+            if header in request.META:
+                request.META[header] = ETAG_SUFFIX.sub(
+                    '"',
+                    request.META[header],
+                )
+
+    def _not_modified(self, request, response, validated):
+        """give a 304 the etag of the encoded response it validates"""
+        coding = accepted_coding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        etag = response.get('ETag')
+        patch_vary_headers(response, ('Accept-Encoding',))
+        if coding in validated and etag and etag.endswith('"'):
+            response['ETag'] = f'{etag[:-1]}-{coding}"'
+        return response
+
+    def process_response(self, request, response):
+        """compress a response when the client and the content allow it"""
+        if not self._applies(request):
+            return response
+        if response.status_code == 304:
+            return self._not_modified(
+                request,
+                response,
+                getattr(request, 'compression_validated', []),
+            )
+        if response.has_header('Content-Encoding'):
+            return response
+        threshold = minimum_size(response.get('Content-Type', ''))
+        if threshold is None:
+            return response
+        if not response.streaming and len(response.content) < threshold:
+            return response
+        patch_vary_headers(response, ('Accept-Encoding',))
+        coding = accepted_coding(request.META.get('HTTP_ACCEPT_ENCODING', ''))
+        if coding is None:
+            return response
+
+        if response.streaming:
+            response.streaming_content = compress_stream(
+                response.streaming_content,
+                coding,
+            )
+            del response['Content-Length']
+        else:
+            compressed = compress(response.content, coding)
+            if len(compressed) >= len(response.content):
+                return response
+            response.content = compressed
+            response['Content-Length'] = str(len(compressed))
+
+        etag = response.get('ETag')
+        if etag and etag.endswith('"'):
+            response['ETag'] = f'{etag[:-1]}-{coding}"'
+        response['Content-Encoding'] = coding
+        return response
@@ -0,0 +1,78 @@
+# Generated by Django 3.2.7 on 2026-10-18 01:57
+
+import django.contrib.postgres.search
+from django.db import migrations
+
+from core.migrations._helpers import run_statements
+
+
+POSTGRES_FORWARD = [
+    'CREATE INDEX core_recipe_search_vector_gin '
+    'ON core_recipe USING gin (search_vector)',
+    """
+    UPDATE core_recipe r SET search_vector =
+        setweight(to_tsvector('english', coalesce(r.title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(t.name, ' ') FROM core_tag t
+            JOIN core_recipe_tags rt ON rt.tag_id = t.id
+            WHERE rt.recipe_id = r.id), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce((
+            SELECT string_agg(i.name, ' ') FROM core_ingredient i
+            JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id
+            WHERE ri.recipe_id = r.id), '')), 'B') ||
+        setweight(to_tsvector('english', coalesce(r.description, '')), 'C')
+    """,
+]
+POSTGRES_REVERSE = [
+    'DROP INDEX IF EXISTS core_recipe_search_vector_gin',
+]
+
+SQLITE_FORWARD = [
+    """
+    CREATE VIRTUAL TABLE core_recipe_fts USING fts5(
+        user_id UNINDEXED, title, tags, ingredients, description,
+        tokenize = 'porter unicode61'
+    )
+    """,
+    """
+    INSERT INTO core_recipe_fts
+        (rowid, user_id, title, tags, ingredients, description)
+    SELECT r.id, r.user_id, r.title,
+        coalesce((SELECT group_concat(t.name, ' ') FROM core_tag t
+            JOIN core_recipe_tags rt ON rt.tag_id = t.id
+            WHERE rt.recipe_id = r.id), ''),
+        coalesce((SELECT group_concat(i.name, ' ') FROM core_ingredient i
+            JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id
+            WHERE ri.recipe_id = r.id), ''),
+        r.description
+    FROM core_recipe r
+    """,
+]
+SQLITE_REVERSE = [
+    'DROP TABLE IF EXISTS core_recipe_fts',
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0005_recipe_image'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunPython(
+            run_statements({
+                'postgresql': POSTGRES_FORWARD,
+                'sqlite': SQLITE_FORWARD,
+            }),
+            run_statements({
+                'postgresql': POSTGRES_REVERSE,
+                'sqlite': SQLITE_REVERSE,
+            }),
+        ),
+    ]
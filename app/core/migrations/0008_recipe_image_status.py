@@ -0,0 +1,27 @@
+# Generated by Django 3.2.7 on 2026-10-18 02:10
+
+from django.db import migrations, models
+
+
+def mark_existing_images(apps, schema_editor):
+    """existing images were processed synchronously on upload"""
+    Recipe = apps.get_model('core', 'Recipe')
+    Recipe.objects.exclude(image='').exclude(image__isnull=True).update(
+        image_status='ready',
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_recipe_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_status',
+            field=models.CharField(choices=[('none', 'No image'), ('pending', 'Pending'), ('processing', 'Processing'), ('ready', 'Ready'), ('failed', 'Failed')], default='none', max_length=16),
+        ),
+        migrations.RunPython(mark_existing_images, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,60 @@
+# Generated by Django 3.2.7 on 2026-10-18 09:12
+
+from django.db import migrations
+
+from core.migrations._helpers import run_statements
+
+
+TABLES = ('core_tag', 'core_ingredient')
+
+# prefix lookups compare UPPER(name::text) LIKE 'TEXT%', trigram lookups
+# use the % operator of pg_trgm
+POSTGRES_FORWARD = ['CREATE EXTENSION IF NOT EXISTS pg_trgm'] + [
+    statement
+    for table in TABLES
+    for statement in (
+        f'CREATE INDEX {table}_name_prefix '
+        f'ON {table} (user_id, upper(name::text) text_pattern_ops)',
+        f'CREATE INDEX {table}_name_trgm '
+        f'ON {table} USING gin (name gin_trgm_ops)',
+    )
+]
+POSTGRES_REVERSE = [
+    statement
+    for table in TABLES
+    for statement in (
+        f'DROP INDEX IF EXISTS {table}_name_prefix',
+        f'DROP INDEX IF EXISTS {table}_name_trgm',
+    )
+]
+
+# sqlite uses a case insensitive index for LIKE prefixes
+SQLITE_FORWARD = [
+    f'CREATE INDEX {table}_name_prefix '
+    f'ON {table} (user_id, name COLLATE NOCASE)'
+    for table in TABLES
+]
+SQLITE_REVERSE = [
+    f'DROP INDEX IF EXISTS {table}_name_prefix'
+    for table in TABLES
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_upload_session'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({
+                'postgresql': POSTGRES_FORWARD,
+                'sqlite': SQLITE_FORWARD,
+            }),
+            run_statements({
+                'postgresql': POSTGRES_REVERSE,
+                'sqlite': SQLITE_REVERSE,
+            }),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 3.2.7 on 2026-10-18 02:36
+
+from django.db import migrations, models
+from django.db.models import (Count, IntegerField, OuterRef, Subquery)
+from django.db.models.functions import Coalesce
+
+from core.migrations._helpers import restore_sqlite_indexes
+
+
+def count_recipes(apps, schema_editor):
+    """set the recipe count of existing tags and ingredients"""
+    Recipe = apps.get_model('core', 'Recipe')
+    for field_name, model_name in (
+        ('tags', 'Tag'),
+        ('ingredients', 'Ingredient'),
+    ):
+        field = Recipe._meta.get_field(field_name)
+        target = field.m2m_reverse_field_name()
+        counts = field.remote_field.through.objects.filter(
+            **{target: OuterRef('pk')}
+        ).order_by().values(target).annotate(
+            count=Count('*'),
+        ).values('count')
+        apps.get_model('core', model_name).objects.update(
+            recipe_count=Coalesce(
+                Subquery(counts, output_field=IntegerField()),
+                0,
+            ),
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0011_name_suggest_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='recipe_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['user', 'recipe_count'], name='core_ingred_user_id_de1121_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=models.Index(fields=['user', 'recipe_count'], name='core_tag_user_id_699afc_idx'),
+        ),
+        migrations.RunPython(
+            restore_sqlite_indexes,
+            migrations.RunPython.noop,
+        ),
+        migrations.RunPython(count_recipes, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 3.2.7 on 2026-10-18 02:47
+
+from collections import defaultdict
+
+from django.db import migrations, models
+from django.db.models import (Count, IntegerField, OuterRef, Subquery)
+from django.db.models.functions import Coalesce
+
+
+BATCH_SIZE = 500
+
+
+def normalize_name(name):
+    """copy of core.models.normalize_name as of this migration"""
+    return ' '.join(name.split()).casefold()
+
+
+def merge_duplicates(apps, schema_editor):
+    """fill normalized_name and merge the rows it makes duplicates
+
+    the oldest row of a user's duplicates is kept, the links of the others
+    move over to it unless the recipe already uses it.
+    """
+    Recipe = apps.get_model('core', 'Recipe')
+    for field_name, model_name in (
+        ('tags', 'Tag'),
+        ('ingredients', 'Ingredient'),
+    ):
+        model = apps.get_model('core', model_name)
+        field = Recipe._meta.get_field(field_name)
+        through = field.remote_field.through
+        source = field.m2m_field_name()
+        target = field.m2m_reverse_field_name()
+
+        keepers = {}
+        duplicates = defaultdict(list)
+        rows = []
+        for obj in model.objects.order_by('pk').only(
+            'pk', 'user_id', 'name',
+        ).iterator():
+            obj.normalized_name = normalize_name(obj.name)
+            key = (obj.user_id, obj.normalized_name)
+            if key in keepers:
+                duplicates[keepers[key]].append(obj.pk)
+            else:
+                keepers[key] = obj.pk
+                rows.append(obj)
+        model.objects.bulk_update(
+            rows,
+            ['normalized_name'],
+            batch_size=BATCH_SIZE,
+        )
+
+        for keeper, pks in duplicates.items():
+            linked = through.objects.filter(**{target: keeper}).values(
+                f'{source}_id',
+            )
+            for pk in pks:
+                through.objects.filter(**{target: pk}).exclude(
+                    **{f'{source}_id__in': linked}
+                ).update(**{target: keeper})
+            through.objects.filter(**{f'{target}__in': pks}).delete()
+            model.objects.filter(pk__in=pks).delete()
+
+        counts = through.objects.filter(
+            **{target: OuterRef('pk')}
+        ).order_by().values(target).annotate(
+            count=Count('*'),
+        ).values('count')
+        merged = list(duplicates)
+        for start in range(0, len(merged), BATCH_SIZE):
+            model.objects.filter(
+                pk__in=merged[start:start + BATCH_SIZE],
+            ).update(recipe_count=Coalesce(
+                Subquery(counts, output_field=IntegerField()),
+                0,
+            ))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0013_recipe_stats'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ingredient',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='tag',
+            name='normalized_name',
+            field=models.CharField(default='', editable=False, max_length=255),
+            preserve_default=False,
+        ),
+        migrations.RunPython(merge_duplicates, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 3.2.7 on 2026-10-18 02:47
+
+from django.db import migrations, models
+
+from core.migrations._helpers import restore_sqlite_indexes
+
+
+class Migration(migrations.Migration):
+
+    # the constraints are added apart from the merge in 0014, postgresql
+    # refuses to alter a table with pending deferred foreign key checks
+    dependencies = [
+        ('core', '0014_normalized_name'),
+    ]
+
+    operations = [
+        migrations.AddConstraint(
+            model_name='ingredient',
+            constraint=models.UniqueConstraint(fields=('user', 'normalized_name'), name='unique_ingredient_name'),
+        ),
+        migrations.AddConstraint(
+            model_name='tag',
+            constraint=models.UniqueConstraint(fields=('user', 'normalized_name'), name='unique_tag_name'),
+        ),
+        migrations.RunPython(
+            restore_sqlite_indexes,
+            migrations.RunPython.noop,
+        ),
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 3.2.7 on 2026-10-18 03:36
+
+import os
+import posixpath
+
+from django.db import migrations, models
+
+
+BATCH_SIZE = 500
+
+
+def set_image_keys(apps, schema_editor):
+    """set the variant key of the images that are ready"""
+    Recipe = apps.get_model('core', 'Recipe')
+    recipes = Recipe.objects.filter(image_status='ready').exclude(image='')
+    batch = []
+    for recipe in recipes.only('pk', 'image').iterator():
+        # copy of recipe.images.variant_key as of this migration
+        recipe.image_key = os.path.splitext(
+            posixpath.basename(recipe.image.name),
+        )[0]
+        batch.append(recipe)
+        if len(batch) == BATCH_SIZE:
+            Recipe.objects.bulk_update(batch, ['image_key'])
+            batch = []
+    Recipe.objects.bulk_update(batch, ['image_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0015_unique_name'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_key',
+            field=models.CharField(blank=True, db_index=True, editable=False, max_length=64),
+        ),
+        migrations.RunPython(set_image_keys, migrations.RunPython.noop),
+    ]
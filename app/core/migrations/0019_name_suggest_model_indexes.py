@@ -0,0 +1,70 @@
+# Generated by Django 3.2.7 on 2026-10-18 03:57
+
+import core.indexes
+from django.db import migrations
+
+from core.migrations._helpers import run_statements
+
+
+TABLES = ('core_tag', 'core_ingredient')
+
+# the indexes of 0011 are replaced by Meta.indexes of the same names, the
+# trigram index keeps user_id with btree_gin
+POSTGRES_FORWARD = ['CREATE EXTENSION IF NOT EXISTS btree_gin']
+DROP_RAW_INDEXES = [
+    f'DROP INDEX IF EXISTS {table}_name_{suffix}'
+    for table in TABLES
+    for suffix in ('prefix', 'trgm')
+]
+# copy of the indexes of 0011, restored when migrating back
+POSTGRES_RAW_INDEXES = [
+    statement
+    for table in TABLES
+    for statement in (
+        f'CREATE INDEX {table}_name_prefix '
+        f'ON {table} (user_id, upper(name::text) text_pattern_ops)',
+        f'CREATE INDEX {table}_name_trgm '
+        f'ON {table} USING gin (name gin_trgm_ops)',
+    )
+]
+SQLITE_RAW_INDEXES = [
+    f'CREATE INDEX {table}_name_prefix '
+    f'ON {table} (user_id, name COLLATE NOCASE)'
+    for table in TABLES
+]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0018_recipe_count_cursor_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            run_statements({
+                'postgresql': POSTGRES_FORWARD + DROP_RAW_INDEXES,
+                'sqlite': DROP_RAW_INDEXES,
+            }),
+            run_statements({
+                'postgresql': POSTGRES_RAW_INDEXES,
+                'sqlite': SQLITE_RAW_INDEXES,
+            }),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=core.indexes.PrefixIndex(fields=['user', 'name'], name='core_ingredient_name_prefix'),
+        ),
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=core.indexes.TrigramIndex(fields=['user', 'name'], name='core_ingredient_name_trgm'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=core.indexes.PrefixIndex(fields=['user', 'name'], name='core_tag_name_prefix'),
+        ),
+        migrations.AddIndex(
+            model_name='tag',
+            index=core.indexes.TrigramIndex(fields=['user', 'name'], name='core_tag_name_trgm'),
+        ),
+    ]
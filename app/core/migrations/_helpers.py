@@ -0,0 +1,30 @@
+"""
+helpers shared by hand written migrations
+
+the migration loader skips modules starting with an underscore. like the
+migrations using them, these must keep their behaviour once released.
+"""
+
+
+def run_statements(statements):
+    """return a migration function running statements for the vendor"""
+    def run(apps, schema_editor):
+        for statement in statements.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(statement)
+    return run
+
+
+def restore_sqlite_indexes(apps, schema_editor):
+    """recreate the name indexes of migration 0011 on sqlite
+
+    adding a field or constraint rebuilds a sqlite table, dropping the
+    indexes django does not know about. from 0019 on they are model
+    indexes, recreated by the rebuild itself.
+    """
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    for table in ('core_tag', 'core_ingredient'):
+        schema_editor.execute(
+            f'CREATE INDEX IF NOT EXISTS {table}_name_prefix '
+            f'ON {table} (user_id, name COLLATE NOCASE)'
+        )
@@ -8,8 +8,12 @@ from django.contrib.auth.models import(
     PermissionsMixin,
 )
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.utils.translation import gettext as _
 
+from core.indexes import (PrefixIndex, TrigramIndex)
+from core.storage import recipe_image_storage
+
 
 def recipe_image_file_path(instance, filename):
     """generate file name for new recipe"""
@@ -19,6 +23,21 @@ def recipe_image_file_path(instance, filename):
     return os.path.join('uploads', 'recipe', filename)
 
 
+def normalize_name(name):
+    """return the case and whitespace folded key of a tag or ingredient"""
+    return ' '.join(name.split()).casefold()
+
+
+class NormalizedNameMixin:
+    """keep normalized_name in step with name, it is unique per user"""
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_name(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'normalized_name'}
+        super().save(*args, **kwargs)
+
 
 class UserManager(BaseUserManager):
     """manager for user"""
@@ -53,13 +72,38 @@ class User(AbstractBaseUser, PermissionsMixin):
 
     USERNAME_FIELD = 'email'
 
-class Ingredient(models.Model):
+class Ingredient(NormalizedNameMixin, models.Model):
     """ingredient for the recipe"""
     name = models.CharField(max_length=255)
+    normalized_name = models.CharField(max_length=255, editable=False)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    # maintained by recipe.counts
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # read in the order of the recipe_count cursor, see
+            # recipe.pagination
+            models.Index(fields=['user', 'recipe_count', 'id']),
+            # name suggestions, see recipe.suggest
+            PrefixIndex(
+                fields=['user', 'name'],
+                name='core_ingredient_name_prefix',
+            ),
+            TrigramIndex(
+                fields=['user', 'name'],
+                name='core_ingredient_name_trgm',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'normalized_name'],
+                name='unique_ingredient_name',
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -67,6 +111,15 @@ class Ingredient(models.Model):
 
 class Recipe(models.Model):
     """Recipe objects."""
+
+    class ImageStatus(models.TextChoices):
+        """processing state of the recipe image, see recipe.images"""
+        NONE = 'none', _('No image')
+        PENDING = 'pending', _('Pending')
+        PROCESSING = 'processing', _('Processing')
+        READY = 'ready', _('Ready')
+        FAILED = 'failed', _('Failed')
+
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
@@ -78,22 +131,155 @@ class Recipe(models.Model):
     link = models.CharField(max_length=255, blank=True)
     tags = models.ManyToManyField('Tag')
     ingredients = models.ManyToManyField('Ingredient')
-    image = models.ImageField(null=True, upload_to=recipe_image_file_path)
+    # stored once per distinct content, see core.storage
+    image = models.ImageField(
+        null=True,
+        upload_to=recipe_image_file_path,
+        storage=recipe_image_storage,
+    )
+    image_status = models.CharField(
+        max_length=16,
+        choices=ImageStatus.choices,
+        default=ImageStatus.NONE,
+    )
+    # variant key of the image, set when it becomes ready
+    image_key = models.CharField(
+        max_length=64,
+        blank=True,
+        db_index=True,
+        editable=False,
+    )
+    # maintained by recipe.search, only used on postgresql
+    search_vector = SearchVectorField(null=True, editable=False)
+    # also bumped when the tags or ingredients change, see recipe.signals
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'updated_at']),
+        ]
 
     def __str__(self):
         return self.title
 
 
 
-class Tag(models.Model):
+class Tag(NormalizedNameMixin, models.Model):
     """tags for filtering recipes"""
     name = models.CharField(max_length=255)
+    normalized_name = models.CharField(max_length=255, editable=False)
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
         on_delete=models.CASCADE,
     )
+    # maintained by recipe.counts
+    recipe_count = models.PositiveIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            # read in the order of the recipe_count cursor, see
+            # recipe.pagination
+            models.Index(fields=['user', 'recipe_count', 'id']),
+            # name suggestions, see recipe.suggest
+            PrefixIndex(
+                fields=['user', 'name'],
+                name='core_tag_name_prefix',
+            ),
+            TrigramIndex(
+                fields=['user', 'name'],
+                name='core_tag_name_trgm',
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'normalized_name'],
+                name='unique_tag_name',
+            ),
+        ]
+
+    def __str__(self):
+        return self.name
+
+
+class ImageBlob(models.Model):
+    """reference count of a file in content addressed storage"""
+    name = models.CharField(max_length=255, unique=True)
+    refs = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return self.name
 
 
+class UploadSession(models.Model):
+    """resumable upload of a recipe image, see recipe.uploads"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    recipe = models.ForeignKey(Recipe, on_delete=models.CASCADE)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    received = models.PositiveBigIntegerField(default=0)
+    expires_at = models.DateTimeField(db_index=True)
+
+    @property
+    def path(self):
+        """return the path of the partial upload"""
+        return os.path.join(
+            settings.UPLOAD_SESSIONS['ROOT'],
+            f'{self.id}.part',
+        )
+
+    def __str__(self):
+        return f'{self.filename} ({self.received}/{self.size})'
+
+
+class RecipeStats(models.Model):
+    """running totals of a user's recipes, see recipe.stats"""
+    user = models.OneToOneField(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+        primary_key=True,
+    )
+    recipe_count = models.IntegerField(default=0)
+    total_price = models.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        default=0,
+    )
+    total_time_minutes = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.user} ({self.recipe_count} recipes)'
+
+
+class RecipeTimeBucket(models.Model):
+    """number of a user's recipes in a time_minutes histogram bucket"""
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        on_delete=models.CASCADE,
+    )
+    # lower bound of the bucket in minutes
+    minutes_from = models.IntegerField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'minutes_from'],
+                name='unique_recipe_time_bucket',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.minutes_from}+ minutes: {self.count}'
+
+
+class ImportCheckpoint(models.Model):
+    """records consumed by an import, see the import_recipes command"""
+    name = models.CharField(max_length=255, unique=True)
+    records = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.name} ({self.records} records)'
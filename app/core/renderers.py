@@ -0,0 +1,67 @@
+"""
+fast renderers for the api
+
+JSON is encoded with orjson, internal clients may ask for MessagePack.
+both keep the output of DRF's JSON encoder for values orjson and msgpack
+do not handle the same way, e.g. datetimes and decimals.
+"""
+import decimal
+
+import msgpack
+import orjson
+from django.db.models.fields.files import FieldFile
+from rest_framework.renderers import BaseRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+_encoder = JSONEncoder()
+
+# datetimes are passed to the default to keep DRF's format
+ORJSON_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+
+
+def encode_default(obj):
+    """return a serializable form of a value, as DRF's encoder does"""
+    if isinstance(obj, FieldFile):
+        return obj.url if obj else None
+    return _encoder.default(obj)
+
+
+def _msgpack_default(obj):
+    """encode decimals as strings, like DRF's COERCE_DECIMAL_TO_STRING"""
+    if isinstance(obj, decimal.Decimal):
+        return str(obj)
+    return encode_default(obj)
+
+
+class ORJSONRenderer(BaseRenderer):
+    """render JSON with orjson"""
+    media_type = 'application/json'
+    format = 'json'
+    charset = None
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        options = ORJSON_OPTIONS
+        renderer_context = renderer_context or {}
+        if renderer_context.get('indent'):
+            options |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, default=encode_default, option=options)
+
+
+class MessagePackRenderer(BaseRenderer):
+    """render MessagePack for internal clients"""
+    media_type = 'application/msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(
+            data,
+            default=_msgpack_default,
+            use_bin_type=True,
+        )
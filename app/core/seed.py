@@ -0,0 +1,284 @@
+"""
+synthetic users with recipes, tags and ingredients at production scale
+
+every user draws its number of recipes, tags and ingredients from a
+``distribution`` and its recipes link a drawn number of tags and
+ingredients, popular ones more often. each user has a random generator
+of its own seeded from the run seed and its index, so a seed always gives
+the same data whatever the batch size or number of processes.
+
+rows are written per batch of users in one transaction, with COPY on
+postgresql, and counted by the ``recipes_bulk_changed`` receivers like any
+bulk write. password hashing, the slowest part, runs in a process pool
+one batch ahead of the writes.
+"""
+import itertools
+import random
+import string
+from concurrent.futures import ProcessPoolExecutor
+from decimal import Decimal
+
+import django
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.db import (connection, transaction)
+
+from core.bulk import (insert_objects, insert_recipes, link_recipes)
+from core.models import (Ingredient, Recipe, Tag, normalize_name)
+from core.signals import recipes_bulk_changed
+from recipe.stats import create_user_stats
+
+
+EMAIL_DOMAIN = 'seed.example.com'
+FIRST_NAMES = (
+    'Ada', 'Ama', 'Ben', 'Chen', 'Dara', 'Efua', 'Felix', 'Grace', 'Hana',
+    'Ivan', 'Jo', 'Kofi', 'Lena', 'Mia', 'Nana', 'Omar', 'Priya', 'Sam',
+)
+LAST_NAMES = (
+    'Asante', 'Boateng', 'Costa', 'Diaz', 'Evans', 'Fischer', 'Garcia',
+    'Kim', 'Mensah', 'Novak', 'Okafor', 'Owusu', 'Rossi', 'Silva', 'Tanaka',
+)
+TAG_NAMES = (
+    'Vegan', 'Vegetarian', 'Dessert', 'Breakfast', 'Dinner', 'Lunch',
+    'Quick', 'Spicy', 'Gluten Free', 'Comfort Food', 'Healthy', 'Soup',
+    'Salad', 'Baking', 'Street Food', 'Holiday', 'Budget', 'One Pot',
+)
+INGREDIENT_NAMES = (
+    'Tomato', 'Onion', 'Garlic', 'Salt', 'Pepper', 'Olive Oil', 'Butter',
+    'Flour', 'Sugar', 'Egg', 'Milk', 'Rice', 'Chicken', 'Beef', 'Salmon',
+    'Basil', 'Ginger', 'Lemon', 'Spinach', 'Cheese', 'Pasta', 'Beans',
+    'Carrot', 'Potato', 'Chili', 'Coconut Milk', 'Yam', 'Plantain',
+)
+TITLE_WORDS = (
+    'Roasted', 'Grilled', 'Creamy', 'Quick', 'Spicy', 'Smoky', 'Classic',
+    'Crispy', 'Stew', 'Curry', 'Soup', 'Bake', 'Salad', 'Bowl', 'Stir Fry',
+)
+SALT_CHARS = string.ascii_letters + string.digits
+
+
+def distribution(spec):
+    """return a function drawing counts, from a spec as given on the cli
+
+    ``N`` is always N, ``LOW-HIGH`` uniform between both and ``exp:MEAN``
+    exponential around the mean, a few large values and many small ones.
+    """
+    if spec.startswith('exp:'):
+        mean = float(spec[4:])
+        if mean <= 0:
+            raise ValueError(spec)
+        return lambda rng: int(rng.expovariate(1 / mean))
+    low, _, high = spec.partition('-')
+    low = int(low)
+    high = int(high) if high else low
+    if low < 0 or high < low:
+        raise ValueError(spec)
+    return lambda rng: rng.randint(low, high)
+
+
+def seed_email(seed, index):
+    """return the email of a seeded user"""
+    return f'user{index}.seed{seed}@{EMAIL_DOMAIN}'
+
+
+def _names(rng, vocabulary, count):
+    """return distinct names, in the order of their popularity"""
+    names = [
+        vocabulary[index % len(vocabulary)]
+        + (f' {index // len(vocabulary) + 1}' if index >= len(vocabulary)
+           else '')
+        for index in range(count)
+    ]
+    rng.shuffle(names)
+    return names
+
+
+def _popularity(count):
+    """return zipf cumulative weights of ranked names"""
+    return list(itertools.accumulate(1 / rank for rank in range(1, count + 1)))
+
+
+def _hash(seed, indexes, password, pool):
+    """return the password hashes of users, computed in the pool if any"""
+    salts = [
+        ''.join(random.Random(f'{seed}:{index}:salt').choices(
+            SALT_CHARS,
+            k=22,
+        ))
+        for index in indexes
+    ]
+    if pool is None:
+        return map(make_password, itertools.repeat(password), salts)
+    return pool.map(
+        make_password,
+        itertools.repeat(password, len(salts)),
+        salts,
+        chunksize=64,
+    )
+
+
+def _build_recipes(rng, user_id, count, tags, ingredients, options):
+    """return new recipes of a user with the tag and ingredient ids of each"""
+    tag_weights = _popularity(len(tags))
+    ingredient_weights = _popularity(len(ingredients))
+    rows = []
+    for _ in range(count):
+        recipe = Recipe(
+            user_id=user_id,
+            title=' '.join(rng.sample(TITLE_WORDS, 2) + [
+                rng.choice(INGREDIENT_NAMES),
+            ]),
+            time_minutes=max(5, min(int(rng.lognormvariate(3.5, 0.6)), 480)),
+            price=Decimal(rng.randint(150, 6000)) / 100,
+        )
+        rows.append((
+            recipe,
+            rng.choices(
+                tags,
+                cum_weights=tag_weights,
+                k=options['tags_per_recipe'](rng),
+            ) if tags else [],
+            rng.choices(
+                ingredients,
+                cum_weights=ingredient_weights,
+                k=options['ingredients_per_recipe'](rng),
+            ) if ingredients else [],
+        ))
+    return rows
+
+
+def _insert_names(model, users, rngs, vocabulary, draw):
+    """insert the tags or ingredients of users, returning ids per user"""
+    names = {
+        user.pk: _names(rng, vocabulary, draw(rng))
+        for user, rng in zip(users, rngs)
+    }
+    objs = insert_objects(model, [
+        model(user_id=user_id, name=name, normalized_name=normalize_name(name))
+        for user_id, user_names in names.items() for name in user_names
+    ])
+    if objs and objs[0].pk is None:
+        objs = model.objects.filter(user_id__in=names)
+    ids = {(obj.user_id, obj.normalized_name): obj.pk for obj in objs}
+    return {
+        user_id: [ids[user_id, normalize_name(name)] for name in user_names]
+        for user_id, user_names in names.items()
+    }
+
+
+def _analyze():
+    """update the postgresql statistics of the tables a batch grows
+
+    the ``recipes_bulk_changed`` receivers join the new rows, planned with
+    the statistics of a still empty database they scan the links once per
+    recipe.
+    """
+    if connection.vendor != 'postgresql':
+        return
+    tables = [
+        model._meta.db_table
+        for model in (get_user_model(), Tag, Ingredient, Recipe)
+    ] + [
+        Recipe._meta.get_field(name).remote_field.through._meta.db_table
+        for name in ('tags', 'ingredients')
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute(f'ANALYZE {", ".join(tables)}')
+
+
+def _write_batch(seed, first, rngs, hashes, options):
+    """insert a batch of users with everything they own"""
+    User = get_user_model()
+    users = [
+        User(
+            email=seed_email(seed, index),
+            name=f'{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}',
+            password=password,
+        )
+        for index, rng, password in zip(itertools.count(first), rngs, hashes)
+    ]
+    with transaction.atomic():
+        insert_objects(User, users)
+        if users[0].pk is None:
+            ids = dict(User.objects.filter(
+                email__in=[user.email for user in users],
+            ).values_list('email', 'pk'))
+            for user in users:
+                user.pk = ids[user.email]
+        create_user_stats(*(user.pk for user in users))
+        tags = _insert_names(Tag, users, rngs, TAG_NAMES, options['tags'])
+        ingredients = _insert_names(
+            Ingredient,
+            users,
+            rngs,
+            INGREDIENT_NAMES,
+            options['ingredients'],
+        )
+        rows = [
+            row
+            for user, rng in zip(users, rngs)
+            for row in _build_recipes(
+                rng,
+                user.pk,
+                options['recipes'](rng),
+                tags[user.pk],
+                ingredients[user.pk],
+                options,
+            )
+        ]
+        recipes = insert_recipes([row[0] for row in rows])
+        for index, field_name in enumerate(('tags', 'ingredients'), 1):
+            link_recipes(field_name, [
+                (row[0].pk, related_id)
+                for row in rows for related_id in row[index]
+            ])
+        _analyze()
+        recipes_bulk_changed.send(
+            sender=Recipe,
+            user_ids={user.pk for user in users},
+            recipe_ids=[recipe.pk for recipe in recipes],
+        )
+    return len(recipes)
+
+
+def seed_users(users, seed=0, batch_size=500, processes=1,
+               password='password', hash_once=False, **options):
+    """create seeded users in batches, yielding (users, recipes) per batch
+
+    ``options`` hold the ``recipes``, ``tags``, ``ingredients``,
+    ``tags_per_recipe`` and ``ingredients_per_recipe`` distributions. with
+    ``hash_once`` every user shares the hash of the first, which skips
+    nearly all of the hashing.
+    """
+    batches = [
+        range(first, min(first + batch_size, users))
+        for first in range(0, users, batch_size)
+    ]
+    pool = None
+    if processes > 1 and not hash_once:
+        pool = ProcessPoolExecutor(processes, initializer=django.setup)
+    if hash_once:
+        shared = next(_hash(seed, [0], password, None))
+
+    def hash_batch(indexes):
+        if hash_once:
+            return itertools.repeat(shared, len(indexes))
+        return _hash(seed, indexes, password, pool)
+
+    try:
+        hashes = hash_batch(batches[0]) if batches else None
+        for number, indexes in enumerate(batches, 1):
+            current = list(hashes)
+            if number < len(batches):
+                # hashed while this batch is written
+                hashes = hash_batch(batches[number])
+            recipes = _write_batch(
+                seed,
+                indexes.start,
+                [random.Random(f'{seed}:{index}') for index in indexes],
+                current,
+                options,
+            )
+            yield len(indexes), recipes
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
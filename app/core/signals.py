@@ -0,0 +1,30 @@
+"""
+signals and signal handlers for the core models
+"""
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (post_delete, post_save)
+from django.dispatch import (Signal, receiver)
+
+from rest_framework.authtoken.models import Token
+
+from core.authentication import invalidate_tokens
+
+
+# sent with ``user_ids`` and ``recipe_ids`` after recipes and their m2m rows
+# were written in bulk, bypassing the model and m2m_changed signals
+recipes_bulk_changed = Signal()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(sender, instance, **kwargs):
+    """forget a deleted token"""
+    invalidate_tokens(instance.key)
+
+
+@receiver(post_save, sender=get_user_model())
+def user_saved(sender, instance, created, **kwargs):
+    """forget the tokens of a changed user"""
+    if not created:
+        invalidate_tokens(*Token.objects.filter(
+            user=instance,
+        ).values_list('key', flat=True))
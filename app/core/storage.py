@@ -0,0 +1,85 @@
+"""
+content addressed file storage
+
+files are named after the sha256 digest of their content, so identical
+uploads are stored once. every save takes a reference on the file and
+every delete drops one, the file is only removed with its last reference.
+"""
+import hashlib
+import os
+import posixpath
+import tempfile
+
+from django.apps import apps
+from django.core.files.storage import FileSystemStorage
+from django.db import transaction
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """file system storage keeping every distinct file once
+
+    the directory and extension of the requested name are kept, the file
+    name is replaced by the digest. the upload is hashed while it is
+    streamed to a temporary file next to its final location.
+    """
+
+    def _blobs(self):
+        """return the reference count model"""
+        return apps.get_model('core', 'ImageBlob')
+
+    def get_available_name(self, name, max_length=None):
+        """names are derived from the content, clashes are the same file"""
+        return name
+
+    def _save(self, name, content):
+        directory = posixpath.dirname(name)
+        ext = os.path.splitext(name)[1].lower()
+        os.makedirs(self.path(directory), exist_ok=True)
+        digest = hashlib.sha256()
+        fd, tmp_path = tempfile.mkstemp(
+            dir=self.path(directory),
+            suffix='.upload',
+        )
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    tmp.write(chunk)
+            hexdigest = digest.hexdigest()
+            name = posixpath.join(directory, hexdigest[:2], hexdigest + ext)
+            with transaction.atomic():
+                blob, _ = self._blobs().objects.select_for_update(
+                ).get_or_create(name=name)
+                full_path = self.path(name)
+                if not os.path.exists(full_path):
+                    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+                    os.replace(tmp_path, full_path)
+                    if self.file_permissions_mode is not None:
+                        os.chmod(full_path, self.file_permissions_mode)
+                blob.refs += 1
+                blob.save(update_fields=['refs'])
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+        return name
+
+    def delete(self, name):
+        """drop a reference, deleting the file with the last one
+
+        files without a reference count predate this storage and are
+        deleted right away.
+        """
+        with transaction.atomic():
+            blob = self._blobs().objects.select_for_update().filter(
+                name=name,
+            ).first()
+            if blob is not None and blob.refs > 1:
+                blob.refs -= 1
+                blob.save(update_fields=['refs'])
+                return
+            if blob is not None:
+                blob.delete()
+            super().delete(name)
+
+
+recipe_image_storage = ContentAddressedStorage()
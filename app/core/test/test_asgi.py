@@ -0,0 +1,279 @@
+"""
+test for the asgi thread pool wrapper
+"""
+import asyncio
+import threading
+
+from asgiref.sync import sync_to_async
+from django.test import SimpleTestCase
+from django.urls import reverse
+
+from core.asgi import (SyncChainHandler, ThreadPoolApplication)
+
+
+HTTP_SCOPE = {'type': 'http', 'method': 'GET', 'path': '/'}
+
+
+def body_receive(*chunks):
+    """return a receive callable sending chunks as the request body"""
+    messages = [
+        {
+            'type': 'http.request',
+            'body': chunk,
+            'more_body': index + 1 < len(chunks),
+        }
+        for index, chunk in enumerate(chunks)
+    ]
+    received = []
+
+    async def receive():
+        received.append(messages[len(received)])
+        return received[-1]
+    receive.received = received
+    return receive
+
+
+async def discard(message):
+    """send callable dropping everything"""
+
+
+class ThreadPoolApplicationTests(SimpleTestCase):
+    """test sync code of requests runs on a bounded set of threads"""
+
+    def test_requests_run_in_parallel(self):
+        """test the sync code of two requests runs at the same time"""
+        asyncio.run(self._requests_run_in_parallel())
+
+    async def _requests_run_in_parallel(self):
+        barrier = threading.Barrier(2, timeout=5)
+
+        async def app(scope, receive, send):
+            await sync_to_async(barrier.wait, thread_sensitive=True)()
+
+        wrapper = ThreadPoolApplication(app, threads=2, buffer_size=1024)
+        await asyncio.gather(*(
+            wrapper(HTTP_SCOPE, body_receive(b''), discard)
+            for _ in range(2)
+        ))
+
+        self.assertFalse(barrier.broken)
+
+    def test_request_keeps_its_thread(self):
+        """test every sync call of a request runs on the same thread"""
+        asyncio.run(self._request_keeps_its_thread())
+
+    async def _request_keeps_its_thread(self):
+        threads = []
+
+        async def app(scope, receive, send):
+            for _ in range(3):
+                threads.append(await sync_to_async(
+                    threading.get_ident,
+                    thread_sensitive=True,
+                )())
+
+        wrapper = ThreadPoolApplication(app, threads=4, buffer_size=1024)
+        await wrapper(HTTP_SCOPE, body_receive(b''), discard)
+
+        self.assertEqual(len(set(threads)), 1)
+        self.assertNotEqual(threads[0], threading.get_ident())
+
+    def test_threads_bounded(self):
+        """test no more requests than threads run sync code at once"""
+        asyncio.run(self._threads_bounded())
+
+    async def _threads_bounded(self):
+        running = []
+        peak = []
+
+        def work():
+            running.append(1)
+            peak.append(len(running))
+            threading.Event().wait(0.01)
+            running.pop()
+
+        async def app(scope, receive, send):
+            await sync_to_async(work, thread_sensitive=True)()
+
+        wrapper = ThreadPoolApplication(app, threads=2, buffer_size=1024)
+        await asyncio.gather(*(
+            wrapper(HTTP_SCOPE, body_receive(b''), discard)
+            for _ in range(6)
+        ))
+
+        self.assertEqual(max(peak), 2)
+
+    def test_body_buffered_before_thread(self):
+        """test a waiting request receives its body meanwhile"""
+        asyncio.run(self._body_buffered_before_thread())
+
+    async def _body_buffered_before_thread(self):
+        release = asyncio.Event()
+        bodies = []
+
+        async def app(scope, receive, send):
+            body = b''
+            while True:
+                message = await receive()
+                body += message['body']
+                if not message['more_body']:
+                    break
+            bodies.append(body)
+            await release.wait()
+
+        wrapper = ThreadPoolApplication(app, threads=1, buffer_size=1024)
+        first = asyncio.ensure_future(
+            wrapper(HTTP_SCOPE, body_receive(b''), discard),
+        )
+        receive = body_receive(b'ab', b'cd')
+        second = asyncio.ensure_future(wrapper(HTTP_SCOPE, receive, discard))
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(len(receive.received), 2)
+        self.assertEqual(bodies, [b''])
+
+        release.set()
+        await asyncio.gather(first, second)
+        self.assertEqual(bodies, [b'', b'abcd'])
+
+    def test_buffers_bounded(self):
+        """test waiting requests stop buffering at the total"""
+        asyncio.run(self._buffers_bounded())
+
+    async def _buffers_bounded(self):
+        release = asyncio.Event()
+        bodies = []
+
+        async def app(scope, receive, send):
+            body = b''
+            while True:
+                message = await receive()
+                body += message['body']
+                if not message['more_body']:
+                    break
+            bodies.append(body)
+            await release.wait()
+
+        wrapper = ThreadPoolApplication(
+            app,
+            threads=1,
+            buffer_size=1024,
+            buffer_total=2,
+        )
+        first = asyncio.ensure_future(
+            wrapper(HTTP_SCOPE, body_receive(b''), discard),
+        )
+        second_receive = body_receive(b'ab', b'cd')
+        third_receive = body_receive(b'ef')
+        waiting = [
+            asyncio.ensure_future(wrapper(HTTP_SCOPE, receive, discard))
+            for receive in (second_receive, third_receive)
+        ]
+        await asyncio.sleep(0.01)
+
+        self.assertEqual(len(second_receive.received), 1)
+        self.assertEqual(len(third_receive.received), 0)
+
+        release.set()
+        await asyncio.gather(first, *waiting)
+        self.assertEqual(bodies, [b'', b'abcd', b'ef'])
+        self.assertEqual(wrapper._buffered, 0)
+
+    def test_large_body_streamed(self):
+        """test a body past the buffer size is passed through"""
+        asyncio.run(self._large_body_streamed())
+
+    async def _large_body_streamed(self):
+        bodies = []
+
+        async def app(scope, receive, send):
+            body = b''
+            while True:
+                message = await receive()
+                body += message['body']
+                if not message['more_body']:
+                    break
+            bodies.append(body)
+
+        wrapper = ThreadPoolApplication(app, threads=1, buffer_size=2)
+        await wrapper(HTTP_SCOPE, body_receive(b'ab', b'cd', b'ef'), discard)
+
+        self.assertEqual(bodies, [b'abcdef'])
+
+    def test_lifespan(self):
+        """test startup and shutdown are acknowledged"""
+        asyncio.run(self._lifespan())
+
+    async def _lifespan(self):
+        messages = [
+            {'type': 'lifespan.startup'},
+            {'type': 'lifespan.shutdown'},
+        ]
+        sent = []
+
+        async def receive():
+            return messages.pop(0)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        wrapper = ThreadPoolApplication(None, threads=1, buffer_size=1024)
+        await wrapper({'type': 'lifespan'}, receive, send)
+
+        self.assertEqual(
+            sent,
+            ['lifespan.startup.complete', 'lifespan.shutdown.complete'],
+        )
+
+    def test_async_views_routed(self):
+        """test only paths of async views go to the async application"""
+        wrapper = ThreadPoolApplication(
+            SyncChainHandler(),
+            threads=1,
+            buffer_size=1024,
+            async_application=object(),
+        )
+        variant_path = reverse('recipe:image-variant', kwargs={
+            'key': 'abc',
+            'variant': 'thumb',
+            'ext': 'webp',
+        })
+
+        self.assertTrue(wrapper.is_async_view({'path': variant_path}))
+        self.assertTrue(wrapper.is_async_view({
+            'path': f'/prefix{variant_path}',
+            'root_path': '/prefix',
+        }))
+        self.assertFalse(wrapper.is_async_view({
+            'path': reverse('recipe:recipe-list'),
+        }))
+        self.assertFalse(wrapper.is_async_view({'path': '/missing/'}))
+
+    def test_sync_chain_handler(self):
+        """test the sync chain handler serves a request"""
+        asyncio.run(self._sync_chain_handler())
+
+    async def _sync_chain_handler(self):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        wrapper = ThreadPoolApplication(
+            SyncChainHandler(),
+            threads=1,
+            buffer_size=1024,
+        )
+        await wrapper(
+            dict(
+                HTTP_SCOPE,
+                path='/missing/',
+                headers=[(b'host', b'testserver')],
+                query_string=b'',
+            ),
+            body_receive(b''),
+            send,
+        )
+
+        self.assertEqual(sent[0]['type'], 'http.response.start')
+        self.assertEqual(sent[0]['status'], 404)
@@ -0,0 +1,91 @@
+"""
+test for the cached token authentication
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from core.authentication import AUTH_CACHE_ALIAS
+
+
+ME_URL = reverse('user:me')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class CachedTokenAuthenticationTests(TestCase):
+    """test token lookups are cached and invalidated"""
+
+    def setUp(self):
+        caches[AUTH_CACHE_ALIAS].clear()
+        self.user = get_user_model().objects.create_user(
+            email='user@example.com',
+            password='testpass123',
+            name='Test Name',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def _count_queries(self, url):
+        """return the status code and number of queries of a request"""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url)
+        return res.status_code, len(ctx.captured_queries)
+
+    def test_lookup_cached(self):
+        """test repeated requests skip the token query"""
+        code, first = self._count_queries(ME_URL)
+        self.assertEqual(code, status.HTTP_200_OK)
+
+        code, second = self._count_queries(ME_URL)
+        self.assertEqual(code, status.HTTP_200_OK)
+        self.assertEqual(second, first - 1)
+
+    def test_invalid_token_rejected(self):
+        """test unknown tokens are still rejected"""
+        self.client.credentials(HTTP_AUTHORIZATION='Token invalid')
+
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_token_deletion(self):
+        """test a deleted token stops working immediately"""
+        self.client.get(TAGS_URL)
+
+        self.token.delete()
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_user_deactivation(self):
+        """test a deactivated user is rejected immediately"""
+        self.client.get(TAGS_URL)
+
+        self.user.is_active = False
+        self.user.save()
+        res = self.client.get(TAGS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_password_change(self):
+        """test changing the password refreshes the cached user"""
+        self.client.get(ME_URL)
+
+        res = self.client.patch(ME_URL, {'password': 'newpassword123'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(ME_URL)
+        self.assertTrue(any(
+            'authtoken_token' in q['sql'] for q in ctx.captured_queries
+        ))
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('newpassword123'))
@@ -0,0 +1,48 @@
+"""
+test for the COPY writes of core.bulk
+"""
+import unittest
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import (SimpleTestCase, TestCase)
+
+from core.bulk import (_copy, _copy_objects)
+
+
+class RecordingCursor:
+    """cursor keeping what COPY would have read"""
+
+    def copy_expert(self, sql, buffer):
+        self.sql = sql
+        self.data = buffer.read()
+
+
+class CopyFormatTests(SimpleTestCase):
+    """test rows are written as postgresql reads them"""
+
+    def test_null_and_empty_string(self):
+        """test None is an unquoted NULL and '' a quoted empty string"""
+        cursor = RecordingCursor()
+
+        _copy(cursor, 'core_recipe', ['a', 'b', 'c', 'd'], [
+            (None, '', 'say "hi"', 5),
+        ])
+
+        self.assertEqual(cursor.data, ',"","say ""hi""","5"\n')
+        self.assertIn('FORMAT csv', cursor.sql)
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'COPY is postgresql')
+class CopyObjectsTests(TestCase):
+    """test rows round trip through COPY"""
+
+    def test_none_round_trips(self):
+        """test a None value is stored as NULL"""
+        user = get_user_model()(email='copy@example.com', name='')
+
+        _copy_objects(get_user_model(), [user])
+
+        stored = get_user_model().objects.get(pk=user.pk)
+        self.assertIsNone(stored.last_login)
+        self.assertEqual(stored.name, '')
@@ -2,11 +2,20 @@
 test custom Django management commands
 """
 
+import io
+import json
+import os
+import tempfile
 from unittest.mock import patch
 from psycopg2 import OperationalError as Psycopg2Error
+from django.contrib.auth import get_user_model
 from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.db.utils import OperationalError
-from django.test import SimpleTestCase
+from django.test import SimpleTestCase, TestCase
+
+from core.management.commands.import_recipes import Command
+from core.models import ImportCheckpoint, Recipe, Tag
 
 
 @patch('core.management.commands.wait_for_db.Command.check')
@@ -31,3 +40,140 @@ class CommandTest(SimpleTestCase):
         self.assertEqual(patched_check.call_count, 6)
         patched_check.assert_called_with(databases = ['default'])
 
+
+class ImportRecipesTests(TestCase):
+    """test the import_recipes command"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+
+    def _write(self, name, content):
+        """write a file to the temporary directory and return its path"""
+        path = os.path.join(self.tmpdir.name, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def _ndjson(self, count, start=0):
+        """return ndjson for a number of sample recipes"""
+        return ''.join(json.dumps({
+            'title': f'Recipe {i}',
+            'time_minutes': 10,
+            'price': '5.50',
+            'tags': ['Vegan', {'name': f'Tag {i % 2}'}],
+            'ingredients': ['Salt'],
+        }) + '\n' for i in range(start, start + count))
+
+    def _import(self, *args, **kwargs):
+        """run the command and return its output"""
+        out = io.StringIO()
+        call_command(
+            'import_recipes',
+            *args,
+            user=self.user.email,
+            stdout=out,
+            **kwargs,
+        )
+        return out.getvalue()
+
+    def test_import_ndjson(self):
+        """test importing recipes from an ndjson file in batches"""
+        path = self._write('recipes.ndjson', self._ndjson(5))
+
+        out = self._import(path, batch_size=2)
+
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 5)
+        self.assertIn('rows/sec', out)
+        self.assertEqual(
+            sorted(Tag.objects.values_list('name', flat=True)),
+            ['Tag 0', 'Tag 1', 'Vegan'],
+        )
+        recipe = recipes.get(title='Recipe 3')
+        self.assertEqual(
+            sorted(t.name for t in recipe.tags.all()),
+            ['Tag 1', 'Vegan'],
+        )
+        self.assertEqual(recipe.ingredients.get().name, 'Salt')
+
+    def test_import_csv(self):
+        """test importing recipes from a csv file"""
+        path = self._write(
+            'recipes.csv',
+            'title,time_minutes,price,tags,ingredients\n'
+            'Soup,20,4.00,Vegan|Warm,Water|Salt\n'
+            'Bread,60,2.50,,\n',
+        )
+
+        self._import(path)
+
+        soup = Recipe.objects.get(title='Soup')
+        self.assertEqual(soup.tags.count(), 2)
+        self.assertEqual(soup.ingredients.count(), 2)
+        bread = Recipe.objects.get(title='Bread')
+        self.assertEqual(bread.time_minutes, 60)
+        self.assertEqual(bread.tags.count(), 0)
+
+    def test_import_stdin(self):
+        """test records can be read from stdin"""
+        self._import(stdin=io.StringIO(self._ndjson(3)))
+
+        self.assertEqual(Recipe.objects.count(), 3)
+
+    def test_resume_from_checkpoint(self):
+        """test an import resumes after the checkpointed records"""
+        path = self._write('recipes.ndjson', self._ndjson(3))
+        self._import(path, checkpoint='recipes')
+
+        path = self._write('recipes.ndjson', self._ndjson(5))
+        self._import(path, checkpoint='recipes', resume=True)
+
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)),
+            [f'Recipe {i}' for i in range(5)],
+        )
+        self.assertEqual(
+            ImportCheckpoint.objects.get(name='recipes').records,
+            5,
+        )
+
+    def test_checkpoint_in_batch_transaction(self):
+        """test a batch whose checkpoint fails is not kept"""
+        path = self._write('recipes.ndjson', self._ndjson(5))
+        save = Command._save_checkpoint
+        calls = []
+
+        def crash_second(command, name, records):
+            calls.append(records)
+            if len(calls) == 2:
+                raise RuntimeError('crash')
+            save(command, name, records)
+
+        with patch.object(Command, '_save_checkpoint', crash_second):
+            with self.assertRaises(RuntimeError):
+                self._import(path, batch_size=2, checkpoint='recipes')
+        self.assertEqual(Recipe.objects.count(), 2)
+
+        self._import(path, batch_size=2, checkpoint='recipes', resume=True)
+
+        self.assertEqual(
+            sorted(Recipe.objects.values_list('title', flat=True)),
+            [f'Recipe {i}' for i in range(5)],
+        )
+
+    def test_invalid_record(self):
+        """test an invalid record stops the import with its number"""
+        path = self._write(
+            'recipes.ndjson',
+            self._ndjson(2) + json.dumps({'title': 'No time'}) + '\n',
+        )
+
+        with self.assertRaisesMessage(CommandError, 'record 3'):
+            self._import(path, batch_size=2)
+
+        self.assertEqual(Recipe.objects.count(), 2)
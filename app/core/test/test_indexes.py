@@ -0,0 +1,43 @@
+"""
+test for the name indexes of tags and ingredients
+"""
+import unittest
+
+from django.db import connection
+from django.test import SimpleTestCase
+
+from core.models import (Ingredient, Tag)
+
+
+INDEXES = ('name_prefix', 'name_trgm')
+
+
+class NameIndexTests(SimpleTestCase):
+    """test the name indexes are known to migrations"""
+    databases = {'default'}
+
+    def test_indexes_created(self):
+        """test the migrated tables have the name indexes"""
+        for model in (Tag, Ingredient):
+            table = model._meta.db_table
+            with connection.cursor() as cursor:
+                constraints = connection.introspection.get_constraints(
+                    cursor,
+                    table,
+                )
+            for suffix in INDEXES:
+                self.assertIn(f'{table}_{suffix}', constraints)
+
+    @unittest.skipUnless(connection.vendor == 'sqlite', 'sqlite rebuilds')
+    def test_sqlite_rebuild_keeps_indexes(self):
+        """test rebuilding a sqlite table recreates the name indexes"""
+        with connection.schema_editor(collect_sql=True) as editor:
+            editor._remake_table(Tag)
+
+        sql = '\n'.join(editor.collected_sql)
+        self.assertIn(
+            'CREATE INDEX "core_tag_name_prefix" ON "core_tag" '
+            '("user_id", "name" COLLATE NOCASE)',
+            sql,
+        )
+        self.assertIn('CREATE INDEX "core_tag_name_trgm"', sql)
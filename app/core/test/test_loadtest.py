@@ -0,0 +1,157 @@
+"""
+test for the api load test command
+"""
+import io
+import json
+import os
+import random
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import (SimpleTestCase, TestCase)
+
+from core.loadtest import (
+    LOADTEST_EMAIL,
+    SCENARIOS,
+    InProcessClient,
+    compare,
+    create_fixture,
+    run,
+)
+
+
+def endpoint(**metrics):
+    """return the results of a scenario"""
+    result = {
+        'requests': 100,
+        'errors': 0,
+        'throughput': 50.0,
+        'p50_ms': 10.0,
+        'p95_ms': 20.0,
+        'p99_ms': 30.0,
+        'queries_per_request': 4.0,
+    }
+    result.update(metrics)
+    return result
+
+
+class LoadTestRunTests(TestCase):
+    """test running workloads in process"""
+
+    def test_every_scenario_succeeds(self):
+        """test each scenario sends a valid request"""
+        fixture = create_fixture(recipes=5)
+        rng = random.Random(0)
+        plan = [
+            (name, *make_request(fixture, rng))
+            for name, (_, make_request) in SCENARIOS.items()
+        ]
+
+        result = run(InProcessClient(fixture['token']), plan)
+
+        self.assertEqual(set(result['endpoints']), set(SCENARIOS))
+        for name, metrics in result['endpoints'].items():
+            self.assertEqual(metrics['errors'], 0, name)
+            self.assertIsNotNone(metrics['queries_per_request'])
+        self.assertEqual(result['requests'], len(SCENARIOS))
+
+    def test_command_saves_results(self):
+        """test the command writes json and removes its data"""
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'results.json')
+            call_command(
+                'loadtest',
+                '--requests', '30',
+                '--warmup', '0',
+                '--recipes', '5',
+                '--weight', 'user-token=0',
+                '--output', path,
+                stdout=io.StringIO(),
+            )
+            with open(path) as results:
+                result = json.load(results)
+
+        self.assertEqual(result['requests'], 30)
+        self.assertEqual(result['target'], 'in-process')
+        self.assertEqual(result['weights']['user-token'], 0)
+        self.assertNotIn('user-token', result['endpoints'])
+        self.assertFalse(
+            get_user_model().objects.filter(email=LOADTEST_EMAIL).exists()
+        )
+
+    def test_command_fails_on_regression(self):
+        """test a run worse than the baseline fails"""
+        baseline = {'endpoints': {'user-me': endpoint(
+            requests=1000,
+            throughput=1e9,
+            queries_per_request=0.0,
+        )}}
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'baseline.json')
+            with open(path, 'w') as baseline_file:
+                json.dump(baseline, baseline_file)
+
+            with self.assertRaises(CommandError):
+                call_command(
+                    'loadtest',
+                    '--requests', '20',
+                    '--warmup', '0',
+                    '--recipes', '1',
+                    '--weight', 'user-me=1',
+                    *[f'--weight={name}=0' for name in SCENARIOS
+                      if name != 'user-me'],
+                    '--baseline', path,
+                    stdout=io.StringIO(),
+                    stderr=io.StringIO(),
+                )
+
+    def test_concurrency_needs_url(self):
+        """test parallel requests are only sent to a server"""
+        with self.assertRaises(CommandError):
+            call_command('loadtest', '--concurrency', '4')
+
+
+class CompareTests(SimpleTestCase):
+    """test runs are compared against a baseline"""
+
+    def test_within_threshold(self):
+        """test changes within the threshold are accepted"""
+        baseline = {'endpoints': {'recipe-list': endpoint()}}
+        result = {'endpoints': {'recipe-list': endpoint(
+            p95_ms=23.0,
+            throughput=45.0,
+            queries_per_request=4.5,
+        )}}
+
+        self.assertEqual(compare(result, baseline, 20), [])
+
+    def test_regressions(self):
+        """test slower, chattier or failing scenarios are reported"""
+        baseline = {'endpoints': {'recipe-list': endpoint()}}
+        result = {'endpoints': {'recipe-list': endpoint(
+            p99_ms=40.0,
+            throughput=30.0,
+            queries_per_request=6.0,
+            errors=2,
+        )}}
+
+        regressions = compare(result, baseline, 20)
+
+        self.assertEqual(len(regressions), 4)
+        self.assertIn('recipe-list p99_ms: 30.0 -> 40.0', regressions)
+
+    def test_noise_ignored(self):
+        """test tiny latencies and rare scenarios are not compared"""
+        baseline = {'endpoints': {
+            'user-me': endpoint(p50_ms=0.5),
+            'user-token': endpoint(requests=3),
+        }}
+        result = {'endpoints': {
+            'user-me': endpoint(p50_ms=0.9),
+            'user-token': endpoint(requests=3, p99_ms=90.0),
+            'tag-list': endpoint(),
+        }}
+
+        self.assertEqual(compare(result, baseline, 20), [])
@@ -0,0 +1,208 @@
+"""
+test for the api response compression
+"""
+import gzip
+import io
+from decimal import Decimal
+
+import brotli
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.http import (HttpResponse, StreamingHttpResponse)
+from django.test import (RequestFactory, SimpleTestCase, TestCase)
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.middleware import (CompressionMiddleware, accepted_coding)
+from core.models import Recipe
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    """create and return a recipe detail url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class AcceptedCodingTests(SimpleTestCase):
+    """test Accept-Encoding negotiation"""
+
+    def test_prefers_brotli(self):
+        """test brotli is chosen over gzip at equal quality"""
+        self.assertEqual(accepted_coding('gzip, deflate, br'), 'br')
+
+    def test_quality_values(self):
+        """test q-values decide between codings"""
+        self.assertEqual(accepted_coding('br;q=0.5, gzip'), 'gzip')
+        self.assertEqual(accepted_coding('gzip;q=0, *'), 'br')
+        self.assertIsNone(accepted_coding('br;q=0, gzip;q=0'))
+        self.assertIsNone(accepted_coding('identity'))
+        self.assertIsNone(accepted_coding(''))
+
+
+class CompressionMiddlewareTests(SimpleTestCase):
+    """test which responses are compressed and how"""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+
+    def _process(self, response, path='/api/recipe/', encoding='gzip'):
+        """run a response through the middleware"""
+        request = self.factory.get(path, HTTP_ACCEPT_ENCODING=encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_small_responses_not_compressed(self):
+        """test responses below the threshold are sent as is"""
+        res = self._process(HttpResponse(
+            b'{"id": 1}',
+            content_type='application/json',
+        ))
+
+        self.assertNotIn('Content-Encoding', res)
+        self.assertEqual(res.content, b'{"id": 1}')
+
+    def test_per_type_threshold(self):
+        """test content types use their own minimum size"""
+        body = b'a' * 1500
+        json_res = self._process(HttpResponse(
+            body,
+            content_type='application/json',
+        ))
+        msgpack_res = self._process(HttpResponse(
+            body,
+            content_type='application/msgpack',
+        ))
+
+        self.assertEqual(json_res['Content-Encoding'], 'gzip')
+        self.assertNotIn('Content-Encoding', msgpack_res)
+
+    def test_unlisted_types_not_compressed(self):
+        """test images and other media are sent as is"""
+        body = b'\xff\xd8' + b'a' * 4000
+        res = self._process(
+            HttpResponse(body, content_type='image/webp'),
+            encoding='br',
+        )
+
+        self.assertNotIn('Content-Encoding', res)
+        self.assertNotIn('Vary', res)
+        self.assertEqual(res.content, body)
+
+    def test_only_api_paths(self):
+        """test responses outside the api are left alone"""
+        res = self._process(
+            HttpResponse(b'a' * 4000, content_type='text/html'),
+            path='/admin/',
+        )
+
+        self.assertNotIn('Content-Encoding', res)
+
+    def test_streaming_compressed(self):
+        """test streamed responses are compressed chunk by chunk"""
+        chunks = [b'{"results": [', b'{"id": 1},' * 200, b'{"id": 2}]}']
+        res = self._process(
+            StreamingHttpResponse(chunks, content_type='application/json'),
+            encoding='br',
+        )
+
+        self.assertEqual(res['Content-Encoding'], 'br')
+        self.assertNotIn('Content-Length', res)
+        self.assertEqual(
+            brotli.decompress(b''.join(res.streaming_content)),
+            b''.join(chunks),
+        )
+
+    def test_already_encoded_not_compressed(self):
+        """test responses with a Content-Encoding are left alone"""
+        response = HttpResponse(b'a' * 4000, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+
+        res = self._process(response)
+
+        self.assertEqual(res.content, b'a' * 4000)
+
+
+class CompressedApiTests(TestCase):
+    """test compression of api responses end to end"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        for i in range(20):
+            self.recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {i}',
+                time_minutes=10,
+                price=Decimal('5.00'),
+                description='a long description ' * 60,
+            )
+
+    def test_recipe_list_compressed(self):
+        """test the recipe list is compressed and varies on encoding"""
+        plain = self.client.get(RECIPES_URL)
+        res = self.client.get(RECIPES_URL, HTTP_ACCEPT_ENCODING='gzip')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', res['Vary'])
+        self.assertIn('Accept-Encoding', plain['Vary'])
+        self.assertEqual(int(res['Content-Length']), len(res.content))
+        self.assertEqual(gzip.decompress(res.content), plain.content)
+
+    def test_etag_per_encoding(self):
+        """test compressed responses get their own etag"""
+        url = detail_url(self.recipe.id)
+        plain = self.client.get(url)
+        res = self.client.get(url, HTTP_ACCEPT_ENCODING='br')
+
+        self.assertEqual(res['Content-Encoding'], 'br')
+        self.assertEqual(res['ETag'], plain['ETag'][:-1] + '-br"')
+
+        res = self.client.get(
+            url,
+            HTTP_ACCEPT_ENCODING='br',
+            HTTP_IF_NONE_MATCH=res['ETag'],
+        )
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res['ETag'], plain['ETag'][:-1] + '-br"')
+
+    def test_if_match_with_encoded_etag(self):
+        """test If-Match accepts the etag of a compressed response"""
+        url = detail_url(self.recipe.id)
+        etag = self.client.get(url, HTTP_ACCEPT_ENCODING='gzip')['ETag']
+
+        res = self.client.patch(url, {'title': 'New'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+        res = self.client.patch(url, {'title': 'Old'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(
+            res.status_code,
+            status.HTTP_412_PRECONDITION_FAILED,
+        )
+
+
+class CompressionBenchmarkTests(SimpleTestCase):
+    """test the compression benchmark command"""
+
+    def test_reports_codecs(self):
+        """test every format and codec is measured"""
+        out = io.StringIO()
+
+        call_command(
+            'compression_benchmark',
+            '--recipes', '5',
+            '--repeat', '1',
+            stdout=out,
+        )
+
+        lines = out.getvalue().splitlines()
+        self.assertEqual(len(lines), 1 + 2 * 8)
+        self.assertTrue(any(line.startswith('msgpack') and ' br-4 ' in line
+                            for line in lines))
@@ -0,0 +1,132 @@
+"""
+test for the orjson and MessagePack renderers and parsers
+"""
+import datetime
+import uuid
+from decimal import Decimal
+
+import msgpack
+from django.contrib.auth import get_user_model
+from django.test import (SimpleTestCase, TestCase)
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from core.renderers import (MessagePackRenderer, ORJSONRenderer)
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+MSGPACK = 'application/msgpack'
+
+
+def detail_url(recipe_id):
+    """create and return a recipe detail url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class RendererTests(SimpleTestCase):
+    """test renderer output"""
+
+    def test_json_matches_drf(self):
+        """test orjson output is identical to DRF's JSON renderer"""
+        data = {
+            'title': 'Crème brûlée "quoted" ☃ </script>',
+            'price': Decimal('5.50'),
+            'when': datetime.datetime(
+                2021, 9, 1, 12, 30, 15, 123456,
+                tzinfo=datetime.timezone.utc,
+            ),
+            'day': datetime.date(2021, 9, 1),
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'tags': [{'id': 1, 'name': 'Vegan'}],
+            'empty': None,
+            'flag': True,
+        }
+
+        self.assertEqual(
+            ORJSONRenderer().render(data),
+            JSONRenderer().render(data),
+        )
+
+    def test_msgpack_decimals(self):
+        """test decimals and datetimes are encoded as strings"""
+        data = {
+            'price': Decimal('5.50'),
+            'when': datetime.datetime(2021, 9, 1, 12, 30),
+        }
+
+        decoded = msgpack.unpackb(MessagePackRenderer().render(data))
+
+        self.assertEqual(decoded, {
+            'price': '5.50',
+            'when': '2021-09-01T12:30:00',
+        })
+
+
+class NegotiationTests(TestCase):
+    """test content negotiation on the api"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Soup',
+            time_minutes=10,
+            price=Decimal('5.50'),
+            image='uploads/recipe/ab/' + 'ab' * 32 + '.jpg',
+            image_status=Recipe.ImageStatus.READY,
+            updated_at=timezone.now(),
+        )
+
+    def test_msgpack_response(self):
+        """test MessagePack responses carry the same data as JSON"""
+        url = detail_url(self.recipe.id)
+        json_res = self.client.get(url)
+
+        res = self.client.get(url, HTTP_ACCEPT=MSGPACK)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res['Content-Type'], MSGPACK)
+        data = msgpack.unpackb(res.content)
+        self.assertEqual(data, json_res.json())
+        self.assertEqual(data['price'], '5.50')
+        self.assertTrue(data['image'].startswith('http://testserver/'))
+        self.assertNotEqual(res['ETag'], json_res['ETag'])
+
+    def test_msgpack_request(self):
+        """test recipes can be created from a MessagePack body"""
+        payload = {
+            'title': 'Cake',
+            'time_minutes': 30,
+            'price': '3.25',
+            'tags': [{'name': 'Dessert'}],
+        }
+
+        res = self.client.post(RECIPES_URL, payload, format='msgpack')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(id=res.data['id'])
+        self.assertEqual(recipe.price, Decimal('3.25'))
+        self.assertEqual(recipe.tags.get().name, 'Dessert')
+
+    def test_invalid_bodies(self):
+        """test malformed JSON and MessagePack bodies are rejected"""
+        for body, content_type in (
+            (b'{"title": ', 'application/json'),
+            (b'\xc1', MSGPACK),
+        ):
+            res = self.client.generic(
+                'POST',
+                RECIPES_URL,
+                body,
+                content_type=content_type,
+            )
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,134 @@
+"""
+test for the synthetic data command
+"""
+import io
+import random
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Count
+from django.test import (SimpleTestCase, TestCase)
+
+from core.models import (Ingredient, Recipe, Tag)
+from core.seed import (distribution, seed_email, seed_users)
+from recipe.stats import (compute_stats, stored_stats)
+
+
+SMALL = {
+    'recipes': distribution('4'),
+    'tags': distribution('2-3'),
+    'ingredients': distribution('5'),
+    'tags_per_recipe': distribution('1'),
+    'ingredients_per_recipe': distribution('2-3'),
+}
+
+
+def snapshot():
+    """return the seeded data without ids"""
+    return [
+        (
+            user.email,
+            user.name,
+            user.password,
+            sorted(
+                (
+                    recipe.title,
+                    recipe.time_minutes,
+                    recipe.price,
+                    sorted(tag.name for tag in recipe.tags.all()),
+                    sorted(i.name for i in recipe.ingredients.all()),
+                )
+                for recipe in Recipe.objects.filter(user=user)
+            ),
+        )
+        for user in get_user_model().objects.order_by('email')
+    ]
+
+
+class DistributionTests(SimpleTestCase):
+    """test parsing count distributions"""
+
+    def test_fixed_and_uniform(self):
+        """test fixed counts and ranges"""
+        rng = random.Random(0)
+        self.assertEqual(distribution('7')(rng), 7)
+        self.assertTrue(all(
+            2 <= distribution('2-4')(rng) <= 4 for _ in range(50)
+        ))
+
+    def test_exponential(self):
+        """test exponential counts average around the mean"""
+        rng = random.Random(0)
+        draw = distribution('exp:20')
+        mean = sum(draw(rng) for _ in range(2000)) / 2000
+        self.assertTrue(15 < mean < 25)
+
+    def test_invalid(self):
+        """test invalid specs are rejected"""
+        for spec in ('x', '5-2', '-1', 'exp:0', 'exp:x'):
+            with self.assertRaises(ValueError):
+                distribution(spec)
+
+
+class SeedTests(TestCase):
+    """test seeding users with recipes"""
+
+    def test_seed_command(self):
+        """test users are created with maintained counts and statistics"""
+        call_command(
+            'seed', '3',
+            '--recipes', '4',
+            '--tags', '2',
+            '--ingredients', '5',
+            '--tags-per-recipe', '1',
+            '--ingredients-per-recipe', '2-3',
+            '--processes', '1',
+            '--hash-once',
+            stdout=io.StringIO(),
+        )
+
+        users = get_user_model().objects.all()
+        self.assertEqual(users.count(), 3)
+        self.assertEqual(Recipe.objects.count(), 12)
+        self.assertTrue(users.get(email=seed_email(0, 2)).check_password(
+            'password',
+        ))
+        for recipe in Recipe.objects.annotate(
+            tag_count=Count('tags', distinct=True),
+            ingredient_count=Count('ingredients', distinct=True),
+        ):
+            self.assertEqual(recipe.tag_count, 1)
+            self.assertIn(recipe.ingredient_count, (1, 2, 3))
+        for user in users:
+            self.assertEqual(stored_stats(user.pk), compute_stats(user.pk))
+            self.assertEqual(Tag.objects.filter(user=user).count(), 2)
+        for model in (Tag, Ingredient):
+            for obj in model.objects.annotate(linked=Count('recipe')):
+                self.assertEqual(obj.recipe_count, obj.linked)
+
+    def test_deterministic(self):
+        """test a seed gives the same data whatever the batches"""
+        list(seed_users(3, seed=5, batch_size=1, **SMALL))
+        first = snapshot()
+        get_user_model().objects.all().delete()
+
+        list(seed_users(3, seed=5, batch_size=2, **SMALL))
+
+        self.assertEqual(snapshot(), first)
+
+    def test_process_pool(self):
+        """test passwords hashed in worker processes are valid"""
+        list(seed_users(2, processes=2, password='secret', **SMALL))
+
+        users = get_user_model().objects.all()
+        self.assertEqual(users.count(), 2)
+        self.assertNotEqual(users[0].password, users[1].password)
+        self.assertTrue(all(user.check_password('secret') for user in users))
+
+    def test_seeded_once(self):
+        """test the users of a seed are not created twice"""
+        list(seed_users(1, seed=3, hash_once=True, **SMALL))
+
+        with self.assertRaises(CommandError):
+            call_command('seed', '1', '--seed', '3', stdout=io.StringIO())
@@ -0,0 +1,70 @@
+"""
+test for the content addressed storage
+"""
+import hashlib
+import os
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.test import TestCase
+
+from core.models import ImageBlob
+from core.storage import ContentAddressedStorage
+
+
+class ContentAddressedStorageTests(TestCase):
+    """test files are stored once and reference counted"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        self.storage = ContentAddressedStorage(location=self.tmpdir.name)
+
+    def _save(self, content, name='uploads/recipe/photo.JPG'):
+        """save bytes and return the stored name"""
+        return self.storage.save(name, ContentFile(content))
+
+    def test_named_by_digest(self):
+        """test files are named after the digest of their content"""
+        digest = hashlib.sha256(b'image data').hexdigest()
+
+        name = self._save(b'image data')
+
+        self.assertEqual(name, f'uploads/recipe/{digest[:2]}/{digest}.jpg')
+        with self.storage.open(name) as f:
+            self.assertEqual(f.read(), b'image data')
+
+    def test_identical_content_stored_once(self):
+        """test identical uploads share one file"""
+        first = self._save(b'image data', 'uploads/recipe/a.jpg')
+        second = self._save(b'image data', 'uploads/recipe/b.jpg')
+        other = self._save(b'other data', 'uploads/recipe/c.jpg')
+
+        self.assertEqual(first, second)
+        self.assertNotEqual(first, other)
+        self.assertEqual(ImageBlob.objects.get(name=first).refs, 2)
+        directory = os.path.dirname(self.storage.path(first))
+        # no temporary files are left behind
+        self.assertEqual(os.listdir(directory), [os.path.basename(first)])
+
+    def test_deleted_with_last_reference(self):
+        """test a shared file is only removed with its last reference"""
+        name = self._save(b'image data')
+        self._save(b'image data')
+
+        self.storage.delete(name)
+        self.assertTrue(self.storage.exists(name))
+
+        self.storage.delete(name)
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(ImageBlob.objects.filter(name=name).exists())
+
+    def test_delete_untracked_file(self):
+        """test files without a reference count are deleted directly"""
+        path = os.path.join(self.tmpdir.name, 'legacy.jpg')
+        with open(path, 'wb') as f:
+            f.write(b'image data')
+
+        self.storage.delete('legacy.jpg')
+
+        self.assertFalse(os.path.exists(path))
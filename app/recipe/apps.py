@@ -0,0 +1,10 @@
+from django.apps import AppConfig
+
+
+class RecipeConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'recipe'
+
+    def ready(self):
+        """connect signal handlers"""
+        from recipe import signals  # noqa
@@ -0,0 +1,129 @@
+"""
+per user response cache for the recipe api
+
+responses are cached by user, resource and request url. every user and
+resource has a generation token that is part of the key; signal handlers
+drop the token when the underlying rows change, so stale entries are never
+read again and simply age out of the backend.
+"""
+import functools
+import hashlib
+import threading
+import uuid
+from collections import Counter
+
+from django.core.cache import caches
+from django.db import transaction
+
+from rest_framework import status
+from rest_framework.response import Response
+
+
+API_CACHE_ALIAS = 'api'
+RESOURCES = ('recipe', 'tag', 'ingredient')
+
+_stats = Counter()
+_stats_lock = threading.Lock()
+
+
+def _count(name):
+    """increment a cache statistics counter"""
+    with _stats_lock:
+        _stats[name] += 1
+
+
+def cache_stats():
+    """return the hit and miss counters of this process"""
+    with _stats_lock:
+        return {'hits': _stats['hits'], 'misses': _stats['misses']}
+
+
+def reset_cache_stats():
+    """reset the hit and miss counters"""
+    with _stats_lock:
+        _stats.clear()
+
+
+def _generation_key(user_id, resource):
+    """return the key holding the generation token of a resource"""
+    return f'api-gen:{resource}:{user_id}'
+
+
+def _generation(user_id, resource):
+    """return the current generation token, creating one if needed"""
+    api_cache = caches[API_CACHE_ALIAS]
+    key = _generation_key(user_id, resource)
+    token = api_cache.get(key)
+    if token is None:
+        api_cache.add(key, uuid.uuid4().hex, None)
+        token = api_cache.get(key)
+    return token
+
+
+def invalidate_cache(user_id, *resources):
+    """invalidate cached responses of a user for the given resources
+
+    the generations are dropped now, for reads in the writing transaction,
+    and again once it commits, as concurrent readers still see the old
+    rows until then and may cache them under a new generation.
+    """
+    keys = [
+        _generation_key(user_id, resource)
+        for resource in resources or RESOURCES
+    ]
+    caches[API_CACHE_ALIAS].delete_many(keys)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(
+            lambda: caches[API_CACHE_ALIAS].delete_many(keys),
+        )
+
+
+def get_cache_key(request, resource):
+    """return the cache key for a request to a resource"""
+    url = f'{request.get_host()}{request.path}?' + '&'.join(
+        f'{key}={value}'
+        for key, values in sorted(request.query_params.lists())
+        for value in values
+    )
+    digest = hashlib.md5(url.encode()).hexdigest()
+    generation = _generation(request.user.pk, resource)
+    return f'api:{resource}:{request.user.pk}:{generation}:{digest}'
+
+
+def get_or_compute(request, resource, name, compute):
+    """return a value derived from a user's resource data, cached
+
+    the value lives under the same generation as the cached responses,
+    so it is invalidated by the same signals.
+    """
+    api_cache = caches[API_CACHE_ALIAS]
+    key = f'{get_cache_key(request, resource)}:{name}'
+    value = api_cache.get(key)
+    if value is None:
+        value = compute()
+        api_cache.set(key, value)
+    return value
+
+
+def cache_response(handler):
+    """serve a view action from the per user response cache
+
+    the view names the cached resource with ``cache_resource``.
+    """
+    @functools.wraps(handler)
+    def wrapper(self, request, *args, **kwargs):
+        api_cache = caches[API_CACHE_ALIAS]
+        key = get_cache_key(request, self.cache_resource)
+        data = api_cache.get(key)
+        if data is not None:
+            _count('hits')
+            return Response(data, headers={'X-Cache': 'HIT'})
+
+        _count('misses')
+        response = handler(self, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            api_cache.set(key, response.data)
+        response['X-Cache'] = 'MISS'
+        return response
+
+    return wrapper
@@ -0,0 +1,146 @@
+"""
+conditional requests for the recipe api
+
+recipes carry strong ETags derived from ``Recipe.updated_at``. reads honor
+``If-None-Match`` and ``If-Modified-Since`` before anything is serialized,
+writes honor ``If-Match`` and ``If-Unmodified-Since`` for optimistic
+concurrency.
+"""
+import functools
+import hashlib
+from calendar import timegm
+from contextlib import nullcontext
+
+from django.db import transaction
+from django.db.models import (Count, Max)
+from django.utils.cache import get_conditional_response
+from django.utils.http import (http_date, quote_etag)
+
+from core.models import Recipe
+from recipe.cache import get_or_compute
+
+
+WRITE_PRECONDITIONS = ('HTTP_IF_MATCH', 'HTTP_IF_UNMODIFIED_SINCE')
+
+
+def _etag(*parts):
+    """return a quoted strong etag for the given parts"""
+    value = ':'.join(str(part) for part in parts)
+    return quote_etag(hashlib.md5(value.encode()).hexdigest())
+
+
+def recipe_etag(recipe_id, updated_at):
+    """return the etag of a single recipe"""
+    return _etag(recipe_id, updated_at.isoformat())
+
+
+def _representation_etag(request, etag):
+    """return the etag of the negotiated representation
+
+    json responses keep the plain etag, other formats get their own.
+    """
+    renderer = getattr(request, 'accepted_renderer', None)
+    if etag is None or renderer is None or renderer.format == 'json':
+        return etag
+    return _etag(etag, renderer.format)
+
+
+def detail_validators(view, request, for_update=False, **kwargs):
+    """return the etag and last modified time of the requested recipe"""
+    queryset = Recipe.objects.filter(user=request.user)
+    if for_update:
+        queryset = queryset.select_for_update()
+    pk = kwargs[view.lookup_url_kwarg or view.lookup_field]
+    try:
+        updated_at = queryset.filter(pk=pk).values_list(
+            'updated_at',
+            flat=True,
+        ).first()
+    except (TypeError, ValueError):
+        updated_at = None
+    if updated_at is None:
+        return None, None
+    return recipe_etag(pk, updated_at), updated_at
+
+
+def list_validators(view, request, for_update=False, **kwargs):
+    """return the etag of a recipe list
+
+    the tag covers the request url and the number and latest change of
+    the matching recipes, so additions, edits and deletions all change it.
+    there is no last modified time, deletions would not move it.
+    """
+    queryset = view.filter_queryset(view.get_queryset()).order_by()
+    summary = queryset.aggregate(count=Count('id'), last=Max('updated_at'))
+    last = summary['last'].isoformat() if summary['last'] else ''
+    return _etag(request.get_full_path(), summary['count'], last), None
+
+
+def _set_validator_headers(response, etag, last_modified):
+    """add ETag and Last-Modified headers to a response"""
+    if etag:
+        response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(
+            timegm(last_modified.utctimetuple())
+        )
+
+
+def conditional(get_validators):
+    """evaluate conditional request headers before running the action
+
+    writes carrying preconditions lock the row for the rest of the action,
+    so a concurrent write can not slip in between check and update.
+    """
+    def decorator(handler):
+        @functools.wraps(handler)
+        def wrapper(self, request, *args, **kwargs):
+            is_write = request.method not in ('GET', 'HEAD')
+            locking = is_write and any(
+                header in request.META for header in WRITE_PRECONDITIONS
+            )
+            etag, last_modified, response = None, None, None
+            with transaction.atomic() if locking else nullcontext():
+                if locking:
+                    etag, last_modified = get_validators(
+                        self,
+                        request,
+                        for_update=True,
+                        **kwargs,
+                    )
+                elif not is_write:
+                    etag, last_modified = get_or_compute(
+                        request,
+                        self.cache_resource,
+                        'validators',
+                        lambda: get_validators(self, request, **kwargs),
+                    )
+                etag = _representation_etag(request, etag)
+                if etag is not None:
+                    response = get_conditional_response(
+                        request,
+                        etag=etag,
+                        last_modified=last_modified and timegm(
+                            last_modified.utctimetuple()
+                        ),
+                    )
+                if response is not None:
+                    if response.status_code == 304:
+                        _set_validator_headers(response, etag, last_modified)
+                    return response
+                response = handler(self, request, *args, **kwargs)
+
+            if response.status_code == 200:
+                if is_write:
+                    etag, last_modified = get_validators(
+                        self,
+                        request,
+                        **kwargs,
+                    )
+                    etag = _representation_etag(request, etag)
+                _set_validator_headers(response, etag, last_modified)
+            return response
+
+        return wrapper
+
+    return decorator
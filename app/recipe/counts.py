@@ -0,0 +1,113 @@
+"""
+denormalized recipe counts of tags and ingredients
+
+``Tag.recipe_count`` and ``Ingredient.recipe_count`` hold how many recipes
+use a row, so lists can be sorted by usage without counting the m2m
+tables. signal handlers adjust the counts by the links they add or
+remove, ``reconcile_recipe_counts`` repairs any drift from writes that
+bypass them.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import (
+    Count,
+    F,
+    IntegerField,
+    OuterRef,
+    Subquery,
+    Value,
+)
+from django.db.models.functions import (Coalesce, Greatest)
+
+from core.bulk import BATCH_SIZE
+
+
+def through_rows(model):
+    """return the recipe link rows and target column of a tag or ingredient"""
+    relation = model._meta.get_field('recipe')
+    return (
+        relation.through.objects.all(),
+        relation.field.m2m_reverse_field_name(),
+    )
+
+
+def linked_ids(model, recipe_ids=None, ids=None):
+    """return the tag or ingredient ids of the links of recipes
+
+    one id per link, optionally limited to the given tags or ingredients.
+    """
+    rows, target = through_rows(model)
+    if recipe_ids is not None:
+        rows = rows.filter(recipe_id__in=recipe_ids)
+    if ids is not None:
+        rows = rows.filter(**{f'{target}_id__in': ids})
+    return list(rows.values_list(f'{target}_id', flat=True))
+
+
+def adjust_recipe_counts(model, ids, delta=1):
+    """add delta to the counts of the given rows, an id may repeat"""
+    by_delta = defaultdict(list)
+    totals = defaultdict(int)
+    for pk in ids:
+        totals[pk] += delta
+    for pk, total in totals.items():
+        if total:
+            by_delta[total].append(pk)
+    for total, pks in by_delta.items():
+        count = F('recipe_count') + total
+        if total < 0:
+            # never below zero, reconciliation repairs the drift
+            count = Greatest(count, Value(0))
+        for start in range(0, len(pks), BATCH_SIZE):
+            model.objects.filter(
+                pk__in=pks[start:start + BATCH_SIZE],
+            ).update(recipe_count=count)
+
+
+def add_recipe_links(model, recipe_ids):
+    """count the links of new recipes written in bulk"""
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        adjust_recipe_counts(model, linked_ids(
+            model,
+            recipe_ids[start:start + BATCH_SIZE],
+        ))
+
+
+def recipe_count_expression(model):
+    """return an expression counting the recipes using each row"""
+    rows, target = through_rows(model)
+    counts = rows.filter(**{target: OuterRef('pk')}).order_by().values(
+        target,
+    ).annotate(count=Count('*')).values('count')
+    return Coalesce(Subquery(counts, output_field=IntegerField()), 0)
+
+
+def reconcile_recipe_counts(model, batch_size=BATCH_SIZE, dry_run=False):
+    """recount the rows of a model in batches, yielding per batch
+
+    yields the number of rows checked and the number with a wrong count,
+    which are repaired unless ``dry_run`` is set. every batch is its own
+    transaction so a large table is never locked as a whole.
+    """
+    last_pk = 0
+    actual = recipe_count_expression(model)
+    while True:
+        pks = list(model.objects.filter(pk__gt=last_pk).order_by(
+            'pk',
+        ).values_list('pk', flat=True)[:batch_size])
+        if not pks:
+            return
+        last_pk = pks[-1]
+        with transaction.atomic():
+            drifted = list(model.objects.filter(pk__in=pks).annotate(
+                actual=actual,
+            ).exclude(
+                recipe_count=F('actual'),
+            ).values_list('pk', flat=True))
+            if drifted and not dry_run:
+                model.objects.filter(pk__in=drifted).update(
+                    recipe_count=actual,
+                )
+        yield len(pks), len(drifted)
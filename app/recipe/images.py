@@ -0,0 +1,268 @@
+"""
+background processing of uploaded recipe images
+
+uploads are stored as they arrive and the recipe is marked pending. once
+the upload is committed a worker decodes the image, applies its exif
+orientation and writes the normalized image and its variants. the decoding
+runs in a thread pool or, with the ``process`` backend, in a local process
+pool so it does not hold the GIL of the web worker.
+
+variants are smaller copies in modern formats, kept in a derivative cache
+under ``MEDIA_ROOT``. their paths derive from the image name, which is the
+digest of its content, so variant urls can be cached forever by clients and
+recipes sharing an image share its variants.
+"""
+import io
+import logging
+import os
+import posixpath
+import threading
+from concurrent.futures import (ProcessPoolExecutor, ThreadPoolExecutor)
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import (connection, transaction)
+from PIL import (Image, ImageOps)
+
+from core.models import (Recipe, recipe_image_file_path)
+from core.storage import recipe_image_storage
+
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ('thread', 'process', 'sync')
+# longest edge in pixels of the variants
+VARIANTS = {'thumb': 150, 'card': 600, 'full': 1600}
+# preferred first, only the formats this Pillow build can write are used
+MODERN_FORMATS = ('AVIF', 'WEBP')
+DERIVATIVE_DIR = 'derivatives/recipe'
+QUALITY = 80
+
+_executors = {}
+_executors_lock = threading.Lock()
+
+
+def _executor(kind):
+    """return the shared executor of a kind, creating it on first use"""
+    with _executors_lock:
+        if kind not in _executors:
+            workers = settings.IMAGE_PROCESSING['WORKERS']
+            if kind == 'process':
+                _executors[kind] = ProcessPoolExecutor(max_workers=workers)
+            else:
+                _executors[kind] = ThreadPoolExecutor(
+                    max_workers=workers,
+                    thread_name_prefix='recipe-images',
+                )
+        return _executors[kind]
+
+
+def _supported_formats():
+    """return the modern formats the installed Pillow can write"""
+    Image.init()
+    return [fmt for fmt in MODERN_FORMATS if fmt in Image.SAVE]
+
+
+SUPPORTED_FORMATS = _supported_formats()
+
+
+def variant_formats(name):
+    """return the file extensions of the variants of an image
+
+    without avif or webp support the variants keep the image format.
+    """
+    if SUPPORTED_FORMATS:
+        return [fmt.lower() for fmt in SUPPORTED_FORMATS]
+    return [os.path.splitext(name)[1].lstrip('.').lower()]
+
+
+def variant_key(name):
+    """return the derivative cache key of an image"""
+    return os.path.splitext(posixpath.basename(name))[0]
+
+
+def variant_name(key, variant, ext):
+    """return the storage name of an image variant"""
+    return posixpath.join(DERIVATIVE_DIR, key, f'{variant}.{ext}')
+
+
+def _encode(image, ext):
+    """return the bytes of an image saved with a file extension"""
+    fmt = {'jpg': 'JPEG'}.get(ext, ext.upper())
+    buffer = io.BytesIO()
+    if fmt == 'PNG':
+        image.save(buffer, format=fmt, optimize=True)
+    else:
+        image.save(buffer, format=fmt, quality=QUALITY)
+    return buffer.getvalue()
+
+
+def _decode(data):
+    """decode an image, applying its exif orientation"""
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        has_alpha = (
+            image.mode in ('RGBA', 'LA', 'PA')
+            or 'transparency' in image.info
+        )
+        return image.convert('RGBA' if has_alpha else 'RGB'), has_alpha
+
+
+def _variants(image, formats):
+    """return the encoded variants of a decoded image"""
+    outputs = {}
+    for variant, size in VARIANTS.items():
+        resized = image.copy()
+        resized.thumbnail((size, size), Image.LANCZOS)
+        for ext in formats:
+            outputs[variant, ext] = _encode(resized, ext)
+    return outputs
+
+
+def render_image(data):
+    """return the extension, normalized image and variants of an upload
+
+    images with transparency are kept as png, everything else becomes a
+    jpeg. this only depends on its input so it can run in a worker process.
+    """
+    image, has_alpha = _decode(data)
+    ext = 'png' if has_alpha else 'jpg'
+    formats = variant_formats(f'image.{ext}')
+    return ext, _encode(image, ext), _variants(image, formats)
+
+
+def render_variants(data, name):
+    """return the variants of a normalized image"""
+    image, _ = _decode(data)
+    return _variants(image, variant_formats(name))
+
+
+def _render(function, *args):
+    """run a rendering function on the configured backend"""
+    if settings.IMAGE_PROCESSING['BACKEND'] == 'process':
+        return _executor('process').submit(function, *args).result()
+    return function(*args)
+
+
+def _save_variants(name, variants):
+    """store rendered variants of an image in the derivative cache"""
+    key = variant_key(name)
+    for (variant, ext), content in variants.items():
+        path = variant_name(key, variant, ext)
+        if not default_storage.exists(path):
+            default_storage.save(path, ContentFile(content))
+
+
+def ensure_variant(name, variant, ext):
+    """return the storage name of a variant, rendering it when missing
+
+    a cache miss renders all variants of the image at once.
+    """
+    path = variant_name(variant_key(name), variant, ext)
+    if not default_storage.exists(path):
+        with recipe_image_storage.open(name, 'rb') as image:
+            data = image.read()
+        _save_variants(name, _render(
+            render_variants,
+            data,
+            name,
+        ))
+    return path
+
+
+def delete_image_files(name):
+    """release an image, deleting its variants with the last reference"""
+    recipe_image_storage.delete(name)
+    if recipe_image_storage.exists(name):
+        return
+    key = variant_key(name)
+    for variant in VARIANTS:
+        for ext in variant_formats(name):
+            default_storage.delete(variant_name(key, variant, ext))
+
+
+def _set_status(recipe_id, name, image_status):
+    """set the image status if the recipe still has the given image"""
+    with transaction.atomic():
+        recipe = Recipe.objects.select_for_update().filter(
+            pk=recipe_id,
+            image=name,
+        ).first()
+        if recipe is not None:
+            recipe.image_status = image_status
+            recipe.save(update_fields=['image_status', 'updated_at'])
+        return recipe
+
+
+def process_recipe_image(recipe_id, name):
+    """process an uploaded recipe image
+
+    the job is skipped when the recipe was deleted or got a newer image
+    in the meantime, the newer upload has its own job.
+    """
+    recipe = _set_status(recipe_id, name, Recipe.ImageStatus.PROCESSING)
+    if recipe is None:
+        return
+    try:
+        with recipe_image_storage.open(name, 'rb') as upload:
+            data = upload.read()
+        ext, normalized, variants = _render(render_image, data)
+    except Exception:
+        logger.exception('processing image %s of recipe %s failed',
+                         name, recipe_id)
+        _set_status(recipe_id, name, Recipe.ImageStatus.FAILED)
+        return
+
+    new_name = recipe_image_storage.save(
+        recipe_image_file_path(recipe, f'image.{ext}'),
+        ContentFile(normalized),
+    )
+    _save_variants(new_name, variants)
+
+    with transaction.atomic():
+        recipe = Recipe.objects.select_for_update().filter(
+            pk=recipe_id,
+            image=name,
+        ).first()
+        if recipe is not None:
+            recipe.image = new_name
+            recipe.image_key = variant_key(new_name)
+            recipe.image_status = Recipe.ImageStatus.READY
+            recipe.save(update_fields=[
+                'image',
+                'image_key',
+                'image_status',
+                'updated_at',
+            ])
+    # the raw upload when done, the new files when replaced meanwhile
+    delete_image_files(name if recipe is not None else new_name)
+
+
+def _run(recipe_id, name):
+    """run a processing job in a worker thread"""
+    try:
+        process_recipe_image(recipe_id, name)
+    finally:
+        connection.close()
+
+
+def schedule_image_processing(recipe, previous=None):
+    """process the image of a recipe once the current transaction commits
+
+    the reference on a replaced image is released at the same time.
+    """
+    name = recipe.image.name
+    backend = settings.IMAGE_PROCESSING['BACKEND']
+    if backend not in BACKENDS:
+        raise ValueError(f'unknown image processing backend {backend}')
+
+    def submit():
+        if previous:
+            delete_image_files(previous)
+        if backend == 'sync':
+            process_recipe_image(recipe.pk, name)
+        else:
+            _executor('thread').submit(_run, recipe.pk, name)
+
+    transaction.on_commit(submit)
@@ -0,0 +1,18 @@
+"""
+django command to delete expired image upload sessions
+"""
+from django.core.management.base import BaseCommand
+
+from recipe.uploads import purge_expired_sessions
+
+
+class Command(BaseCommand):
+    """django command to delete abandoned upload sessions and their files"""
+    help = 'delete expired image upload sessions'
+
+    def handle(self, *args, **options):
+        """entry point for command"""
+        count = purge_expired_sessions()
+        self.stdout.write(self.style.SUCCESS(
+            f'Deleted {count} expired upload sessions'
+        ))
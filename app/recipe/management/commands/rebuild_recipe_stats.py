@@ -0,0 +1,58 @@
+"""
+django command to check and rebuild the recipe statistics of users
+"""
+from django.contrib.auth import get_user_model
+from django.core.management.base import (BaseCommand, CommandError)
+
+from recipe.stats import (compute_stats, rebuild_user_stats, stored_stats)
+
+
+class Command(BaseCommand):
+    """django command comparing maintained statistics with a recompute
+
+    without ``--check`` the statistics of every user, or of ``--user``,
+    are replaced with the recompute. with it differences are only
+    reported and the command fails when there are any.
+    """
+    help = 'rebuild or check the per user recipe statistics'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='only this user (email)')
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='only report users whose statistics are wrong',
+        )
+
+    def handle(self, *args, **options):
+        """entry point for command"""
+        users = get_user_model().objects.order_by('pk')
+        if options['user']:
+            users = users.filter(email=options['user'])
+            if not users.exists():
+                raise CommandError(f'unknown user {options["user"]}')
+
+        checked = wrong = 0
+        for user_id, email in users.values_list('pk', 'email').iterator():
+            checked += 1
+            if not options['check']:
+                rebuild_user_stats(user_id)
+                continue
+            stored = stored_stats(user_id)
+            # missing rows are computed when first needed
+            if stored is not None and stored != compute_stats(user_id):
+                wrong += 1
+                self.stdout.write(f'statistics of {email} are wrong')
+
+        if not options['check']:
+            self.stdout.write(self.style.SUCCESS(
+                f'Rebuilt the statistics of {checked} users'
+            ))
+        elif wrong:
+            raise CommandError(
+                f'{wrong} of {checked} users have wrong statistics'
+            )
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f'Statistics of {checked} users are correct'
+            ))
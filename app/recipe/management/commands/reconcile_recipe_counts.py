@@ -0,0 +1,43 @@
+"""
+django command to repair the recipe counts of tags and ingredients
+"""
+from django.core.management.base import (BaseCommand, CommandError)
+
+from core.models import (Ingredient, Tag)
+from recipe.counts import (BATCH_SIZE, reconcile_recipe_counts)
+
+
+class Command(BaseCommand):
+    """django command to recount recipe usage in batches
+
+    the counts are kept by signal handlers, this repairs drift from
+    writes that bypassed them, like raw sql or restored backups.
+    """
+    help = 'recount how many recipes use each tag and ingredient'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='only report wrong counts',
+        )
+
+    def handle(self, *args, **options):
+        """entry point for command"""
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be positive')
+        for model in (Tag, Ingredient):
+            checked = drifted = 0
+            for batch_checked, batch_drifted in reconcile_recipe_counts(
+                model,
+                options['batch_size'],
+                options['dry_run'],
+            ):
+                checked += batch_checked
+                drifted += batch_drifted
+            verb = 'Found' if options['dry_run'] else 'Repaired'
+            self.stdout.write(self.style.SUCCESS(
+                f'{verb} {drifted} wrong counts in {checked} '
+                f'{model._meta.verbose_name_plural}'
+            ))
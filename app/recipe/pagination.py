@@ -0,0 +1,208 @@
+"""
+pagination for the recipe api
+"""
+import hashlib
+import json
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import connections
+from django.db.models import (BooleanField, F, Func, Value)
+
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import (
+    CursorPagination,
+    _reverse_ordering,
+)
+from rest_framework.response import Response
+
+
+def _is_true(value):
+    """return true for truthy query parameter values"""
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+class Row(Func):
+    """sql row value of expressions"""
+    template = '(%(expressions)s)'
+
+
+class RecipeCursorPagination(CursorPagination):
+    """keyset pagination for recipes, newest first
+
+    the cursor encodes the last seen position so every page is a range
+    scan on the ordering column, no matter how deep it is. orderings of
+    several fields go in one direction and end with a unique field, their
+    cursor holds the values of every field and pages filter on all of
+    them, so rows tied on the first field are never skipped with an
+    offset. a total is only computed when the client asks for it with
+    ``?count=true``.
+    """
+    ordering = '-id'
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    count_query_param = 'count'
+    # above this many rows the planner estimate is used on postgresql
+    count_estimate_threshold = 10000
+    count_cache_timeout = 60
+
+    def paginate_queryset(self, queryset, request, view=None):
+        """paginate the queryset, counting it only when asked to"""
+        self.count = None
+        self.count_is_estimate = False
+        if _is_true(request.query_params.get(self.count_query_param)):
+            self.count, self.count_is_estimate = self.get_count(queryset)
+        if len(self.get_ordering(request, queryset, view)) == 1:
+            return super().paginate_queryset(queryset, request, view)
+        return self._paginate_keyset(queryset, request, view)
+
+    def _paginate_keyset(self, queryset, request, view):
+        """paginate on the composite position of a unique ordering
+
+        every position is unique, so unlike the stock cursor no offset is
+        ever needed and the next and previous links work unchanged.
+        """
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(request, queryset, view)
+        self.cursor = self.decode_cursor(request)
+        reverse, position = False, None
+        if self.cursor is not None:
+            reverse, position = self.cursor.reverse, self.cursor.position
+
+        ordering = self.ordering
+        if reverse:
+            ordering = _reverse_ordering(ordering)
+        queryset = queryset.order_by(*ordering)
+        if position is not None:
+            queryset = queryset.filter(self._after(ordering, position))
+
+        results = list(queryset[:self.page_size + 1])
+        self.page = results[:self.page_size]
+        following = None
+        if len(results) > len(self.page):
+            following = self._get_position_from_instance(
+                results[-1],
+                self.ordering,
+            )
+        if reverse:
+            self.page.reverse()
+            self.has_next = position is not None
+            self.next_position = position
+            self.has_previous = following is not None
+            self.previous_position = following
+        else:
+            self.has_next = following is not None
+            self.next_position = following
+            self.has_previous = position is not None
+            self.previous_position = position
+        if (self.has_previous or self.has_next) and self.template is not None:
+            self.display_page_controls = True
+        return self.page
+
+    def _after(self, ordering, position):
+        """return a filter for the rows following a position
+
+        a row value comparison, ``(a, b) > (x, y)``, is a single range of
+        an index on the ordering columns. spelled out with OR postgresql
+        filters every row before the position.
+        """
+        descending = {order.startswith('-') for order in ordering}
+        assert len(descending) == 1, (
+            f'Ordering {ordering} has to go in one direction.'
+        )
+        try:
+            values = json.loads(position)
+        except ValueError:
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != len(ordering):
+            raise NotFound(self.invalid_cursor_message)
+        return Func(
+            Row(*(F(order.lstrip('-')) for order in ordering)),
+            Row(*(Value(value) for value in values)),
+            arg_joiner=' < ' if descending.pop() else ' > ',
+            template='%(expressions)s',
+            output_field=BooleanField(),
+        )
+
+    def _get_position_from_instance(self, instance, ordering):
+        """return the values of every ordering field of a composite one"""
+        if len(ordering) == 1:
+            return super()._get_position_from_instance(instance, ordering)
+        values = [
+            instance[field] if isinstance(instance, dict)
+            else getattr(instance, field)
+            for field in (order.lstrip('-') for order in ordering)
+        ]
+        return json.dumps(values, separators=(',', ':'))
+
+    def get_ordering(self, request, queryset, view):
+        """use the view's cursor ordering when it provides one"""
+        get_cursor_ordering = getattr(view, 'get_cursor_ordering', None)
+        ordering = get_cursor_ordering() if get_cursor_ordering else None
+        if ordering:
+            return ordering
+        return super().get_ordering(request, queryset, view)
+
+    def get_count(self, queryset):
+        """return a cached total and whether it is an estimate"""
+        queryset = queryset.order_by()
+        sql, params = queryset.query.sql_with_params()
+        key = 'recipe-count:' + hashlib.md5(
+            f'{sql}{params}'.encode()
+        ).hexdigest()
+        result = cache.get(key)
+        if result is None:
+            result = self._estimate_count(queryset)
+            cache.set(key, result, self.count_cache_timeout)
+        return result
+
+    def _estimate_count(self, queryset):
+        """use the query planner estimate for large postgresql results"""
+        if connections[queryset.db].vendor == 'postgresql':
+            plan = json.loads(queryset.explain(format='json'))
+            estimate = int(plan[0]['Plan']['Plan Rows'])
+            if estimate >= self.count_estimate_threshold:
+                return estimate, True
+        return queryset.count(), False
+
+    def get_paginated_response(self, data):
+        """return the page with optional count information"""
+        page = [
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+        ]
+        if self.count is not None:
+            page += [
+                ('count', self.count),
+                ('count_is_estimate', self.count_is_estimate),
+            ]
+        page.append(('results', data))
+        return Response(OrderedDict(page))
+
+    def get_paginated_response_schema(self, schema):
+        """document the optional count fields"""
+        response_schema = super().get_paginated_response_schema(schema)
+        response_schema['properties'].update({
+            'count': {'type': 'integer', 'nullable': True},
+            'count_is_estimate': {'type': 'boolean'},
+        })
+        return response_schema
+
+    def get_schema_operation_parameters(self, view):
+        """document the count parameter"""
+        parameters = super().get_schema_operation_parameters(view)
+        parameters.append({
+            'name': self.count_query_param,
+            'required': False,
+            'in': 'query',
+            'description': 'Include an (approximate) total count.',
+            'schema': {'type': 'boolean'},
+        })
+        return parameters
+
+
+class RecipeAttrCursorPagination(RecipeCursorPagination):
+    """keyset pagination for tags and ingredients"""
+    ordering = '-name'
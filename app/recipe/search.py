@@ -0,0 +1,115 @@
+"""
+full text search for recipes
+
+postgresql keeps a weighted ``tsvector`` in ``Recipe.search_vector``
+backed by a GIN index. sqlite keeps the same documents in the
+``core_recipe_fts`` FTS5 table so search can be used and tested locally.
+both are refreshed through ``refresh_search_index`` from signal handlers.
+"""
+import re
+
+from django.contrib.postgres.search import (SearchQuery, SearchRank)
+from django.db import connection
+from django.db.models import (F, FloatField, Value)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Cast
+
+from core.bulk import BATCH_SIZE
+
+
+SEARCH_CONFIG = 'english'
+FTS_TABLE = 'core_recipe_fts'
+# bm25 weights for user_id, title, tags, ingredients and description
+FTS_WEIGHTS = '0.0, 10.0, 4.0, 4.0, 1.0'
+
+POSTGRES_REFRESH = """
+    UPDATE core_recipe r SET search_vector =
+        setweight(to_tsvector(%(config)s, coalesce(r.title, '')), 'A') ||
+        setweight(to_tsvector(%(config)s, coalesce((
+            SELECT string_agg(t.name, ' ') FROM core_tag t
+            JOIN core_recipe_tags rt ON rt.tag_id = t.id
+            WHERE rt.recipe_id = r.id), '')), 'B') ||
+        setweight(to_tsvector(%(config)s, coalesce((
+            SELECT string_agg(i.name, ' ') FROM core_ingredient i
+            JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id
+            WHERE ri.recipe_id = r.id), '')), 'B') ||
+        setweight(to_tsvector(%(config)s, coalesce(r.description, '')), 'C')
+    WHERE r.id = ANY(%(ids)s)
+"""
+
+SQLITE_DELETE = f'DELETE FROM {FTS_TABLE} WHERE rowid IN ({{params}})'
+SQLITE_INSERT = f"""
+    INSERT INTO {FTS_TABLE}
+        (rowid, user_id, title, tags, ingredients, description)
+    SELECT r.id, r.user_id, r.title,
+        coalesce((SELECT group_concat(t.name, ' ') FROM core_tag t
+            JOIN core_recipe_tags rt ON rt.tag_id = t.id
+            WHERE rt.recipe_id = r.id), ''),
+        coalesce((SELECT group_concat(i.name, ' ') FROM core_ingredient i
+            JOIN core_recipe_ingredients ri ON ri.ingredient_id = i.id
+            WHERE ri.recipe_id = r.id), ''),
+        r.description
+    FROM core_recipe r WHERE r.id IN ({{params}})
+"""
+
+
+def refresh_search_index(recipe_ids):
+    """rebuild the search documents of the given recipes"""
+    recipe_ids = list(set(recipe_ids))
+    if not recipe_ids:
+        return
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute(
+                POSTGRES_REFRESH,
+                {'config': SEARCH_CONFIG, 'ids': recipe_ids},
+            )
+    elif connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            for start in range(0, len(recipe_ids), BATCH_SIZE):
+                batch = recipe_ids[start:start + BATCH_SIZE]
+                params = ', '.join(['%s'] * len(batch))
+                cursor.execute(SQLITE_DELETE.format(params=params), batch)
+                cursor.execute(SQLITE_INSERT.format(params=params), batch)
+
+
+def _fts_query(text):
+    """turn free text into an FTS5 query of quoted terms"""
+    terms = re.findall(r'\w+', text)
+    return ' '.join(f'"{term}"' for term in terms)
+
+
+def search_recipes(queryset, text):
+    """filter recipes matching text, annotated with search_rank"""
+    if connection.vendor == 'postgresql':
+        query = SearchQuery(
+            text,
+            config=SEARCH_CONFIG,
+            search_type='websearch',
+        )
+        return queryset.annotate(
+            search_rank=Cast(
+                SearchRank(F('search_vector'), query),
+                FloatField(),
+            ),
+        ).filter(search_vector=query)
+
+    fts_query = _fts_query(text)
+    if not fts_query:
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField()),
+        ).none()
+    table = queryset.model._meta.db_table
+    return queryset.filter(
+        id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (fts_query,),
+        ),
+    ).annotate(
+        search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, {FTS_WEIGHTS}) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+            (fts_query,),
+            output_field=FloatField(),
+        ),
+    )
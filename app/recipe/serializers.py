@@ -1,15 +1,49 @@
 """
 serializers for recipe api
 """
+from operator import itemgetter
 
+from django.conf import settings
+from django.urls import reverse
+from drf_spectacular.types import OpenApiTypes
+from drf_spectacular.utils import extend_schema_field
+from PIL import Image
 from rest_framework import serializers
+from core.bulk import (
+    insert_recipes,
+    link_recipes,
+    resolve_names,
+)
 from core.models import (
     Recipe,
     Tag,
     Ingredient,
+    UploadSession,
+    normalize_name,
 )
+from core.signals import recipes_bulk_changed
+from recipe.images import (variant_formats, variant_key, VARIANTS)
+
+
+class UniqueNameMixin:
+    """reject renaming a tag or ingredient to a name the user already has"""
+
+    def validate_name(self, name):
+        # nested in a recipe the name refers to an existing row instead
+        if not isinstance(self.instance, self.Meta.model):
+            return name
+        taken = self.Meta.model.objects.filter(
+            user=self.instance.user_id,
+            normalized_name=normalize_name(name),
+        ).exclude(pk=self.instance.pk)
+        if taken.exists():
+            raise serializers.ValidationError(
+                'An entry with this name already exists.'
+            )
+        return name
+
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(UniqueNameMixin, serializers.ModelSerializer):
     """seializer for tags"""
 
     class Meta:
@@ -18,7 +52,7 @@ class TagSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(UniqueNameMixin, serializers.ModelSerializer):
     """seializer for Ingredient"""
 
     class Meta:
@@ -27,39 +61,152 @@ class IngredientSerializer(serializers.ModelSerializer):
         read_only_fields = ['id']
 
 
+def image_variant_urls(name, image_status, request=None):
+    """return the variant urls of a recipe image, None until it is ready"""
+    if not name or image_status != Recipe.ImageStatus.READY:
+        return None
+    key = variant_key(name)
+    urls = {}
+    for variant in VARIANTS:
+        urls[variant] = {}
+        for ext in variant_formats(name):
+            url = reverse('recipe:image-variant', kwargs={
+                'key': key,
+                'variant': variant,
+                'ext': ext,
+            })
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            urls[variant][ext] = url
+    return urls
+
+
+@extend_schema_field(OpenApiTypes.OBJECT)
+class ImageVariantsField(serializers.Field):
+    """read only urls of the image variants of a recipe
+
+    maps variant names to urls per format, null until the image is ready.
+    """
+
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        return image_variant_urls(
+            recipe.image.name,
+            recipe.image_status,
+            self.context.get('request'),
+        )
+
+
+class RecipeListSerializer(serializers.ListSerializer):
+    """serializer writing a batch of recipes at once
+
+    tag and ingredient names are resolved once for the whole batch, new
+    recipes and their m2m rows are written with bulk inserts.
+    """
+
+    def _resolve_relations(self, validated_data):
+        """resolve every tag and ingredient name used in the batch"""
+        for field_name, model in (('tags', Tag), ('ingredients', Ingredient)):
+            self.child._get_or_create_objects(model, [
+                item
+                for attrs in validated_data
+                for item in attrs.get(field_name) or []
+            ])
+
+    def create(self, validated_data):
+        """create all recipes of the batch"""
+        self._resolve_relations(validated_data)
+        relations = [
+            (attrs.pop('tags', []), attrs.pop('ingredients', []))
+            for attrs in validated_data
+        ]
+        recipes = insert_recipes(
+            [Recipe(**attrs) for attrs in validated_data]
+        )
+        for index, (field_name, model) in enumerate(
+            (('tags', Tag), ('ingredients', Ingredient))
+        ):
+            link_recipes(field_name, [
+                (recipe.pk, obj.pk)
+                for recipe, items in zip(recipes, relations)
+                for obj in self.child._get_or_create_objects(
+                    model,
+                    items[index],
+                )
+            ])
+        recipes_bulk_changed.send(
+            sender=Recipe,
+            user_ids={recipe.user_id for recipe in recipes},
+            recipe_ids=[recipe.pk for recipe in recipes],
+        )
+        return recipes
+
+    def update(self, instance, validated_data):
+        """update the recipes of the batch, matched by position"""
+        self._resolve_relations(validated_data)
+        return [
+            self.child.update(recipe, attrs)
+            for recipe, attrs in zip(instance, validated_data)
+        ]
+
+
 class RecipeSerializers(serializers.ModelSerializer):
     """serializer for recipes"""
     tags = TagSerializer(many=True, required=False)
     ingredients = IngredientSerializer(many=True, required=False)
+    image_variants = ImageVariantsField()
+
     class Meta:
         model = Recipe
-        fields = ['id', 'title', 'time_minutes', 'price', 'link', 'tags', 'ingredients',]
+        fields = [
+            'id',
+            'title',
+            'time_minutes',
+            'price',
+            'link',
+            'tags',
+            'ingredients',
+            'image_variants',
+        ]
         read_only_fields=['id']
+        list_serializer_class = RecipeListSerializer
 
 
 
-    def _get_or_create_tags(self, tags, recipe):
-        """handle getting or creating tags as needed"""
-        auth_user = self.context['request'].user
-        for tag in tags:
-            tag_obj, created = Tag.objects.get_or_create(
-                user = auth_user,
-                **tag,
-            )
-            recipe.tags.add(tag_obj)
+    def _get_or_create_objects(self, model, items):
+        """return objects matching the given names, creating missing ones
 
+        existing names are fetched with a single query and the missing
+        ones are inserted with one bulk insert, so the cost does not
+        grow with the number of items. resolved objects are remembered in
+        the serializer context so a batch of recipes shares them.
+        """
+        resolved = self.context.setdefault(
+            'resolved_objects', {}
+        ).setdefault(model, {})
+        names = list(dict.fromkeys(item['name'] for item in items))
+        missing_names = [name for name in names if name not in resolved]
+        if missing_names:
+            resolved.update(resolve_names(
+                model,
+                self.context['request'].user,
+                missing_names,
+            ))
+        return [resolved[name] for name in names]
 
-    def _get_or_create_ingredients(self, ingredients, recipe):
+    def _get_or_create_tags(self, tags, recipe):
         """handle getting or creating tags as needed"""
-        auth_user = self.context['request'].user
-        for ingredient in ingredients:
-            ingredients_obj, created = Ingredient.objects.get_or_create(
-                user = auth_user,
-                **ingredient,
-            )
-            recipe.ingredients.add(ingredients_obj)
-
+        recipe.tags.add(*self._get_or_create_objects(Tag, tags))
 
+    def _get_or_create_ingredients(self, ingredients, recipe):
+        """handle getting or creating ingredients as needed"""
+        recipe.ingredients.add(
+            *self._get_or_create_objects(Ingredient, ingredients)
+        )
 
     def create(self, validated_data):
         """create a reipe"""
@@ -71,17 +218,17 @@ class RecipeSerializers(serializers.ModelSerializer):
         return recipe
 
     def update(self, instance, validated_data):
-        """updating a tag"""
+        """updating a recipe"""
 
         tags = validated_data.pop('tags', None)
         ingredients = validated_data.pop('ingredients', None)
         if tags is not None:
-            instance.tags.clear()
-            self._get_or_create_tags(tags, instance)
+            instance.tags.set(self._get_or_create_objects(Tag, tags))
 
         if ingredients is not None:
-            instance.tags.clear()
-            self._get_or_create_ingredients(ingredients, instance)
+            instance.ingredients.set(
+                self._get_or_create_objects(Ingredient, ingredients)
+            )
 
         for attr, value in validated_data.items():
             setattr(instance, attr, value)
@@ -91,27 +238,192 @@ class RecipeSerializers(serializers.ModelSerializer):
 
 
 
+class RecipeListReader:
+    """read only fast path building the output of ``RecipeSerializers``
+
+    recipes are read as ``values()`` rows and their tags and ingredients
+    with one query each, no model instances or serializer fields are
+    built per recipe. the output must stay identical to the serializer,
+    see ``test_fast_serializer``. ``fields`` limits the output to a
+    sparse fieldset.
+    """
+    output_fields = (
+        'id',
+        'title',
+        'time_minutes',
+        'price',
+        'link',
+        'tags',
+        'ingredients',
+        'image_variants',
+    )
+    # row fields of the output fields not read from a row field of that name
+    field_sources = {
+        'tags': (),
+        'ingredients': (),
+        'image_variants': ('image', 'image_status'),
+    }
+
+    def __init__(self, context, fields=None):
+        self.context = context
+        self.fields = [
+            name for name in self.output_fields
+            if fields is None or name in fields
+        ]
+        self._price = RecipeSerializers().fields['price'].to_representation
+
+    def rows(self, queryset, *extra):
+        """return a queryset of the rows needed for the output"""
+        fields = ['id']
+        for name in self.fields:
+            fields.extend(self.field_sources.get(name, (name,)))
+        fields.extend(extra)
+        return queryset.prefetch_related(None).values(
+            *dict.fromkeys(fields)
+        )
+
+    def _related(self, field_name, recipe_ids):
+        """return recipe ids mapped to their related objects, by id"""
+        if field_name not in self.fields:
+            return {}
+        field = Recipe._meta.get_field(field_name)
+        through = field.remote_field.through
+        source = field.m2m_field_name()
+        target = field.m2m_reverse_field_name()
+        related = {}
+        rows = through.objects.filter(
+            **{f'{source}_id__in': recipe_ids}
+        ).order_by(f'{target}_id').values_list(
+            f'{source}_id',
+            f'{target}_id',
+            f'{target}__name',
+        )
+        for recipe_id, pk, name in rows:
+            related.setdefault(recipe_id, []).append({'id': pk, 'name': name})
+        return related
+
+    def to_representation(self, rows):
+        """return the serialized rows"""
+        recipe_ids = [row['id'] for row in rows]
+        if not recipe_ids:
+            return []
+        tags = self._related('tags', recipe_ids)
+        ingredients = self._related('ingredients', recipe_ids)
+        request = self.context.get('request')
+        price = self._price
+        getters = {
+            'id': itemgetter('id'),
+            'title': itemgetter('title'),
+            'time_minutes': itemgetter('time_minutes'),
+            'price': lambda row: price(row['price']),
+            'link': itemgetter('link'),
+            'tags': lambda row: tags.get(row['id'], []),
+            'ingredients': lambda row: ingredients.get(row['id'], []),
+            'image_variants': lambda row: image_variant_urls(
+                row['image'],
+                row['image_status'],
+                request,
+            ),
+        }
+        selected = [(name, getters[name]) for name in self.fields]
+        return [{name: get(row) for name, get in selected} for row in rows]
+
+
 class RecipeDetailSerializers(RecipeSerializers):
     """serializer for detail recipe view"""
     class Meta(RecipeSerializers.Meta):
-        fields = RecipeSerializers.Meta.fields + ['description', 'image']
-
-    def update(self, instance, validated_data):
-        tags_data = validated_data.pop('tags', [])
-        instance = super().update(instance, validated_data)
+        fields = RecipeSerializers.Meta.fields + [
+            'description',
+            'image',
+            'image_status',
+        ]
+        read_only_fields = RecipeSerializers.Meta.read_only_fields + [
+            'image_status',
+        ]
 
-        # Update the tags
-        instance.tags.clear()
-        for tag_data in tags_data:
-            tag_obj, created = Tag.objects.get_or_create(user=self.context['request'].user, **tag_data)
-            instance.tags.add(tag_obj)
+class RecipeImageSerializer(serializers.ModelSerializer):
+    """serializer for uploading images to recipes
 
-        return instance
+    only the image header is checked here, decoding happens in the
+    background, see recipe.images.
+    """
+    image = serializers.FileField(required=True)
+    image_variants = ImageVariantsField()
 
-class RecipeImageSerializer(serializers.ModelSerializer):
-    """serializer for uploading images to recipes"""
     class Meta:
         model = Recipe
-        fields =['id', 'image', ]
-        read_only_fields=['id']
-        extra_kwargs = {'image': {'required': 'True'}}
\ No newline at end of file
+        fields =['id', 'image', 'image_status', 'image_variants']
+        read_only_fields=['id', 'image_status']
+
+    def validate_image(self, value):
+        """check the upload looks like an image Pillow can read"""
+        try:
+            Image.open(value)
+        except (OSError, SyntaxError, ValueError):
+            raise serializers.ValidationError(
+                'Upload a valid image. The file you uploaded was either '
+                'not an image or a corrupted image.'
+            )
+        finally:
+            value.seek(0)
+        return value
+
+
+class OwnRecipeField(serializers.PrimaryKeyRelatedField):
+    """a recipe of the requesting user
+
+    recipes of other users are reported like missing ones, so ids do not
+    reveal which recipes exist.
+    """
+
+    def get_queryset(self):
+        return Recipe.objects.filter(user=self.context['request'].user)
+
+
+class UploadSessionSerializer(serializers.ModelSerializer):
+    """serializer for resumable image upload sessions"""
+    recipe = OwnRecipeField()
+
+    class Meta:
+        model = UploadSession
+        fields = ['id', 'recipe', 'filename', 'size', 'received', 'expires_at']
+        read_only_fields = ['id', 'received', 'expires_at']
+
+    def validate_size(self, size):
+        """check the announced size is within the upload limit"""
+        max_size = settings.UPLOAD_SESSIONS['MAX_SIZE']
+        if not 0 < size <= max_size:
+            raise serializers.ValidationError(
+                f'Size must be between 1 and {max_size} bytes.'
+            )
+        return size
+
+
+class RecipeUsageSerializer(serializers.Serializer):
+    """a tag or ingredient with the number of recipes using it"""
+    id = serializers.IntegerField()
+    name = serializers.CharField()
+    recipe_count = serializers.IntegerField()
+
+
+class TimeBucketSerializer(serializers.Serializer):
+    """a bucket of the time_minutes histogram, minutes_to is exclusive"""
+    minutes_from = serializers.IntegerField()
+    minutes_to = serializers.IntegerField(allow_null=True)
+    count = serializers.IntegerField()
+
+
+class RecipeStatsSerializer(serializers.Serializer):
+    """read only statistics of the user's recipes"""
+    recipe_count = serializers.IntegerField()
+    total_price = serializers.DecimalField(max_digits=14, decimal_places=2)
+    total_time_minutes = serializers.IntegerField()
+    average_price = serializers.DecimalField(
+        max_digits=14,
+        decimal_places=2,
+        allow_null=True,
+    )
+    average_time_minutes = serializers.FloatField(allow_null=True)
+    time_minutes_histogram = TimeBucketSerializer(many=True)
+    top_tags = RecipeUsageSerializer(many=True)
+    top_ingredients = RecipeUsageSerializer(many=True)
@@ -0,0 +1,295 @@
+"""
+signal handlers keeping derived recipe data up to date
+"""
+from django.db.models.signals import (
+    m2m_changed,
+    post_delete,
+    post_save,
+    pre_delete,
+    pre_save,
+)
+from django.db import transaction
+from django.dispatch import receiver
+from django.utils import timezone
+
+from django.contrib.auth import get_user_model
+
+from core.models import (
+    Ingredient,
+    Recipe,
+    Tag,
+    UploadSession,
+)
+from core.signals import recipes_bulk_changed
+from recipe.cache import invalidate_cache
+from recipe.counts import (
+    add_recipe_links,
+    adjust_recipe_counts,
+    linked_ids,
+)
+from recipe.images import delete_image_files
+from recipe.stats import (
+    add_bulk_recipes,
+    apply_changes,
+    create_user_stats,
+)
+from recipe.search import refresh_search_index
+from recipe.uploads import discard_upload
+
+
+def _recipe_ids_for(instance):
+    """return ids of the recipes using a tag or ingredient"""
+    return list(instance.recipe_set.values_list('id', flat=True))
+
+
+def _recipes_changed(recipe_ids):
+    """refresh derived data of recipes whose relations changed"""
+    recipe_ids = list(recipe_ids)
+    if not recipe_ids:
+        return
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated_at=timezone.now())
+    refresh_search_index(recipe_ids)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(sender, instance, **kwargs):
+    """refresh the search document of a saved recipe"""
+    refresh_search_index([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(sender, instance, **kwargs):
+    """drop the search document of a deleted recipe"""
+    refresh_search_index([instance.pk])
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_image_released(sender, instance, **kwargs):
+    """release the image of a deleted recipe once the delete commits"""
+    name = instance.image.name
+    if name:
+        transaction.on_commit(lambda: delete_image_files(name))
+
+
+@receiver(post_delete, sender=UploadSession)
+def upload_session_deleted(sender, instance, **kwargs):
+    """delete the partial file of a finished or abandoned upload"""
+    # the primary key is cleared once the delete returns
+    path = instance.path
+    transaction.on_commit(lambda: discard_upload(path))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_relations_changed(sender, instance, action, reverse, pk_set,
+                             **kwargs):
+    """refresh and touch recipes whose tags or ingredients changed"""
+    if reverse and action == 'pre_clear':
+        instance._cleared_recipe_ids = _recipe_ids_for(instance)
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        if not reverse:
+            recipe_ids = [instance.pk]
+        elif action == 'post_clear':
+            recipe_ids = getattr(instance, '_cleared_recipe_ids', [])
+        else:
+            recipe_ids = pk_set
+        _recipes_changed(recipe_ids)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_save, sender=Ingredient)
+def attr_saved(sender, instance, created, **kwargs):
+    """refresh and touch recipes using a renamed tag or ingredient"""
+    if not created:
+        _recipes_changed(_recipe_ids_for(instance))
+
+
+@receiver(pre_delete, sender=Tag)
+@receiver(pre_delete, sender=Ingredient)
+def attr_deleting(sender, instance, **kwargs):
+    """remember the recipes using a tag or ingredient before deletion"""
+    instance._deleted_recipe_ids = _recipe_ids_for(instance)
+
+
+@receiver(post_delete, sender=Tag)
+@receiver(post_delete, sender=Ingredient)
+def attr_deleted(sender, instance, **kwargs):
+    """refresh and touch recipes that used a deleted tag or ingredient"""
+    _recipes_changed(getattr(instance, '_deleted_recipe_ids', []))
+
+
+@receiver(recipes_bulk_changed)
+def recipes_bulk_written(sender, recipe_ids, **kwargs):
+    """refresh the search documents of recipes written in bulk"""
+    refresh_search_index(recipe_ids)
+
+
+# denormalized recipe counts
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_links_counted(sender, instance, action, reverse, pk_set,
+                         **kwargs):
+    """count added and removed links on their tags and ingredients"""
+    model = Tag if sender is Recipe.tags.through else Ingredient
+    if action in ('pre_remove', 'pre_clear'):
+        # only links that exist are removed
+        if reverse:
+            instance._unlinked_ids = linked_ids(model, pk_set, [instance.pk])
+        else:
+            instance._unlinked_ids = linked_ids(model, [instance.pk], pk_set)
+    elif action in ('post_remove', 'post_clear'):
+        adjust_recipe_counts(model, getattr(instance, '_unlinked_ids', []), -1)
+    elif action == 'post_add':
+        # pk_set only holds the links that were missing
+        if reverse:
+            adjust_recipe_counts(model, [instance.pk], len(pk_set))
+        else:
+            adjust_recipe_counts(model, pk_set)
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting_counted(sender, instance, **kwargs):
+    """remember the links of a recipe before deletion"""
+    instance._linked_ids = {
+        model: linked_ids(model, [instance.pk])
+        for model in (Tag, Ingredient)
+    }
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted_counted(sender, instance, **kwargs):
+    """uncount the links of a deleted recipe"""
+    for model, ids in getattr(instance, '_linked_ids', {}).items():
+        adjust_recipe_counts(model, ids, -1)
+
+
+@receiver(recipes_bulk_changed)
+def recipes_bulk_counted(sender, recipe_ids, **kwargs):
+    """count the links of recipes created in bulk"""
+    for model in (Tag, Ingredient):
+        add_recipe_links(model, recipe_ids)
+
+
+# recipe statistics
+
+STATS_FIELDS = ('user', 'price', 'time_minutes')
+
+
+@receiver(pre_save, sender=Recipe)
+def recipe_saving_stats(sender, instance, update_fields, **kwargs):
+    """remember the values an edited recipe was counted with"""
+    instance._stats_previous = None
+    if instance._state.adding or (
+        update_fields is not None
+        and not set(STATS_FIELDS) & set(update_fields)
+    ):
+        return
+    instance._stats_previous = Recipe.objects.filter(
+        pk=instance.pk,
+    ).values_list('user_id', 'price', 'time_minutes').first()
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved_stats(sender, instance, created, **kwargs):
+    """count a new recipe or the changed values of an edited one"""
+    if getattr(instance, '_bulk_insert', False):
+        return
+    current = (instance.user_id, 1, instance.price, instance.time_minutes)
+    if created:
+        apply_changes([current])
+        return
+    previous = getattr(instance, '_stats_previous', None)
+    if previous is not None:
+        user_id, price, minutes = previous
+        apply_changes([(user_id, -1, price, minutes), current])
+
+
+@receiver(pre_delete, sender=Recipe)
+def recipe_deleting_stats(sender, instance, **kwargs):
+    """remember the stored values of a recipe before deletion"""
+    instance._stats_previous = Recipe.objects.filter(
+        pk=instance.pk,
+    ).values_list('user_id', 'price', 'time_minutes').first()
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted_stats(sender, instance, **kwargs):
+    """uncount a deleted recipe"""
+    previous = getattr(instance, '_stats_previous', None)
+    if previous is not None:
+        user_id, price, minutes = previous
+        apply_changes(
+            [(user_id, -1, price, minutes)],
+            rebuild_missing=False,
+        )
+
+
+@receiver(post_save, sender=get_user_model())
+def user_created_stats(sender, instance, created, raw=False, **kwargs):
+    """start the statistics of a new user at zero"""
+    if created and not raw:
+        create_user_stats(instance.pk)
+
+
+@receiver(recipes_bulk_changed)
+def recipes_bulk_stats(sender, recipe_ids, **kwargs):
+    """count recipes created in bulk"""
+    add_bulk_recipes(recipe_ids)
+
+
+# response cache invalidation
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved_invalidate(sender, instance, **kwargs):
+    """invalidate cached recipes of the owner"""
+    invalidate_cache(instance.user_id, 'recipe')
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted_invalidate(sender, instance, **kwargs):
+    """invalidate cached recipes and assignments of the owner"""
+    invalidate_cache(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_tags_invalidate(sender, instance, action, **kwargs):
+    """invalidate cached recipes and tags when assignments change"""
+    if action.startswith('post_'):
+        invalidate_cache(instance.user_id, 'recipe', 'tag')
+
+
+@receiver(m2m_changed, sender=Recipe.ingredients.through)
+def recipe_ingredients_invalidate(sender, instance, action, **kwargs):
+    """invalidate cached recipes and ingredients when assignments change"""
+    if action.startswith('post_'):
+        invalidate_cache(instance.user_id, 'recipe', 'ingredient')
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def tag_invalidate(sender, instance, **kwargs):
+    """invalidate cached tags and the recipes nesting them"""
+    invalidate_cache(instance.user_id, 'recipe', 'tag')
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def ingredient_invalidate(sender, instance, **kwargs):
+    """invalidate cached ingredients and the recipes nesting them"""
+    invalidate_cache(instance.user_id, 'recipe', 'ingredient')
+
+
+@receiver(post_save, sender=get_user_model())
+@receiver(post_delete, sender=get_user_model())
+def user_invalidate(sender, instance, **kwargs):
+    """drop everything cached under a user id that is new or gone"""
+    if kwargs.get('created', True):
+        invalidate_cache(instance.pk)
+
+
+@receiver(recipes_bulk_changed)
+def recipes_bulk_invalidate(sender, user_ids, **kwargs):
+    """invalidate everything cached for users with bulk written recipes"""
+    for user_id in user_ids:
+        invalidate_cache(user_id)
@@ -0,0 +1,108 @@
+"""
+sparse fieldsets for the recipe api
+
+``?fields=id,title`` keeps only the named fields of a response and
+``?omit=description`` drops fields. the selection is pushed down to SQL:
+the queryset only loads the columns the selected fields need.
+"""
+from django.core.exceptions import FieldDoesNotExist
+from drf_spectacular.utils import OpenApiParameter
+from drf_spectacular.types import OpenApiTypes
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+
+
+FIELDS_PARAM = 'fields'
+OMIT_PARAM = 'omit'
+
+SPARSE_PARAMETERS = [
+    OpenApiParameter(
+        FIELDS_PARAM,
+        OpenApiTypes.STR,
+        description='Comma separated list of fields to return',
+    ),
+    OpenApiParameter(
+        OMIT_PARAM,
+        OpenApiTypes.STR,
+        description='Comma separated list of fields to leave out',
+    ),
+]
+
+
+def _names(value):
+    """split a comma separated list of field names"""
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+class SparseFieldsMixin:
+    """view mixin trimming read responses to the requested fields
+
+    views name the model columns of computed fields in
+    ``sparse_field_sources`` and the columns pagination needs in
+    ``sparse_required_fields``.
+    """
+    sparse_field_sources = {}
+    sparse_required_fields = ('id',)
+
+    def _get_response_fields(self):
+        """return the bound fields of the response serializer"""
+        serializer_class = self.get_serializer_class()
+        return serializer_class(context=self.get_serializer_context()).fields
+
+    def get_sparse_fields(self):
+        """return the selected field names, None when all are selected"""
+        if hasattr(self, '_sparse_fields'):
+            return self._sparse_fields
+        self._sparse_fields = None
+        params = self.request.query_params
+        if self.request.method not in SAFE_METHODS or not (
+            FIELDS_PARAM in params or OMIT_PARAM in params
+        ):
+            return None
+        if FIELDS_PARAM in params and OMIT_PARAM in params:
+            raise ValidationError(
+                f'Use either {FIELDS_PARAM} or {OMIT_PARAM}, not both.'
+            )
+        param = FIELDS_PARAM if FIELDS_PARAM in params else OMIT_PARAM
+        names = _names(params[param])
+        available = list(self._get_response_fields())
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise ValidationError({
+                param: f'Unknown fields: {", ".join(unknown)}.',
+            })
+        if param == FIELDS_PARAM:
+            self._sparse_fields = [n for n in available if n in names]
+        else:
+            self._sparse_fields = [n for n in available if n not in names]
+        return self._sparse_fields
+
+    def sparse_queryset(self, queryset):
+        """only load the columns the selected fields need"""
+        selected = self.get_sparse_fields()
+        if selected is None:
+            return queryset
+        fields = self._get_response_fields()
+        columns = set(self.sparse_required_fields)
+        for name in selected:
+            if name in self.sparse_field_sources:
+                columns.update(self.sparse_field_sources[name])
+                continue
+            try:
+                field = queryset.model._meta.get_field(fields[name].source)
+            except FieldDoesNotExist:
+                continue
+            if field.concrete and not field.many_to_many:
+                columns.add(field.name)
+        return queryset.only(*columns)
+
+    def get_serializer(self, *args, **kwargs):
+        """return a serializer without the fields left out"""
+        serializer = super().get_serializer(*args, **kwargs)
+        selected = self.get_sparse_fields()
+        if selected is not None:
+            target = getattr(serializer, 'child', serializer)
+            for name in list(target.fields):
+                if name not in selected:
+                    target.fields.pop(name)
+        return serializer
@@ -0,0 +1,233 @@
+"""
+incrementally maintained recipe statistics per user
+
+``RecipeStats`` keeps the count and sums of a user's recipes and
+``RecipeTimeBucket`` a histogram of their ``time_minutes``. signal handlers
+apply the difference every saved or deleted recipe makes, so reading the
+statistics never scans the recipes. the most used tags and ingredients
+come from their maintained ``recipe_count``.
+
+new users start with empty rows, users from before get theirs computed
+from scratch when first needed. ``rebuild_recipe_stats`` compares every
+user's rows with a full recompute and repairs them.
+"""
+import bisect
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import (Count, F, Q, Sum)
+
+from core.bulk import BATCH_SIZE
+from core.models import (
+    Ingredient,
+    Recipe,
+    RecipeStats,
+    RecipeTimeBucket,
+    Tag,
+)
+
+
+# lower bounds in minutes of the time_minutes histogram buckets
+TIME_BUCKETS = (0, 15, 30, 45, 60, 90, 120, 180)
+TOP_COUNT = 10
+
+
+def time_bucket(minutes):
+    """return the lower bound of the bucket a time falls in"""
+    index = bisect.bisect_right(TIME_BUCKETS, minutes) - 1
+    return TIME_BUCKETS[max(index, 0)]
+
+
+def _bucket_filter(index):
+    """return the filter selecting the recipes of a bucket"""
+    bucket = Q()
+    if index > 0:
+        bucket &= Q(time_minutes__gte=TIME_BUCKETS[index])
+    if index + 1 < len(TIME_BUCKETS):
+        bucket &= Q(time_minutes__lt=TIME_BUCKETS[index + 1])
+    return bucket
+
+
+def compute_stats(user_id):
+    """return the statistics of a user computed from the recipes"""
+    totals = Recipe.objects.filter(user_id=user_id).aggregate(
+        recipe_count=Count('id'),
+        total_price=Sum('price'),
+        total_time_minutes=Sum('time_minutes'),
+        **{
+            f'bucket_{index}': Count('id', filter=_bucket_filter(index))
+            for index in range(len(TIME_BUCKETS))
+        },
+    )
+    return {
+        'recipe_count': totals['recipe_count'],
+        'total_price': totals['total_price'] or Decimal('0.00'),
+        'total_time_minutes': totals['total_time_minutes'] or 0,
+        'buckets': {
+            minutes_from: totals[f'bucket_{index}']
+            for index, minutes_from in enumerate(TIME_BUCKETS)
+            if totals[f'bucket_{index}']
+        },
+    }
+
+
+def stored_stats(user_id):
+    """return the maintained statistics of a user, None without a row"""
+    stats = RecipeStats.objects.filter(user_id=user_id).first()
+    if stats is None:
+        return None
+    return {
+        'recipe_count': stats.recipe_count,
+        'total_price': stats.total_price,
+        'total_time_minutes': stats.total_time_minutes,
+        'buckets': dict(RecipeTimeBucket.objects.filter(
+            user_id=user_id,
+        ).exclude(count=0).values_list('minutes_from', 'count')),
+    }
+
+
+def _bucket_rows(user_id, counts):
+    """return a histogram row for every bucket, empty ones included"""
+    return [
+        RecipeTimeBucket(
+            user_id=user_id,
+            minutes_from=minutes_from,
+            count=counts.get(minutes_from, 0),
+        )
+        for minutes_from in TIME_BUCKETS
+    ]
+
+
+def create_user_stats(*user_ids):
+    """create the empty statistics rows of new users"""
+    RecipeStats.objects.bulk_create([
+        RecipeStats(user_id=user_id) for user_id in user_ids
+    ])
+    RecipeTimeBucket.objects.bulk_create([
+        row for user_id in user_ids for row in _bucket_rows(user_id, {})
+    ])
+
+
+def rebuild_user_stats(user_id):
+    """replace the statistics rows of a user with a full recompute"""
+    with transaction.atomic():
+        stats = compute_stats(user_id)
+        RecipeStats.objects.update_or_create(
+            user_id=user_id,
+            defaults={
+                field: stats[field]
+                for field in (
+                    'recipe_count',
+                    'total_price',
+                    'total_time_minutes',
+                )
+            },
+        )
+        RecipeTimeBucket.objects.filter(user_id=user_id).delete()
+        RecipeTimeBucket.objects.bulk_create(
+            _bucket_rows(user_id, stats['buckets']),
+        )
+    return stats
+
+
+def _apply(user_id, count, price, minutes, buckets, rebuild_missing):
+    """add the totals of a change to the statistics rows of a user"""
+    with transaction.atomic():
+        updated = RecipeStats.objects.filter(user_id=user_id).update(
+            recipe_count=F('recipe_count') + count,
+            total_price=F('total_price') + price,
+            total_time_minutes=F('total_time_minutes') + minutes,
+        )
+        if not updated:
+            # the recompute already sees the change
+            if rebuild_missing:
+                rebuild_user_stats(user_id)
+            return
+        for minutes_from, delta in buckets.items():
+            rows = RecipeTimeBucket.objects.filter(
+                user_id=user_id,
+                minutes_from=minutes_from,
+            )
+            if delta == 0 or rows.update(count=F('count') + delta):
+                continue
+            _, created = RecipeTimeBucket.objects.get_or_create(
+                user_id=user_id,
+                minutes_from=minutes_from,
+                defaults={'count': delta},
+            )
+            if not created:
+                rows.update(count=F('count') + delta)
+
+
+def apply_changes(changes, rebuild_missing=True):
+    """apply (user id, sign, price, time_minutes) recipe changes
+
+    a sign of 1 adds a recipe, -1 removes one. changes are summed per
+    user first, an edit is its old values removed and its new ones added.
+    users without statistics get them rebuilt unless ``rebuild_missing``
+    is false, as while the user is being deleted.
+    """
+    totals = defaultdict(lambda: [0, Decimal('0'), 0, defaultdict(int)])
+    for user_id, sign, price, minutes in changes:
+        total = totals[user_id]
+        total[0] += sign
+        total[1] += sign * Decimal(price)
+        total[2] += sign * minutes
+        total[3][time_bucket(minutes)] += sign
+    for user_id, (count, price, minutes, buckets) in totals.items():
+        if count or price or minutes or any(buckets.values()):
+            _apply(user_id, count, price, minutes, buckets, rebuild_missing)
+
+
+def add_bulk_recipes(recipe_ids):
+    """count recipes written in bulk"""
+    recipe_ids = list(recipe_ids)
+    for start in range(0, len(recipe_ids), BATCH_SIZE):
+        apply_changes(
+            (user_id, 1, price, minutes)
+            for user_id, price, minutes in Recipe.objects.filter(
+                pk__in=recipe_ids[start:start + BATCH_SIZE],
+            ).values_list('user_id', 'price', 'time_minutes')
+        )
+
+
+def _top(model, user):
+    """return the most used tags or ingredients of a user"""
+    return list(model.objects.filter(
+        user=user,
+        recipe_count__gt=0,
+    ).order_by('-recipe_count', 'name').values(
+        'id',
+        'name',
+        'recipe_count',
+    )[:TOP_COUNT])
+
+
+def user_stats(user):
+    """return the statistics of a user for the api"""
+    stats = stored_stats(user.pk) or rebuild_user_stats(user.pk)
+    count = stats['recipe_count']
+    histogram = []
+    for index, minutes_from in enumerate(TIME_BUCKETS):
+        upper = TIME_BUCKETS[index + 1:index + 2]
+        histogram.append({
+            'minutes_from': minutes_from,
+            'minutes_to': upper[0] if upper else None,
+            'count': stats['buckets'].get(minutes_from, 0),
+        })
+    return {
+        'recipe_count': count,
+        'total_price': stats['total_price'],
+        'total_time_minutes': stats['total_time_minutes'],
+        'average_price': (
+            (stats['total_price'] / count).quantize(Decimal('0.01'))
+            if count else None
+        ),
+        'average_time_minutes': (
+            round(stats['total_time_minutes'] / count, 1) if count else None
+        ),
+        'time_minutes_histogram': histogram,
+        'top_tags': _top(Tag, user),
+        'top_ingredients': _top(Ingredient, user),
+    }
@@ -0,0 +1,48 @@
+"""
+type-ahead suggestions for tag and ingredient names
+
+names starting with the typed text come first, most used first by their
+maintained ``recipe_count``. when there are too few of them names merely
+resembling the text fill the list: on postgresql these come from a pg_trgm
+index, so typos still match, elsewhere from a substring match. both steps
+are served from indexes on the user's names, see core.indexes.
+"""
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection
+
+
+SUGGEST_LIMIT = 10
+MAX_SUGGEST_LIMIT = 50
+MAX_QUERY_LENGTH = 100
+
+
+def _ranked(queryset, limit, *ordering):
+    """return the best matches, most used first"""
+    return list(queryset.only('id', 'name').order_by(
+        *ordering,
+        '-recipe_count',
+        'name',
+        'id',
+    )[:limit])
+
+
+def suggest_names(queryset, text, limit=SUGGEST_LIMIT):
+    """return the tags or ingredients best matching typed text"""
+    suggestions = _ranked(queryset.filter(name__istartswith=text), limit)
+    if len(suggestions) >= limit:
+        return suggestions
+
+    others = queryset.exclude(name__istartswith=text)
+    if connection.vendor == 'postgresql':
+        similar = others.filter(name__trigram_similar=text).annotate(
+            similarity=TrigramSimilarity('name', text),
+        )
+        return suggestions + _ranked(
+            similar,
+            limit - len(suggestions),
+            '-similarity',
+        )
+    return suggestions + _ranked(
+        others.filter(name__icontains=text),
+        limit - len(suggestions),
+    )
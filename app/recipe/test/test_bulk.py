@@ -0,0 +1,174 @@
+"""
+test for the bulk recipe endpoint
+"""
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (Recipe, Tag, Ingredient)
+
+
+BULK_URL = reverse('recipe:recipe-bulk')
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def recipe_payload(index, **params):
+    """return the payload of a sample recipe"""
+    payload = {
+        'title': f'Recipe {index}',
+        'time_minutes': 10 + index,
+        'price': '5.00',
+        'tags': [{'name': 'Dinner'}, {'name': f'Tag {index}'}],
+        'ingredients': [{'name': 'Salt'}],
+    }
+    payload.update(params)
+    return payload
+
+
+class BulkRecipeApiTests(TestCase):
+    """test creating and updating recipes in bulk"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_bulk_create(self):
+        """test a batch of recipes is created with shared relations"""
+        payload = [recipe_payload(i) for i in range(3)]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [r['title'] for r in res.data],
+            [p['title'] for p in payload],
+        )
+        recipes = Recipe.objects.filter(user=self.user)
+        self.assertEqual(recipes.count(), 3)
+        self.assertEqual(Tag.objects.filter(name='Dinner').count(), 1)
+        self.assertEqual(Ingredient.objects.filter(name='Salt').count(), 1)
+        for recipe in recipes:
+            self.assertEqual(recipe.tags.count(), 2)
+            self.assertEqual(recipe.ingredients.count(), 1)
+            self.assertEqual(recipe.price, Decimal('5.00'))
+
+    def test_bulk_create_resolves_names_once(self):
+        """test tag lookups do not grow with the batch size"""
+        Tag.objects.create(user=self.user, name='Dinner')
+        counts = []
+        for size in (2, 10):
+            payload = [recipe_payload(i) for i in range(size)]
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.post(BULK_URL, payload, format='json')
+            self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+            counts.append(len([
+                q for q in ctx.captured_queries
+                if q['sql'].startswith('SELECT')
+                and 'FROM "core_tag"' in q['sql']
+                and 'INNER JOIN' not in q['sql']
+            ]))
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_bulk_create_errors_per_item(self):
+        """test invalid items are reported by position and nothing is saved"""
+        payload = [
+            recipe_payload(0),
+            recipe_payload(1, title=''),
+            recipe_payload(2, price='not a price'),
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        self.assertIn('title', res.data[1])
+        self.assertIn('price', res.data[2])
+        self.assertFalse(Recipe.objects.exists())
+        self.assertFalse(Tag.objects.exists())
+
+    def test_bulk_requires_list(self):
+        """test the payload must be a bounded list"""
+        res = self.client.post(BULK_URL, recipe_payload(0), format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        payload = [recipe_payload(0)] * 1001
+        res = self.client.post(BULK_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_bulk_update(self):
+        """test a batch of recipes is partially updated"""
+        r1 = Recipe.objects.create(
+            user=self.user, title='One', time_minutes=5, price=Decimal('1'),
+        )
+        r2 = Recipe.objects.create(
+            user=self.user, title='Two', time_minutes=5, price=Decimal('1'),
+        )
+        r2.tags.add(Tag.objects.create(user=self.user, name='Old'))
+        payload = [
+            {'id': r1.id, 'title': 'First'},
+            {'id': r2.id, 'tags': [{'name': 'New'}]},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        r1.refresh_from_db()
+        self.assertEqual(r1.title, 'First')
+        self.assertEqual(r1.time_minutes, 5)
+        self.assertEqual(
+            [t.name for t in r2.tags.all()],
+            ['New'],
+        )
+        self.assertEqual(res.data[1]['tags'][0]['name'], 'New')
+
+    def test_bulk_update_unknown_ids(self):
+        """test updates reject missing, foreign and duplicate ids"""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        mine = Recipe.objects.create(
+            user=self.user, title='Mine', time_minutes=5, price=Decimal('1'),
+        )
+        theirs = Recipe.objects.create(
+            user=other, title='Theirs', time_minutes=5, price=Decimal('1'),
+        )
+        payload = [
+            {'id': mine.id, 'title': 'Changed'},
+            {'id': theirs.id, 'title': 'Changed'},
+            {'title': 'No id'},
+            {'id': mine.id, 'title': 'Again'},
+        ]
+
+        res = self.client.patch(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(res.data[0], {})
+        for error in res.data[1:]:
+            self.assertIn('id', error)
+        mine.refresh_from_db()
+        self.assertEqual(mine.title, 'Mine')
+
+    def test_bulk_create_searchable(self):
+        """test bulk created recipes are indexed and listed"""
+        self.client.get(RECIPES_URL)
+        payload = [recipe_payload(0, title='Mushroom risotto')]
+
+        self.client.post(BULK_URL, payload, format='json')
+
+        res = self.client.get(RECIPES_URL, {'search': 'mushroom'})
+        self.assertEqual(len(res.data['results']), 1)
+        res = self.client.get(RECIPES_URL)
+        self.assertEqual(len(res.data['results']), 1)
@@ -0,0 +1,180 @@
+"""
+test for the per user response cache
+"""
+import tempfile
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import (TestCase, override_settings)
+from django.urls import reverse
+
+from rest_framework.test import APIClient
+
+from core.models import (Tag, Ingredient)
+from recipe.cache import (
+    API_CACHE_ALIAS,
+    _generation,
+    cache_stats,
+    reset_cache_stats,
+)
+from recipe.test.utils import create_recipe
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+INGREDIENTS_URL = reverse('recipe:ingredient-list')
+
+
+def detail_url(recipe_id):
+    """create and return a recipe detail url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class ResponseCacheTests(TestCase):
+    """test caching of list and retrieve responses"""
+
+    def setUp(self):
+        caches[API_CACHE_ALIAS].clear()
+        reset_cache_stats()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertCached(self, url, params=None, cached=True):
+        """request url and check whether the response came from cache"""
+        res = self.client.get(url, params or {})
+        self.assertEqual(res['X-Cache'], 'HIT' if cached else 'MISS')
+        return res
+
+    def test_list_and_retrieve_cached(self):
+        """test repeated reads are served without queries"""
+        recipe = create_recipe(self.user)
+        first = self.assertCached(RECIPES_URL, cached=False)
+        self.assertCached(detail_url(recipe.id), cached=False)
+
+        with self.assertNumQueries(0):
+            res = self.assertCached(RECIPES_URL)
+            self.assertCached(detail_url(recipe.id))
+
+        self.assertEqual(res.data, first.data)
+        self.assertEqual(cache_stats(), {'hits': 2, 'misses': 2})
+
+    def test_query_params_cached_separately(self):
+        """test different query parameters use different entries"""
+        self.assertCached(TAGS_URL, cached=False)
+        self.assertCached(TAGS_URL, {'assigned_only': 1}, cached=False)
+        self.assertCached(TAGS_URL, {'assigned_only': 1})
+
+    def test_cache_per_user(self):
+        """test users never see each other's cached responses"""
+        create_recipe(self.user)
+        self.assertCached(RECIPES_URL, cached=False)
+
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        self.client.force_authenticate(other)
+        res = self.assertCached(RECIPES_URL, cached=False)
+        self.assertEqual(res.data['results'], [])
+
+    def test_invalidated_on_recipe_changes(self):
+        """test recipe writes invalidate cached recipes"""
+        recipe = create_recipe(self.user)
+        self.assertCached(RECIPES_URL, cached=False)
+
+        recipe.title = 'Changed'
+        recipe.save()
+        res = self.assertCached(RECIPES_URL, cached=False)
+        self.assertEqual(res.data['results'][0]['title'], 'Changed')
+
+        recipe.delete()
+        res = self.assertCached(RECIPES_URL, cached=False)
+        self.assertEqual(res.data['results'], [])
+
+    def test_invalidated_on_relation_changes(self):
+        """test m2m changes and renames invalidate dependent lists"""
+        recipe = create_recipe(self.user)
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        self.assertCached(RECIPES_URL, cached=False)
+        self.assertCached(TAGS_URL, {'assigned_only': 1}, cached=False)
+        self.assertCached(INGREDIENTS_URL, cached=False)
+
+        recipe.tags.add(tag)
+        self.assertCached(RECIPES_URL, cached=False)
+        res = self.assertCached(TAGS_URL, {'assigned_only': 1}, cached=False)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertCached(INGREDIENTS_URL)
+
+        ingredient.name = 'Pepper'
+        ingredient.save()
+        self.assertCached(RECIPES_URL, cached=False)
+        self.assertCached(TAGS_URL, {'assigned_only': 1})
+        res = self.assertCached(INGREDIENTS_URL, cached=False)
+        self.assertEqual(res.data['results'][0]['name'], 'Pepper')
+
+    def test_invalidated_again_on_commit(self):
+        """test entries cached by readers before the commit are dropped"""
+        recipe = create_recipe(self.user)
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            recipe.title = 'changed'
+            recipe.save()
+            # a concurrent reader still sees the old row and caches it
+            stale = _generation(self.user.pk, 'recipe')
+
+        self.assertTrue(callbacks)
+        self.assertNotEqual(_generation(self.user.pk, 'recipe'), stale)
+
+    def test_other_users_writes_keep_cache(self):
+        """test invalidation is limited to the owner of the change"""
+        self.assertCached(RECIPES_URL, cached=False)
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        create_recipe(other)
+
+        self.assertCached(RECIPES_URL)
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        API_CACHE_ALIAS: {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': tempfile.mkdtemp(),
+        },
+    })
+    def test_file_backend(self):
+        """test the cache works with the file based backend"""
+        recipe = create_recipe(self.user)
+        self.assertCached(RECIPES_URL, cached=False)
+        self.assertCached(RECIPES_URL)
+
+        recipe.delete()
+        self.assertCached(RECIPES_URL, cached=False)
+
+    @override_settings(CACHES={
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        },
+        API_CACHE_ALIAS: {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'eviction-test',
+            'OPTIONS': {'MAX_ENTRIES': 4, 'CULL_FREQUENCY': 1},
+        },
+    })
+    def test_eviction_limit(self):
+        """test entries are evicted past the configured limit"""
+        for page_size in range(1, 8):
+            self.assertCached(
+                TAGS_URL,
+                {'page_size': page_size},
+                cached=False,
+            )
+
+        self.assertCached(TAGS_URL, {'page_size': 1}, cached=False)
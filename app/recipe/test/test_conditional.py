@@ -0,0 +1,129 @@
+"""
+test for conditional requests on recipes
+"""
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (Recipe, Tag)
+from recipe.test.utils import create_recipe
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+def detail_url(recipe_id):
+    """create and return a recipe detail url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class ConditionalRequestTests(TestCase):
+    """test ETag and Last-Modified handling"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = create_recipe(self.user)
+
+    def _etag(self, url):
+        """return the etag of a resource"""
+        res = self.client.get(url)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res['ETag']
+
+    def test_detail_not_modified(self):
+        """test a matching If-None-Match returns 304 without a body"""
+        url = detail_url(self.recipe.id)
+        res = self.client.get(url)
+        self.assertIn('Last-Modified', res)
+
+        res = self.client.get(url, HTTP_IF_NONE_MATCH=res['ETag'])
+
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(res.content, b'')
+
+    def test_detail_if_modified_since(self):
+        """test If-Modified-Since is honored on the detail view"""
+        url = detail_url(self.recipe.id)
+        future = http_date((timezone.now() + timedelta(days=1)).timestamp())
+        past = http_date((timezone.now() - timedelta(days=1)).timestamp())
+
+        res = self.client.get(url, HTTP_IF_MODIFIED_SINCE=future)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        res = self.client.get(url, HTTP_IF_MODIFIED_SINCE=past)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+
+    def test_etag_follows_relation_changes(self):
+        """test tag assignments and renames change the recipe etag"""
+        url = detail_url(self.recipe.id)
+        etags = [self._etag(url)]
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+
+        self.recipe.tags.add(tag)
+        etags.append(self._etag(url))
+        tag.name = 'Vegetarian'
+        tag.save()
+        etags.append(self._etag(url))
+
+        self.assertEqual(len(set(etags)), 3)
+
+    def test_list_etag(self):
+        """test the list etag changes with additions and deletions"""
+        etag = self._etag(RECIPES_URL)
+        res = self.client.get(RECIPES_URL, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        other = create_recipe(self.user)
+        self.assertNotEqual(self._etag(RECIPES_URL), etag)
+        other.delete()
+        self.assertEqual(self._etag(RECIPES_URL), etag)
+        self.recipe.delete()
+        self.assertNotEqual(self._etag(RECIPES_URL), etag)
+
+    def test_update_if_match(self):
+        """test updates require a current etag when If-Match is sent"""
+        url = detail_url(self.recipe.id)
+        etag = self._etag(url)
+
+        res = self.client.patch(url, {'title': 'First'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(res['ETag'], etag)
+        self.assertEqual(res['ETag'], self._etag(url))
+
+        res = self.client.patch(url, {'title': 'Second'}, HTTP_IF_MATCH=etag)
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.title, 'First')
+
+    def test_delete_if_match(self):
+        """test deletes with a stale etag are rejected"""
+        url = detail_url(self.recipe.id)
+
+        res = self.client.delete(url, HTTP_IF_MATCH='"stale"')
+
+        self.assertEqual(res.status_code, status.HTTP_412_PRECONDITION_FAILED)
+        self.assertTrue(Recipe.objects.filter(id=self.recipe.id).exists())
+
+    def test_other_user_recipe_not_found(self):
+        """test conditional headers do not leak other users' recipes"""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        recipe = create_recipe(other)
+
+        res = self.client.get(detail_url(recipe.id), HTTP_IF_NONE_MATCH='*')
+
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
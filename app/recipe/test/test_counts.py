@@ -0,0 +1,236 @@
+"""
+test for the denormalized recipe counts of tags and ingredients
+"""
+import io
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (Ingredient, Recipe, Tag)
+from recipe.test.utils import create_recipe
+
+
+TAGS_URL = reverse('recipe:tag-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+class RecipeCountTests(TestCase):
+    """test recipe counts follow link changes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.tag = Tag.objects.create(user=self.user, name='Dinner')
+        self.other = Tag.objects.create(user=self.user, name='Lunch')
+
+    def assertCounts(self, tag_count, other_count):
+        """assert the stored counts of both tags"""
+        self.tag.refresh_from_db()
+        self.other.refresh_from_db()
+        self.assertEqual(
+            (self.tag.recipe_count, self.other.recipe_count),
+            (tag_count, other_count),
+        )
+
+    def test_forward_changes(self):
+        """test adding, removing and clearing tags of a recipe"""
+        recipe = create_recipe(self.user)
+        recipe.tags.add(self.tag, self.other)
+        # links that exist already are not counted twice
+        recipe.tags.add(self.tag)
+        self.assertCounts(1, 1)
+
+        recipe.tags.remove(self.tag)
+        # removing a missing link changes nothing
+        recipe.tags.remove(self.tag)
+        self.assertCounts(0, 1)
+
+        recipe.tags.set([self.tag])
+        self.assertCounts(1, 0)
+
+        recipe.tags.clear()
+        self.assertCounts(0, 0)
+
+    def test_reverse_changes(self):
+        """test adding, removing and clearing recipes of a tag"""
+        recipes = [create_recipe(self.user) for _ in range(3)]
+        self.tag.recipe_set.add(*recipes)
+        self.assertCounts(3, 0)
+
+        self.tag.recipe_set.remove(recipes[0])
+        self.tag.recipe_set.remove(recipes[0])
+        self.assertCounts(2, 0)
+
+        self.tag.recipe_set.clear()
+        self.assertCounts(0, 0)
+
+    def test_recipe_deleted(self):
+        """test deleting recipes uncounts their links"""
+        ingredient = Ingredient.objects.create(user=self.user, name='Salt')
+        for _ in range(2):
+            recipe = create_recipe(self.user)
+            recipe.tags.add(self.tag)
+            recipe.ingredients.add(ingredient)
+
+        recipe.delete()
+        self.assertCounts(1, 0)
+
+        Recipe.objects.all().delete()
+        self.assertCounts(0, 0)
+        ingredient.refresh_from_db()
+        self.assertEqual(ingredient.recipe_count, 0)
+
+    def test_bulk_create_counted(self):
+        """test recipes written in bulk are counted"""
+        client = APIClient()
+        client.force_authenticate(self.user)
+        payload = [
+            {
+                'title': f'Recipe {i}',
+                'time_minutes': 10,
+                'price': '5.00',
+                'tags': [{'name': 'Dinner'}],
+                'ingredients': [{'name': 'Salt'}],
+            }
+            for i in range(3)
+        ]
+
+        res = client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertCounts(3, 0)
+        self.assertEqual(Ingredient.objects.get(name='Salt').recipe_count, 3)
+
+    def test_reconcile_command(self):
+        """test the command reports and repairs drifted counts"""
+        recipe = create_recipe(self.user)
+        recipe.tags.add(self.tag)
+        Tag.objects.filter(pk=self.tag.pk).update(recipe_count=7)
+        Tag.objects.filter(pk=self.other.pk).update(recipe_count=2)
+
+        out = io.StringIO()
+        call_command('reconcile_recipe_counts', '--dry-run', stdout=out)
+        self.assertIn('Found 2 wrong counts in 2 tags', out.getvalue())
+        self.assertCounts(7, 2)
+
+        out = io.StringIO()
+        call_command('reconcile_recipe_counts', '--batch-size', '1',
+                     stdout=out)
+        self.assertIn('Repaired 2 wrong counts in 2 tags', out.getvalue())
+        self.assertIn('Repaired 0 wrong counts in 0 ingredients',
+                      out.getvalue())
+        self.assertCounts(1, 0)
+
+
+class RecipeCountOrderingTests(TestCase):
+    """test ordering tags by recipe count"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Rare', 'Common', 'Unused')
+        ]
+        for count, tag in zip((1, 3), self.tags):
+            for _ in range(count):
+                create_recipe(self.user).tags.add(tag)
+
+    def test_ordering(self):
+        """test tags are ordered by usage in either direction"""
+        res = self.client.get(TAGS_URL, {'ordering': '-recipe_count'})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [tag['name'] for tag in res.data['results']],
+            ['Common', 'Rare', 'Unused'],
+        )
+
+        res = self.client.get(TAGS_URL, {'ordering': 'recipe_count'})
+        self.assertEqual(
+            [tag['name'] for tag in res.data['results']],
+            ['Unused', 'Rare', 'Common'],
+        )
+
+    def test_ordering_pages(self):
+        """test the cursor follows the count ordering across pages"""
+        names = []
+        url, params = TAGS_URL, {'ordering': '-recipe_count', 'page_size': 1}
+        while url:
+            res = self.client.get(url, params)
+            names += [tag['name'] for tag in res.data['results']]
+            url, params = res.data['next'], None
+
+        self.assertEqual(names, ['Common', 'Rare', 'Unused'])
+
+    def test_ordering_pages_tied_counts(self):
+        """test pages inside tied counts are keyset ranges, not offsets"""
+        tags = self.tags + [
+            Tag.objects.create(user=self.user, name=f'Tag {i}')
+            for i in range(20)
+        ]
+        Tag.objects.filter(pk__in=[tag.pk for tag in tags[3::2]]).update(
+            recipe_count=1,
+        )
+        expected = [
+            tag.name for tag in Tag.objects.filter(user=self.user).order_by(
+                '-recipe_count',
+                '-id',
+            )
+        ]
+        names = []
+        url, params = TAGS_URL, {'ordering': '-recipe_count', 'page_size': 3}
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                res = self.client.get(url, params)
+                names += [tag['name'] for tag in res.data['results']]
+                url, params = res.data['next'], None
+            last_page = len(res.data['results'])
+            previous_names = []
+            url = res.data['previous']
+            while url:
+                res = self.client.get(url)
+                previous_names[:0] = [
+                    tag['name'] for tag in res.data['results']
+                ]
+                url = res.data['previous']
+
+        self.assertEqual(names, expected)
+        self.assertEqual(previous_names, expected[:-last_page])
+        tag_queries = [q['sql'] for q in queries.captured_queries
+                       if 'core_tag' in q['sql']]
+        self.assertTrue(tag_queries)
+        for sql in tag_queries:
+            self.assertNotIn('OFFSET', sql.upper())
+
+    def test_ordering_single_query(self):
+        """test ordering by count does not count the m2m table"""
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.get(
+                TAGS_URL,
+                {'ordering': '-recipe_count', 'fields': 'name'},
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        tag_queries = [q['sql'] for q in queries.captured_queries
+                       if 'core_tag' in q['sql']]
+        self.assertEqual(len(tag_queries), 1)
+        self.assertNotIn('core_recipe_tags', tag_queries[0])
+
+    def test_invalid_ordering(self):
+        """test unknown ordering fields are rejected"""
+        res = self.client.get(TAGS_URL, {'ordering': 'user'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,123 @@
+"""
+test the fast list serialization matches the serializers
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (Ingredient, Recipe, Tag)
+from recipe.cache import API_CACHE_ALIAS
+from recipe.views import RecipeViewSet
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class FastListSerializationTests(TestCase):
+    """differential test of the fast list path against the serializers"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        Recipe.objects.create(
+            user=other,
+            title='Other',
+            time_minutes=1,
+            price=Decimal('1.00'),
+        )
+        tags = [
+            Tag.objects.create(user=self.user, name=name)
+            for name in ('Vegan', 'Dessert', 'Über "quick"')
+        ]
+        ingredients = [
+            Ingredient.objects.create(user=self.user, name=name)
+            for name in ('Salt', 'Sugar', 'Crème fraîche')
+        ]
+        prices = ['5', '12.5', '0.99', '999.99', '0']
+        for i, price in enumerate(prices * 3):
+            recipe = Recipe.objects.create(
+                user=self.user,
+                title=f'Recipe {i} ☃ "quoted" <b>',
+                time_minutes=i * 7,
+                price=Decimal(price),
+                link='' if i % 2 else f'https://example.com/{i}',
+                description='soup with salt' if i % 3 else 'cake',
+            )
+            recipe.tags.add(*tags[i % 3:])
+            recipe.ingredients.add(*reversed(ingredients[:i % 4]))
+            if i % 4 == 1:
+                recipe.image = f'uploads/recipe/ab/ab{i:062d}.jpg'
+                recipe.image_status = Recipe.ImageStatus.READY
+                recipe.save()
+            elif i % 4 == 2:
+                recipe.image = f'uploads/recipe/cd/cd{i:062d}.jpg'
+                recipe.image_status = Recipe.ImageStatus.PENDING
+                recipe.save()
+
+    def _get(self, url, params=None):
+        """return the response content of the slow and the fast path"""
+        contents = []
+        for fast in (False, True):
+            caches[API_CACHE_ALIAS].clear()
+            with patch.object(RecipeViewSet, 'fast_list_serialization', fast):
+                res = self.client.get(url, params)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            contents.append(res.content)
+        return contents
+
+    def assertSameOutput(self, url, params=None):
+        """assert both paths render byte identical responses"""
+        slow, fast = self._get(url, params)
+        self.assertEqual(fast, slow)
+        return slow
+
+    def test_list_identical(self):
+        """test the default list renders identically"""
+        self.assertSameOutput(RECIPES_URL, {'count': '1'})
+
+    def test_pages_identical(self):
+        """test every page and cursor link renders identically"""
+        url, params = RECIPES_URL, {'page_size': 4}
+        pages = 0
+        while url:
+            slow, fast = self._get(url, params)
+            self.assertEqual(fast, slow)
+            url, params = self.client.get(url, params).data['next'], None
+            pages += 1
+        self.assertEqual(pages, 4)
+
+    def test_filtered_identical(self):
+        """test filtered and searched lists render identically"""
+        tag = Tag.objects.get(name='Vegan')
+        ingredient = Ingredient.objects.get(name='Salt')
+        for params in (
+            {'tags': str(tag.id)},
+            {'ingredients': str(ingredient.id), 'match': 'all'},
+            {'search': 'soup salt'},
+            {'search': 'nothing matches'},
+            {'fields': 'id,price,image_variants'},
+            {'omit': 'tags,title'},
+        ):
+            self.assertSameOutput(RECIPES_URL, params)
+
+    def test_fast_path_queries(self):
+        """test the fast path uses a fixed number of queries"""
+        caches[API_CACHE_ALIAS].clear()
+        # validators: 1, page: 1, tags: 1, ingredients: 1
+        with self.assertNumQueries(4):
+            self.client.get(RECIPES_URL)
@@ -0,0 +1,264 @@
+"""
+test for the background image processing
+"""
+import io
+import os
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.test import (TestCase, override_settings)
+from django.urls import reverse
+
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Recipe
+from recipe.images import (
+    delete_image_files,
+    process_recipe_image,
+    render_image,
+    variant_formats,
+    variant_key,
+    variant_name,
+    VARIANTS,
+)
+
+
+def image_upload_url(recipe_id):
+    """create and return an image upload URL"""
+    return reverse('recipe:recipe-upload-image', args=[recipe_id])
+
+
+def detail_url(recipe_id):
+    """create and return a recipe detail url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+def image_bytes(size=(800, 400), fmt='JPEG', orientation=None, mode='RGB'):
+    """return the bytes of a sample image"""
+    image = Image.new(mode, size)
+    buffer = io.BytesIO()
+    if orientation:
+        exif = Image.Exif()
+        exif[0x0112] = orientation
+        image.save(buffer, format=fmt, exif=exif)
+    else:
+        image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+@override_settings(IMAGE_PROCESSING={'BACKEND': 'sync', 'WORKERS': 1})
+class ImageProcessingTests(TestCase):
+    """test uploaded images are processed after the upload"""
+
+    def setUp(self):
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='sample recipe',
+            time_minutes=10,
+            price=Decimal('5.00'),
+        )
+
+    def tearDown(self):
+        if self.recipe.image:
+            self.recipe.refresh_from_db()
+            delete_image_files(self.recipe.image.name)
+
+    def _upload(self, data, name='upload.jpg'):
+        """upload an image and run the processing job"""
+        upload = ContentFile(data, name=name)
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(
+                image_upload_url(self.recipe.id),
+                {'image': upload},
+                format='multipart',
+            )
+        self.recipe.refresh_from_db()
+        return res
+
+    def _variant_path(self, variant, ext):
+        """return the path of a variant of the recipe image"""
+        storage = self.recipe.image.storage
+        key = variant_key(self.recipe.image.name)
+        return storage.path(variant_name(key, variant, ext))
+
+    def test_upload_processed(self):
+        """test the image is normalized and variants are written"""
+        res = self._upload(image_bytes(size=(2000, 1000), orientation=6))
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.recipe.image_status, 'ready')
+        self.assertEqual(
+            self.recipe.image_key,
+            variant_key(self.recipe.image.name),
+        )
+        with Image.open(self.recipe.image.path) as image:
+            # rotated according to the exif orientation
+            self.assertEqual(image.size, (1000, 2000))
+            self.assertNotIn(0x0112, image.getexif())
+        for variant, edge in VARIANTS.items():
+            for ext in variant_formats(self.recipe.image.name):
+                with Image.open(self._variant_path(variant, ext)) as image:
+                    self.assertEqual(image.size[1], edge)
+
+    def test_variant_urls(self):
+        """test serializers expose a url per variant and format"""
+        res = self.client.get(detail_url(self.recipe.id))
+        self.assertIsNone(res.data['image_variants'])
+
+        self._upload(image_bytes())
+
+        res = self.client.get(detail_url(self.recipe.id))
+        variants = res.data['image_variants']
+        self.assertEqual(set(variants), set(VARIANTS))
+        url = variants['thumb'][variant_formats(self.recipe.image.name)[0]]
+        self.assertTrue(url.startswith('http://testserver/'))
+
+    def test_variant_served_immutable(self):
+        """test variants are served with immutable cache headers"""
+        self._upload(image_bytes())
+        ext = variant_formats(self.recipe.image.name)[0]
+        url = reverse('recipe:image-variant', kwargs={
+            'key': variant_key(self.recipe.image.name),
+            'variant': 'card',
+            'ext': ext,
+        })
+
+        res = self.client.get(url)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn('immutable', res['Cache-Control'])
+        self.assertIn('max-age=31536000', res['Cache-Control'])
+        self.assertTrue(res['Content-Type'].startswith('image/'))
+        res.close()
+
+    def test_missing_variant_rendered(self):
+        """test a variant missing from the cache is rendered on request"""
+        self._upload(image_bytes())
+        ext = variant_formats(self.recipe.image.name)[0]
+        path = self._variant_path('thumb', ext)
+        os.remove(path)
+
+        res = self.client.get(reverse('recipe:image-variant', kwargs={
+            'key': variant_key(self.recipe.image.name),
+            'variant': 'thumb',
+            'ext': ext,
+        }))
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        res.close()
+        self.assertTrue(os.path.exists(path))
+
+    def test_unknown_variant_not_found(self):
+        """test unknown images and variants return 404"""
+        self._upload(image_bytes())
+        key = variant_key(self.recipe.image.name)
+        ext = variant_formats(self.recipe.image.name)[0]
+
+        for kwargs in (
+            {'key': 'unknown', 'variant': 'thumb', 'ext': ext},
+            {'key': key[:8], 'variant': 'thumb', 'ext': ext},
+            {'key': key, 'variant': 'huge', 'ext': ext},
+        ):
+            url = reverse('recipe:image-variant', kwargs=kwargs)
+            res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_reupload_regenerates_variants(self):
+        """test a new upload gets new variants and drops the old ones"""
+        self._upload(image_bytes())
+        ext = variant_formats(self.recipe.image.name)[0]
+        old_path = self._variant_path('thumb', ext)
+
+        self._upload(image_bytes(size=(300, 300)))
+
+        self.assertFalse(os.path.exists(old_path))
+        with Image.open(self._variant_path('thumb', ext)) as image:
+            self.assertEqual(image.size, (150, 150))
+
+    def test_upload_replaces_raw_file(self):
+        """test the raw upload is removed once processed"""
+        with patch('recipe.views.schedule_image_processing'):
+            self.client.post(
+                image_upload_url(self.recipe.id),
+                {'image': ContentFile(image_bytes(), name='raw.jpg')},
+                format='multipart',
+            )
+        self.recipe.refresh_from_db()
+        raw_path = self.recipe.image.path
+
+        process_recipe_image(self.recipe.id, self.recipe.image.name)
+
+        self.recipe.refresh_from_db()
+        self.assertFalse(os.path.exists(raw_path))
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+
+    def test_corrupt_image_failed(self):
+        """test an image that can not be decoded is marked failed"""
+        data = image_bytes()
+        with self.assertLogs('recipe.images', 'ERROR'):
+            res = self._upload(data[:len(data) // 2])
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(self.recipe.image_status, 'failed')
+
+    def test_stale_job_skipped(self):
+        """test a job for a replaced image leaves the recipe alone"""
+        self._upload(image_bytes())
+        name = self.recipe.image.name
+
+        process_recipe_image(self.recipe.id, 'uploads/recipe/old.jpg')
+
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image.name, name)
+        self.assertEqual(self.recipe.image_status, 'ready')
+
+    def test_identical_images_shared(self):
+        """test recipes with the same image share files and variants"""
+        other = Recipe.objects.create(
+            user=self.user,
+            title='other recipe',
+            time_minutes=10,
+            price=Decimal('5.00'),
+        )
+        data = image_bytes()
+        self._upload(data)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(
+                image_upload_url(other.id),
+                {'image': ContentFile(data, name='copy.jpg')},
+                format='multipart',
+            )
+        other.refresh_from_db()
+        self.assertEqual(other.image.name, self.recipe.image.name)
+        ext = variant_formats(self.recipe.image.name)[0]
+        variant_path = self._variant_path('thumb', ext)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+
+        self.assertTrue(os.path.exists(self.recipe.image.path))
+        self.assertTrue(os.path.exists(variant_path))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+
+        self.assertFalse(os.path.exists(self.recipe.image.path))
+        self.assertFalse(os.path.exists(variant_path))
+        self.recipe.image = None
+
+    def test_transparent_image_kept_png(self):
+        """test images with transparency are stored as png"""
+        ext, _, variants = render_image(image_bytes(fmt='PNG', mode='RGBA'))
+
+        self.assertEqual(ext, 'png')
+        self.assertEqual({variant for variant, _ in variants}, set(VARIANTS))
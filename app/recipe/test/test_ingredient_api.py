@@ -2,6 +2,8 @@
 test for the ingredient models
 """
 
+from decimal import Decimal
+
 from django.test import TestCase
 from django.urls import reverse
 from django.contrib.auth import get_user_model
@@ -9,7 +11,7 @@ from django.contrib.auth import get_user_model
 from rest_framework import status
 from rest_framework.test import APIClient
 
-from core.models import Ingredient
+from core.models import (Ingredient, Recipe)
 
 from recipe.serializers import IngredientSerializer
 
@@ -57,7 +59,7 @@ class PrivateIngredientApiTests(TestCase):
         serializer = IngredientSerializer(ingredients, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
 
     def test_ingredients_limited_to_user(self):
@@ -71,9 +73,9 @@ class PrivateIngredientApiTests(TestCase):
 
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(res.data), 1)
-        self.assertEqual(res.data[0]['name'], ingredient.name)
-        self.assertEqual(res.data[0]['id'], ingredient.id)
+        self.assertEqual(len(res.data['results']), 1)
+        self.assertEqual(res.data['results'][0]['name'], ingredient.name)
+        self.assertEqual(res.data['results'][0]['id'], ingredient.id)
 
 
 
@@ -99,5 +101,44 @@ class PrivateIngredientApiTests(TestCase):
       #  ingredients=Ingredient.objects.filter(user=self.user)
         self.assertFalse(Ingredient.objects.filter(id=ingredient.id).exists())
 
-    
-
+    def test_filter_ingredients_assigned_to_recipes(self):
+        """test listing ingredients assigned to recipes"""
+        in1 = Ingredient.objects.create(user=self.user, name='Apples')
+        in2 = Ingredient.objects.create(user=self.user, name='Turkey')
+        recipe = Recipe.objects.create(
+            title='Apple Crumble',
+            time_minutes=5,
+            price=Decimal('4.50'),
+            user=self.user,
+        )
+        recipe.ingredients.add(in1)
+
+        res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
+
+        s1 = IngredientSerializer(in1)
+        s2 = IngredientSerializer(in2)
+        self.assertIn(s1.data, res.data['results'])
+        self.assertNotIn(s2.data, res.data['results'])
+
+    def test_filtered_ingredients_unique(self):
+        """test filtered ingredients are returned once"""
+        ing = Ingredient.objects.create(user=self.user, name='Eggs')
+        Ingredient.objects.create(user=self.user, name='Lentils')
+        for title in ('Eggs Benedict', 'Herb Eggs'):
+            recipe = Recipe.objects.create(
+                title=title,
+                time_minutes=60,
+                price=Decimal('7.00'),
+                user=self.user,
+            )
+            recipe.ingredients.add(ing)
+
+        res = self.client.get(INGREDIENT_URL, {'assigned_only': 1})
+
+        self.assertEqual(len(res.data['results']), 1)
+
+    def test_assigned_only_invalid(self):
+        """test an invalid assigned_only value returns a bad request"""
+        res = self.client.get(INGREDIENT_URL, {'assigned_only': 'yes'})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
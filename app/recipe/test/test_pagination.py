@@ -0,0 +1,96 @@
+"""
+test for cursor pagination of the recipe api
+"""
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import Tag
+from recipe.test.utils import create_recipe
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+class PaginationTests(TestCase):
+    """test paginated list endpoints"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _collect(self, url):
+        """follow next links and return all results and page query counts"""
+        results, query_counts = [], []
+        while url:
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.get(url)
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            query_counts.append(len(ctx.captured_queries))
+            results.extend(res.data['results'])
+            url = res.data['next']
+        return results, query_counts
+
+    def test_recipes_paginated_by_id(self):
+        """test walking all pages returns every recipe once, newest first"""
+        recipes = [create_recipe(self.user, title=f'r{i}') for i in range(7)]
+
+        results, query_counts = self._collect(f'{RECIPES_URL}?page_size=3')
+
+        self.assertEqual(
+            [r['id'] for r in results],
+            [r.id for r in reversed(recipes)],
+        )
+        self.assertEqual(len(query_counts), 3)
+        self.assertEqual(query_counts[0], query_counts[1])
+
+    def test_count_is_optional(self):
+        """test the total is only returned when requested"""
+        create_recipe(self.user)
+        create_recipe(self.user)
+
+        res = self.client.get(RECIPES_URL)
+        self.assertNotIn('count', res.data)
+
+        res = self.client.get(RECIPES_URL, {'count': 'true'})
+        self.assertEqual(res.data['count'], 2)
+        self.assertFalse(res.data['count_is_estimate'])
+
+    def test_count_is_cached(self):
+        """test repeated count requests do not run COUNT again"""
+        create_recipe(self.user)
+        self.client.get(RECIPES_URL, {'count': 'true'})
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL, {'count': 'true'})
+
+        self.assertEqual(res.data['count'], 1)
+        self.assertFalse(any(
+            'COUNT(' in q['sql'] for q in ctx.captured_queries
+        ))
+
+    def test_tags_paginated_by_name(self):
+        """test tags are paginated by name without gaps"""
+        names = ['a', 'b', 'ba', 'bb', 'c', 'd']
+        for name in names:
+            Tag.objects.create(user=self.user, name=name)
+
+        results, _ = self._collect(f'{TAGS_URL}?page_size=2')
+
+        self.assertEqual(
+            [t['name'] for t in results],
+            sorted(names, reverse=True),
+        )
+        self.assertEqual(len({t['id'] for t in results}), len(names))
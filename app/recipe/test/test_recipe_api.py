@@ -4,6 +4,8 @@ recipe api
 
 from decimal import Decimal
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.db import connection
 from django.urls import reverse
 from django.contrib.auth import get_user_model
 import os
@@ -23,6 +25,7 @@ from recipe.serializers import (
     RecipeDetailSerializers,
     Ingredient,
 )
+from recipe.test.utils import create_recipe
 
 RECIPES_URL = reverse('recipe:recipe-list')
 
@@ -35,21 +38,6 @@ def image_upload_url(recipe_id):
     """create and return an image upload URL"""
     return reverse('recipe:recipe-upload-image', args=[recipe_id])
 
-def create_recipe(user, **params):
-    """create and reutrn sample api"""
-    defaults = {
-        'title':'sample recipe title',
-        'time_minutes':22,
-        'price':Decimal('5.25'),
-        'description':'sample description',
-        'link':'http://example.com/recipe.pdf'
-
-    }
-    defaults.update(params)
-    recipe = Recipe.objects.create(user=user, **defaults)
-    return recipe
-
-
 
 def create_user(**params):
     """create and return a new user"""
@@ -90,7 +78,7 @@ class PrivateRecipeApiTest(TestCase):
         serializer = RecipeSerializers(recipes, many=True)
 
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
 
     def test_recipe_list_limited_to_user(self):
         """test lsit of recipe is limmited tp authenticated user"""
@@ -103,8 +91,97 @@ class PrivateRecipeApiTest(TestCase):
         recipes = Recipe.objects.filter(user=self.user)
         serializer = RecipeSerializers(recipes, many=True)
         self.assertEqual(res.status_code, status.HTTP_200_OK)
-        self.assertEqual(res.data, serializer.data)
+        self.assertEqual(res.data['results'], serializer.data)
+
+
+    def _count_list_queries(self):
+        """return the number of queries used to list recipes"""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(RECIPES_URL)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return len(ctx.captured_queries)
+
+    def _create_recipe_with_relations(self, index):
+        """create a recipe with a tag and an ingredient"""
+        recipe = create_recipe(user=self.user, title=f'Recipe {index}')
+        recipe.tags.add(
+            Tag.objects.create(user=self.user, name=f'Tag {index}')
+        )
+        recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name=f'Ing {index}')
+        )
+        return recipe
+
+    def test_list_query_count_does_not_grow(self):
+        """test listing recipes uses a fixed number of queries"""
+        self._create_recipe_with_relations(0)
+        baseline = self._count_list_queries()
+
+        for index in range(1, 10):
+            self._create_recipe_with_relations(index)
+
+        self.assertEqual(self._count_list_queries(), baseline)
 
+    def test_detail_and_write_query_counts(self):
+        """test detail and write responses do not depend on relations"""
+        recipe = self._create_recipe_with_relations(0)
+        url = detail_url(recipe.id)
+
+        with CaptureQueriesContext(connection) as ctx:
+            self.client.get(url)
+        detail_queries = len(ctx.captured_queries)
+        for index in range(1, 10):
+            recipe.tags.add(
+                Tag.objects.create(user=self.user, name=f'Extra {index}')
+            )
+        with self.assertNumQueries(detail_queries):
+            res = self.client.get(url)
+        self.assertEqual(len(res.data['tags']), 10)
+
+        def write_queries(method, url, count, prefix, **fields):
+            """return the queries of a write with new tags and ingredients"""
+            names = [{'name': f'{prefix} {i}'} for i in range(count)]
+            payload = {**fields, 'tags': names, 'ingredients': names}
+            with CaptureQueriesContext(connection) as ctx:
+                res = method(url, payload, format='json')
+            self.assertIn(
+                res.status_code,
+                (status.HTTP_200_OK, status.HTTP_201_CREATED),
+            )
+            self.assertEqual(len(res.data['tags']), count)
+            self.assertEqual(len(res.data['ingredients']), count)
+            return len(ctx.captured_queries)
+
+        fields = {
+            'title': 'Written',
+            'time_minutes': 5,
+            'price': Decimal('2.00'),
+        }
+        self.assertEqual(
+            write_queries(self.client.post, RECIPES_URL, 1, 'One', **fields),
+            write_queries(self.client.post, RECIPES_URL, 10, 'Ten', **fields),
+        )
+        self.assertEqual(
+            write_queries(self.client.patch, url, 1, 'Patch one'),
+            write_queries(self.client.patch, url, 10, 'Patch ten'),
+        )
+
+    def test_create_saves_recipe_once(self):
+        """test creating a recipe does not run an update afterwards"""
+        payload = {
+            'title': 'Sample recipe',
+            'time_minutes': 10,
+            'price': Decimal('2.00'),
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post(RECIPES_URL, payload)
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        updates = [
+            q for q in ctx.captured_queries
+            if q['sql'].startswith('UPDATE "core_recipe" ')
+        ]
+        self.assertEqual(updates, [])
 
     def test_get_recipe_detail(self):
         """Test get recipe detail view"""
@@ -415,6 +492,157 @@ class PrivateRecipeApiTest(TestCase):
         recipe.ingredients.clear()  # Clear all ingredients from the recipe
         self.assertEqual(recipe.ingredients.count(), 0)
 
+    def _count_create_queries(self, size):
+        """return the queries used to create a recipe with relations"""
+        Tag.objects.create(user=self.user, name=f'Existing {size}')
+        payload = {
+            'title': 'Bulk recipe',
+            'time_minutes': 10,
+            'price': Decimal('2.00'),
+            'tags': [{'name': f'Existing {size}'}] + [
+                {'name': f'Tag {size}-{i}'} for i in range(size)
+            ],
+            'ingredients': [
+                {'name': f'Ingredient {size}-{i}'} for i in range(size)
+            ],
+        }
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.post(RECIPES_URL, payload, format='json')
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(res.data['tags']), size + 1)
+        return len(ctx.captured_queries)
+
+    def test_create_query_count_does_not_grow(self):
+        """test tag and ingredient resolution is set based"""
+        self.assertEqual(
+            self._count_create_queries(2),
+            self._count_create_queries(30),
+        )
+
+    def test_update_query_count_does_not_grow(self):
+        """test updating relations is set based"""
+        counts = []
+        for size in (2, 30):
+            recipe = create_recipe(user=self.user)
+            Ingredient.objects.create(user=self.user, name=f'Old {size}')
+            payload = {
+                'tags': [{'name': f'Tag {size}-{i}'} for i in range(size)],
+                'ingredients': [{'name': f'Old {size}'}] + [
+                    {'name': f'New {size}-{i}'} for i in range(size)
+                ],
+            }
+            with CaptureQueriesContext(connection) as ctx:
+                res = self.client.patch(
+                    detail_url(recipe.id),
+                    payload,
+                    format='json',
+                )
+            self.assertEqual(res.status_code, status.HTTP_200_OK)
+            self.assertEqual(recipe.ingredients.count(), size + 1)
+            counts.append(len(ctx.captured_queries))
+
+        self.assertEqual(counts[0], counts[1])
+
+    def test_partial_update_keeps_tags(self):
+        """test updating other fields leaves tags untouched"""
+        tag = Tag.objects.create(user=self.user, name='Breakfast')
+        recipe = create_recipe(user=self.user)
+        recipe.tags.add(tag)
+
+        payload = {'title': 'New title'}
+        res = self.client.patch(detail_url(recipe.id), payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertIn(tag, recipe.tags.all())
+
+    def test_duplicate_names_in_payload(self):
+        """test repeated names resolve to a single object"""
+        payload = {
+            'title': 'Soup',
+            'time_minutes': 10,
+            'price': Decimal('2.00'),
+            'ingredients': [{'name': 'Salt'}, {'name': 'Salt'}],
+        }
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            Ingredient.objects.filter(user=self.user, name='Salt').count(),
+            1,
+        )
+
+    def test_filter_by_tags(self):
+        """test filtering recipes matching any of the tags"""
+        r1 = create_recipe(user=self.user, title='Thai Vegetable Curry')
+        r2 = create_recipe(user=self.user, title='Aubergine with Tahini')
+        r3 = create_recipe(user=self.user, title='Fish and chips')
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Vegetarian')
+        r1.tags.add(tag1)
+        r2.tags.add(tag1, tag2)
+
+        res = self.client.get(RECIPES_URL, {'tags': f'{tag1.id},{tag2.id}'})
+
+        ids = [r['id'] for r in res.data['results']]
+        self.assertEqual(ids, [r2.id, r1.id])
+        self.assertNotIn(r3.id, ids)
+
+    def test_filter_by_tags_match_all(self):
+        """test filtering recipes matching all of the tags"""
+        r1 = create_recipe(user=self.user, title='Thai Vegetable Curry')
+        r2 = create_recipe(user=self.user, title='Aubergine with Tahini')
+        tag1 = Tag.objects.create(user=self.user, name='Vegan')
+        tag2 = Tag.objects.create(user=self.user, name='Vegetarian')
+        r1.tags.add(tag1)
+        r2.tags.add(tag1, tag2)
+
+        res = self.client.get(
+            RECIPES_URL,
+            {'tags': f'{tag1.id},{tag2.id}', 'match': 'all'},
+        )
+
+        self.assertEqual([r['id'] for r in res.data['results']], [r2.id])
+
+    def test_filter_by_ingredients(self):
+        """test filtering recipes by ingredients"""
+        r1 = create_recipe(user=self.user, title='Posh Beans on Toast')
+        r2 = create_recipe(user=self.user, title='Chicken Cacciatore')
+        r3 = create_recipe(user=self.user, title='Red Lentil Daal')
+        in1 = Ingredient.objects.create(user=self.user, name='Feta Cheese')
+        in2 = Ingredient.objects.create(user=self.user, name='Chicken')
+        r1.ingredients.add(in1)
+        r2.ingredients.add(in2)
+        r3.ingredients.add(in1, in2)
+
+        res = self.client.get(RECIPES_URL, {'ingredients': f'{in1.id}'})
+
+        self.assertEqual(
+            [r['id'] for r in res.data['results']],
+            [r3.id, r1.id],
+        )
+
+    def test_filter_uses_exists(self):
+        """test relation filters compile to EXISTS, not DISTINCT joins"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        create_recipe(user=self.user).tags.add(tag)
+
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(
+                RECIPES_URL,
+                {'tags': f'{tag.id}', 'ingredients': '1,2'},
+            )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        sql = ctx.captured_queries[0]['sql']
+        self.assertIn('EXISTS', sql)
+        self.assertNotIn('DISTINCT', sql)
+
+    def test_filter_invalid_params(self):
+        """test invalid filter values return a bad request"""
+        for params in ({'tags': 'a,b'}, {'match': 'some'}):
+            res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
 
 class ImageUploadTest(TestCase):
     """Test for the image upload API"""
@@ -442,8 +670,9 @@ class ImageUploadTest(TestCase):
             res = self.client.post(url, payload, format='multipart')
 
         self.recipe.refresh_from_db()
-        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
         self.assertIn('image', res.data)
+        self.assertEqual(res.data['image_status'], 'pending')
         self.assertTrue(os.path.exists(self.recipe.image.path))
 
 
@@ -0,0 +1,150 @@
+"""
+test for full text recipe search
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (Tag, Ingredient)
+from recipe.test.utils import create_recipe
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+
+
+class RecipeSearchTests(TestCase):
+    """test searching recipes"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _search(self, text, **params):
+        """return ids of recipes matching the search text"""
+        res = self.client.get(RECIPES_URL, {'search': text, **params})
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [r['id'] for r in res.data['results']]
+
+    def test_search_fields(self):
+        """test title, description, tags and ingredients are searched"""
+        by_title = create_recipe(self.user, title='Lemon cake')
+        by_description = create_recipe(
+            self.user,
+            description='A cake with lemon zest',
+        )
+        by_tag = create_recipe(self.user)
+        by_tag.tags.add(Tag.objects.create(user=self.user, name='Lemon'))
+        by_ingredient = create_recipe(self.user)
+        by_ingredient.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Lemons'),
+        )
+        create_recipe(self.user, title='Beef stew')
+
+        ids = self._search('lemon')
+
+        self.assertCountEqual(
+            ids,
+            [by_title.id, by_description.id, by_tag.id, by_ingredient.id],
+        )
+
+    def test_search_ranks_title_first(self):
+        """test title matches rank above description matches"""
+        in_description = create_recipe(
+            self.user,
+            title='Weekday dinner',
+            description='Slow cooked curry with rice',
+        )
+        in_title = create_recipe(self.user, title='Green curry')
+
+        self.assertEqual(
+            self._search('curry'),
+            [in_title.id, in_description.id],
+        )
+
+    def test_search_limited_to_user(self):
+        """test search only returns the user's recipes"""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        create_recipe(other, title='Pumpkin soup')
+        mine = create_recipe(self.user, title='Pumpkin pie')
+
+        self.assertEqual(self._search('pumpkin'), [mine.id])
+
+    def test_search_follows_changes(self):
+        """test the index follows recipe, tag and relation changes"""
+        recipe = create_recipe(self.user, title='Pasta')
+        tag = Tag.objects.create(user=self.user, name='Quick')
+        recipe.tags.add(tag)
+        self.assertEqual(self._search('quick'), [recipe.id])
+
+        tag.name = 'Slow'
+        tag.save()
+        self.assertEqual(self._search('quick'), [])
+        self.assertEqual(self._search('slow'), [recipe.id])
+
+        recipe.tags.clear()
+        self.assertEqual(self._search('slow'), [])
+
+        recipe.title = 'Risotto'
+        recipe.save()
+        self.assertEqual(self._search('pasta'), [])
+
+        tag.recipe_set.add(recipe)
+        self.assertEqual(self._search('slow'), [recipe.id])
+        tag.delete()
+        self.assertEqual(self._search('slow'), [])
+
+    def test_search_paginates_by_rank(self):
+        """test ranked results can be paged through"""
+        recipes = [
+            create_recipe(self.user, title=f'Tomato soup {i}')
+            for i in range(5)
+        ]
+        res = self.client.get(
+            RECIPES_URL,
+            {'search': 'tomato', 'page_size': 2},
+        )
+        ids = [r['id'] for r in res.data['results']]
+        while res.data['next']:
+            res = self.client.get(res.data['next'])
+            ids.extend(r['id'] for r in res.data['results'])
+
+        self.assertCountEqual(ids, [r.id for r in recipes])
+
+    def test_search_pages_tied_ranks(self):
+        """test pages of equal ranks are keyset ranges, not offsets"""
+        recipes = [
+            create_recipe(self.user, title='Tomato soup') for _ in range(7)
+        ]
+        ids = []
+        url, params = RECIPES_URL, {'search': 'tomato', 'page_size': 2}
+        with CaptureQueriesContext(connection) as queries:
+            while url:
+                res = self.client.get(url, params)
+                ids.extend(r['id'] for r in res.data['results'])
+                url, params = res.data['next'], None
+
+        self.assertEqual(ids, [r.id for r in reversed(recipes)])
+        recipe_queries = [q['sql'] for q in queries.captured_queries
+                          if 'search' in q['sql'] or 'fts' in q['sql']]
+        self.assertTrue(recipe_queries)
+        for sql in recipe_queries:
+            self.assertNotIn('OFFSET', sql.upper())
+
+    def test_search_ignores_query_syntax(self):
+        """test punctuation in the search text is not an error"""
+        create_recipe(self.user, title='Fish and chips')
+
+        self.assertEqual(len(self._search('"fish" AND (chips')), 1)
+        self.assertEqual(self._search('!!!'), [])
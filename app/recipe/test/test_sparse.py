@@ -0,0 +1,123 @@
+"""
+test for sparse fieldsets on the recipe api
+"""
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.cache import caches
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (Ingredient, Recipe, Tag)
+from recipe.cache import API_CACHE_ALIAS
+from recipe.views import RecipeViewSet
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+TAGS_URL = reverse('recipe:tag-list')
+
+
+def detail_url(recipe_id):
+    """create and return a recipe detail url"""
+    return reverse('recipe:recipe-detail', args=[recipe_id])
+
+
+class SparseFieldsTests(TestCase):
+    """test ?fields= and ?omit= trim responses and queries"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='Soup',
+            time_minutes=10,
+            price=Decimal('5.50'),
+            description='hot soup',
+        )
+        self.recipe.tags.add(Tag.objects.create(user=self.user, name='Warm'))
+        self.recipe.ingredients.add(
+            Ingredient.objects.create(user=self.user, name='Water'),
+        )
+
+    def _get(self, url, params):
+        """return a response and the sql of its queries"""
+        with CaptureQueriesContext(connection) as ctx:
+            res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return res, [q['sql'] for q in ctx.captured_queries]
+
+    def test_list_fields(self):
+        """test the list only returns and loads the selected fields"""
+        for fast in (True, False):
+            caches[API_CACHE_ALIAS].clear()
+            with patch.object(RecipeViewSet, 'fast_list_serialization', fast):
+                res, queries = self._get(RECIPES_URL, {
+                    'fields': 'price,id,title',
+                })
+
+            self.assertEqual(res.data['results'], [
+                {'id': self.recipe.id, 'title': 'Soup', 'price': '5.50'},
+            ])
+            self.assertFalse(any('core_tag' in sql for sql in queries))
+            self.assertFalse(any('"link"' in sql for sql in queries))
+
+    def test_list_omit(self):
+        """test omitted relations are not prefetched"""
+        res, queries = self._get(RECIPES_URL, {'omit': 'tags'})
+
+        recipe = res.data['results'][0]
+        self.assertNotIn('tags', recipe)
+        self.assertEqual(recipe['ingredients'][0]['name'], 'Water')
+        self.assertFalse(any('core_tag' in sql for sql in queries))
+
+    def test_detail_fields(self):
+        """test the detail view honors the selection"""
+        res, queries = self._get(detail_url(self.recipe.id), {
+            'omit': 'description,tags,ingredients',
+        })
+
+        self.assertNotIn('description', res.data)
+        self.assertEqual(res.data['title'], 'Soup')
+        recipe_sql = [sql for sql in queries if '"title"' in sql]
+        self.assertEqual(len(recipe_sql), 1)
+        self.assertNotIn('"description"', recipe_sql[0])
+        self.assertFalse(any('core_tag' in sql for sql in queries))
+
+    def test_tag_fields(self):
+        """test sparse fieldsets on tags"""
+        res, _ = self._get(TAGS_URL, {'fields': 'id'})
+
+        self.assertEqual(res.data['results'], [
+            {'id': self.recipe.tags.get().id},
+        ])
+
+    def test_invalid_selection(self):
+        """test unknown fields and mixed parameters are rejected"""
+        for params in (
+            {'fields': 'id,secret'},
+            {'fields': 'id', 'omit': 'title'},
+        ):
+            res = self.client.get(RECIPES_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_writes_return_all_fields(self):
+        """test the selection does not apply to writes"""
+        res = self.client.patch(
+            f'{detail_url(self.recipe.id)}?fields=id',
+            {'title': 'Stew'},
+        )
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['title'], 'Stew')
+        self.assertIn('tags', res.data)
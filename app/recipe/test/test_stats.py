@@ -0,0 +1,183 @@
+"""
+test for the recipe statistics endpoint
+"""
+import io
+from decimal import Decimal
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (Recipe, RecipeStats, RecipeTimeBucket, Tag)
+from recipe.stats import (compute_stats, stored_stats)
+from recipe.test.utils import create_recipe
+
+
+STATS_URL = reverse('recipe:stats')
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+class RecipeStatsApiTests(TestCase):
+    """test the statistics endpoint and its maintained rows"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def assertConsistent(self):
+        """assert the maintained rows match a full recompute"""
+        self.assertEqual(
+            stored_stats(self.user.pk),
+            compute_stats(self.user.pk),
+        )
+
+    def test_auth_required(self):
+        """test statistics require authentication"""
+        res = APIClient().get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_empty(self):
+        """test a new user has empty statistics"""
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['recipe_count'], 0)
+        self.assertIsNone(res.data['average_price'])
+        self.assertEqual(len(res.data['time_minutes_histogram']), 8)
+        self.assertEqual(res.data['top_tags'], [])
+
+    def test_statistics(self):
+        """test counts, averages, histogram and top tags"""
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+        create_recipe(self.user, time_minutes=10, price=Decimal('4.00'))
+        create_recipe(self.user, time_minutes=50, price=Decimal('6.50'))
+        create_recipe(self.user, time_minutes=200, price=Decimal('2.00'))
+        for recipe in Recipe.objects.all()[:2]:
+            recipe.tags.add(tag)
+        create_recipe(
+            get_user_model().objects.create_user('o@example.com', 'pass'),
+            price=Decimal('99.00'),
+        )
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['recipe_count'], 3)
+        self.assertEqual(res.data['total_price'], '12.50')
+        self.assertEqual(res.data['average_price'], '4.17')
+        self.assertEqual(res.data['total_time_minutes'], 260)
+        self.assertEqual(res.data['average_time_minutes'], 86.7)
+        histogram = {
+            bucket['minutes_from']: bucket['count']
+            for bucket in res.data['time_minutes_histogram']
+        }
+        self.assertEqual(histogram[0], 1)
+        self.assertEqual(histogram[45], 1)
+        self.assertEqual(histogram[180], 1)
+        self.assertEqual(sum(histogram.values()), 3)
+        self.assertEqual(
+            res.data['top_tags'],
+            [{'id': tag.id, 'name': 'Dinner', 'recipe_count': 2}],
+        )
+
+    def test_maintained_incrementally(self):
+        """test edits and deletes update the rows without a recompute"""
+        recipe = create_recipe(self.user, time_minutes=10)
+        self.assertConsistent()
+
+        with CaptureQueriesContext(connection) as queries:
+            res = self.client.patch(
+                reverse('recipe:recipe-detail', args=[recipe.id]),
+                {'time_minutes': 95, 'price': '7.25'},
+            )
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertConsistent()
+        self.assertFalse(any(
+            'SUM(' in q['sql'] for q in queries.captured_queries
+        ))
+
+        recipe.title = 'Renamed'
+        recipe.save(update_fields=['title'])
+        create_recipe(self.user, time_minutes=95)
+        recipe.delete()
+        self.assertConsistent()
+        self.assertEqual(stored_stats(self.user.pk)['recipe_count'], 1)
+
+    def test_bulk_create_counted(self):
+        """test recipes created in bulk are counted"""
+        payload = [
+            {'title': f'Recipe {i}', 'time_minutes': 20, 'price': '3.00'}
+            for i in range(3)
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        self.assertConsistent()
+        self.assertEqual(stored_stats(self.user.pk)['recipe_count'], 3)
+
+    def test_missing_rows_rebuilt(self):
+        """test users without statistics get them computed"""
+        create_recipe(self.user)
+        RecipeStats.objects.all().delete()
+        RecipeTimeBucket.objects.all().delete()
+
+        res = self.client.get(STATS_URL)
+
+        self.assertEqual(res.data['recipe_count'], 1)
+        create_recipe(self.user)
+        self.assertConsistent()
+
+    def test_user_deleted(self):
+        """test deleting a user with recipes removes the statistics"""
+        create_recipe(self.user)
+
+        self.user.delete()
+
+        self.assertFalse(RecipeStats.objects.exists())
+        self.assertFalse(RecipeTimeBucket.objects.exists())
+
+
+class RebuildRecipeStatsCommandTests(TestCase):
+    """test checking and rebuilding the statistics"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        create_recipe(self.user, time_minutes=30)
+
+    def test_check_and_rebuild(self):
+        """test drift is reported by --check and repaired by a rebuild"""
+        out = io.StringIO()
+        call_command('rebuild_recipe_stats', '--check', stdout=out)
+        self.assertIn('Statistics of 1 users are correct', out.getvalue())
+
+        RecipeStats.objects.update(recipe_count=5)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_recipe_stats', '--check',
+                         stdout=io.StringIO())
+
+        call_command('rebuild_recipe_stats', '--user', 'user@example.com',
+                     stdout=io.StringIO())
+        self.assertEqual(
+            stored_stats(self.user.pk),
+            compute_stats(self.user.pk),
+        )
+
+    def test_unknown_user(self):
+        """test an unknown user is rejected"""
+        with self.assertRaises(CommandError):
+            call_command('rebuild_recipe_stats', '--user', 'x@example.com')
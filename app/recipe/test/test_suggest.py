@@ -0,0 +1,138 @@
+"""
+test for tag and ingredient suggestions
+"""
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (Ingredient, Tag)
+from recipe.test.utils import create_recipe
+
+
+TAG_SUGGEST_URL = reverse('recipe:tag-suggest')
+INGREDIENT_SUGGEST_URL = reverse('recipe:ingredient-suggest')
+
+
+class SuggestApiTests(TestCase):
+    """test the suggest endpoints"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _names(self, url, **params):
+        """return the suggested names"""
+        res = self.client.get(url, params)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        return [item['name'] for item in res.data]
+
+    def test_auth_required(self):
+        """test suggestions require authentication"""
+        res = APIClient().get(TAG_SUGGEST_URL, {'q': 'a'})
+
+        self.assertEqual(res.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_prefix_ranked_by_usage(self):
+        """test prefix matches are case insensitive, most used first"""
+        rare = Ingredient.objects.create(user=self.user, name='Tomato paste')
+        common = Ingredient.objects.create(user=self.user, name='tomato')
+        Ingredient.objects.create(user=self.user, name='Potato')
+        for _ in range(2):
+            create_recipe(self.user).ingredients.add(common)
+        create_recipe(self.user).ingredients.add(rare)
+
+        names = self._names(INGREDIENT_SUGGEST_URL, q='TOM')
+
+        self.assertEqual(names[:2], ['tomato', 'Tomato paste'])
+
+    def test_prefix_before_similar(self):
+        """test names containing the text follow the prefix matches"""
+        used = Tag.objects.create(user=self.user, name='Gluten free')
+        Tag.objects.create(user=self.user, name='Freezer')
+        create_recipe(self.user).tags.add(used)
+
+        names = self._names(TAG_SUGGEST_URL, q='free')
+
+        self.assertEqual(names, ['Freezer', 'Gluten free'])
+
+    def test_scoped_to_user(self):
+        """test only the user's own names are suggested"""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        Tag.objects.create(user=other, name='Vegan')
+        tag = Tag.objects.create(user=self.user, name='Vegetarian')
+
+        res = self.client.get(TAG_SUGGEST_URL, {'q': 've'})
+
+        self.assertEqual(res.data, [{'id': tag.id, 'name': 'Vegetarian'}])
+
+    def test_limit(self):
+        """test the number of suggestions is limited"""
+        Tag.objects.bulk_create([
+            Tag(
+                user=self.user,
+                name=f'Tag {i:02}',
+                normalized_name=f'tag {i:02}',
+            )
+            for i in range(15)
+        ])
+
+        self.assertEqual(len(self._names(TAG_SUGGEST_URL, q='tag')), 10)
+        self.assertEqual(
+            self._names(TAG_SUGGEST_URL, q='tag', limit=3),
+            ['Tag 00', 'Tag 01', 'Tag 02'],
+        )
+
+    def test_invalid_params(self):
+        """test missing text and bad limits are rejected"""
+        for params in ({}, {'q': ' '}, {'q': 'a' * 101},
+                       {'q': 'a', 'limit': 0}, {'q': 'a', 'limit': 'x'},
+                       {'q': 'a', 'limit': 51}):
+            res = self.client.get(TAG_SUGGEST_URL, params)
+            self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_single_query_for_prefix_matches(self):
+        """test a full page of prefix matches takes one query"""
+        Ingredient.objects.bulk_create([
+            Ingredient(
+                user=self.user,
+                name=f'Salt {i}',
+                normalized_name=f'salt {i}',
+            )
+            for i in range(20)
+        ])
+
+        with CaptureQueriesContext(connection) as queries:
+            self._names(INGREDIENT_SUGGEST_URL, q='salt', limit=5)
+
+        names = [q['sql'] for q in queries.captured_queries
+                 if 'core_ingredient' in q['sql']]
+        self.assertEqual(len(names), 1)
+
+    def test_cached_until_usage_changes(self):
+        """test suggestions are cached and refreshed when tags are used"""
+        first = Tag.objects.create(user=self.user, name='Lunch')
+        second = Tag.objects.create(user=self.user, name='Lunchbox')
+        res = self.client.get(TAG_SUGGEST_URL, {'q': 'lunch'})
+        self.assertEqual(res['X-Cache'], 'MISS')
+        res = self.client.get(TAG_SUGGEST_URL, {'q': 'lunch'})
+        self.assertEqual(res['X-Cache'], 'HIT')
+        self.assertEqual(res.data[0]['id'], first.id)
+
+        create_recipe(self.user).tags.add(second)
+
+        self.assertEqual(
+            self._names(TAG_SUGGEST_URL, q='lunch'),
+            ['Lunchbox', 'Lunch'],
+        )
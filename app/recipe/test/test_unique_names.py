@@ -0,0 +1,187 @@
+"""
+test tags and ingredients are unique per user by normalized name
+"""
+import importlib
+from decimal import Decimal
+
+from django.apps import apps
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.bulk import resolve_names
+from core.models import (Ingredient, Recipe, Tag, normalize_name)
+
+
+RECIPES_URL = reverse('recipe:recipe-list')
+BULK_URL = reverse('recipe:recipe-bulk')
+
+
+def tag_detail_url(tag_id):
+    """return a tag detail url"""
+    return reverse('recipe:tag-detail', args=(tag_id,))
+
+
+def recipe_payload(**params):
+    """return the payload of a sample recipe"""
+    payload = {
+        'title': 'Sample recipe',
+        'time_minutes': 10,
+        'price': '5.00',
+    }
+    payload.update(params)
+    return payload
+
+
+class NormalizedNameTests(TestCase):
+    """test names differing in case or spacing share one row"""
+
+    def setUp(self):
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_normalize_name(self):
+        """test case and inner spacing are folded"""
+        self.assertEqual(normalize_name('  Comfort \t FOOD '), 'comfort food')
+
+    def test_saved_name_is_normalized(self):
+        """test saving a row keeps its normalized name current"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        tag.name = 'Plant  Based'
+        tag.save(update_fields=['name'])
+
+        tag.refresh_from_db()
+        self.assertEqual(tag.normalized_name, 'plant based')
+
+    def test_create_recipe_reuses_variants(self):
+        """test tag spellings of one name resolve to one tag"""
+        tag = Tag.objects.create(user=self.user, name='Vegan')
+        payload = recipe_payload(
+            tags=[{'name': 'VEGAN'}, {'name': 'vegan'}],
+            ingredients=[{'name': 'Sea  Salt'}, {'name': 'sea salt'}],
+        )
+
+        res = self.client.post(RECIPES_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        recipe = Recipe.objects.get(pk=res.data['id'])
+        self.assertEqual(list(recipe.tags.all()), [tag])
+        ingredients = Ingredient.objects.filter(user=self.user)
+        self.assertEqual(ingredients.count(), 1)
+        # the first spelling of a new name is stored
+        self.assertEqual(ingredients.get().name, 'Sea  Salt')
+        self.assertEqual(list(recipe.ingredients.all()), list(ingredients))
+
+    def test_bulk_create_reuses_variants(self):
+        """test a batch of recipes shares one tag for every spelling"""
+        payload = [
+            recipe_payload(title=f'Recipe {i}', tags=[{'name': name}])
+            for i, name in enumerate(['Dinner', 'dinner', 'DINNER '])
+        ]
+
+        res = self.client.post(BULK_URL, payload, format='json')
+
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        tag = Tag.objects.get(user=self.user)
+        self.assertEqual(tag.recipe_count, 3)
+
+    def test_names_unique_per_user(self):
+        """test other users keep their own rows for a name"""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'testpass123',
+        )
+        Tag.objects.create(user=other, name='Vegan')
+
+        resolved = resolve_names(Tag, self.user, ['vegan'])
+
+        self.assertEqual(resolved['vegan'].user, self.user)
+        self.assertEqual(Tag.objects.count(), 2)
+
+    def test_concurrent_insert(self):
+        """test a row inserted by another writer first is read back"""
+        competing = Tag(user=self.user, name='VEGAN')
+
+        def insert_first(execute, sql, params, many, context):
+            # the other writer wins between our select and insert
+            if competing.pk is None and sql.startswith('INSERT') \
+                    and 'core_tag' in sql and 'Dinner' in params:
+                competing.save()
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(insert_first):
+            resolved = resolve_names(Tag, self.user, ['Vegan', 'Dinner'])
+
+        self.assertEqual(resolved['Vegan'], competing)
+        self.assertEqual(resolved['Dinner'].name, 'Dinner')
+        self.assertEqual(Tag.objects.filter(user=self.user).count(), 2)
+
+    def test_rename_to_taken_name(self):
+        """test renaming a tag to a name the user has is rejected"""
+        Tag.objects.create(user=self.user, name='Vegan')
+        tag = Tag.objects.create(user=self.user, name='Dinner')
+
+        res = self.client.patch(tag_detail_url(tag.id), {'name': 'vegan '})
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Dinner')
+
+    def test_rename_own_spelling(self):
+        """test changing only the case of a tag name is allowed"""
+        tag = Tag.objects.create(user=self.user, name='vegan')
+
+        res = self.client.patch(tag_detail_url(tag.id), {'name': 'Vegan'})
+
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        tag.refresh_from_db()
+        self.assertEqual(tag.name, 'Vegan')
+
+
+class MergeDuplicatesTests(TestCase):
+    """test the migration merging rows with the same normalized name"""
+
+    def test_merge_duplicates(self):
+        """test duplicates are merged into the oldest row"""
+        migration = importlib.import_module(
+            'core.migrations.0014_normalized_name',
+        )
+        user = get_user_model().objects.create_user(
+            'user@example.com',
+            'testpass123',
+        )
+        # distinct placeholders get past the constraint, as before it
+        keeper, duplicate, other = Tag.objects.bulk_create([
+            Tag(user=user, name=name, normalized_name=f'old {index}')
+            for index, name in enumerate(['Vegan', ' vegan', 'VEGAN'])
+        ])
+        if keeper.pk is None:
+            keeper, duplicate, other = Tag.objects.order_by('pk')
+        recipes = [
+            Recipe.objects.create(
+                user=user,
+                title=f'Recipe {index}',
+                time_minutes=10,
+                price=Decimal('5.00'),
+            )
+            for index in range(2)
+        ]
+        recipes[0].tags.add(keeper, duplicate)
+        recipes[1].tags.add(other)
+
+        migration.merge_duplicates(apps, None)
+
+        self.assertEqual(list(Tag.objects.all()), [keeper])
+        keeper.refresh_from_db()
+        self.assertEqual(keeper.normalized_name, 'vegan')
+        self.assertEqual(keeper.recipe_count, 2)
+        for recipe in recipes:
+            self.assertEqual(list(recipe.tags.all()), [keeper])
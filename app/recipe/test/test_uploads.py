@@ -0,0 +1,284 @@
+"""
+test for resumable image uploads
+"""
+import io
+import os
+import tempfile
+from datetime import timedelta
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import (TestCase, override_settings)
+from django.urls import reverse
+from django.utils import timezone
+
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from core.models import (Recipe, UploadSession)
+from recipe.images import delete_image_files
+from recipe.uploads import receive_chunk
+
+
+SESSIONS_URL = reverse('recipe:upload-session-list')
+
+
+def session_url(session_id):
+    """create and return an upload session url"""
+    return reverse('recipe:upload-session-detail', args=[session_id])
+
+
+def finalize_url(session_id):
+    """create and return the url finalizing an upload session"""
+    return reverse('recipe:upload-session-finalize', args=[session_id])
+
+
+def image_bytes():
+    """return the bytes of a sample jpeg"""
+    buffer = io.BytesIO()
+    Image.effect_noise((200, 200), 64).convert('RGB').save(
+        buffer,
+        format='JPEG',
+    )
+    return buffer.getvalue()
+
+
+class UploadSessionTests(TestCase):
+    """test chunked upload sessions"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmpdir.cleanup)
+        settings = override_settings(
+            UPLOAD_SESSIONS={
+                'ROOT': self.tmpdir.name,
+                'TTL': 3600,
+                'MAX_SIZE': 1024 * 1024,
+            },
+            IMAGE_PROCESSING={'BACKEND': 'sync', 'WORKERS': 1},
+        )
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client = APIClient()
+        self.user = get_user_model().objects.create_user(
+            'user@example.com',
+            'password123',
+        )
+        self.client.force_authenticate(self.user)
+        self.recipe = Recipe.objects.create(
+            user=self.user,
+            title='sample recipe',
+            time_minutes=10,
+            price=Decimal('5.00'),
+        )
+        self.data = image_bytes()
+
+    def tearDown(self):
+        self.recipe.refresh_from_db()
+        if self.recipe.image:
+            delete_image_files(self.recipe.image.name)
+
+    def _create_session(self, size=None):
+        """create a session for the sample image and return its id"""
+        res = self.client.post(SESSIONS_URL, {
+            'recipe': self.recipe.id,
+            'filename': 'photo.jpg',
+            'size': len(self.data) if size is None else size,
+        })
+        self.assertEqual(res.status_code, status.HTTP_201_CREATED)
+        return res.data['id']
+
+    def _put(self, session_id, first, last, body=None):
+        """send a chunk of the sample image"""
+        if body is None:
+            body = self.data[first:last + 1]
+        return self.client.put(
+            session_url(session_id),
+            body,
+            content_type='application/octet-stream',
+            HTTP_CONTENT_RANGE=f'bytes {first}-{last}/{len(self.data)}',
+        )
+
+    def test_chunked_upload(self):
+        """test uploading in chunks and finalizing attaches the image"""
+        session_id = self._create_session()
+        size = len(self.data)
+        middle = size // 2
+
+        res = self._put(session_id, 0, middle - 1)
+        self.assertEqual(res.status_code, status.HTTP_200_OK)
+        self.assertEqual(res.data['received'], middle)
+        res = self._put(session_id, middle, size - 1)
+        self.assertEqual(res.data['received'], size)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            res = self.client.post(finalize_url(session_id))
+
+        self.assertEqual(res.status_code, status.HTTP_202_ACCEPTED)
+        self.recipe.refresh_from_db()
+        self.assertEqual(self.recipe.image_status, 'ready')
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertEqual(os.listdir(self.tmpdir.name), [])
+
+    def test_resume_after_interrupted_chunk(self):
+        """test a chunk cut short is resumed from the received offset"""
+        session_id = self._create_session()
+        size = len(self.data)
+
+        # the body ends before the announced range
+        res = self._put(session_id, 0, size - 1, self.data[:100])
+        self.assertEqual(res.data['received'], 100)
+
+        res = self.client.get(session_url(session_id))
+        self.assertEqual(res.data['received'], 100)
+
+        # a retry overlapping received bytes is trimmed
+        res = self._put(session_id, 50, size - 1)
+        self.assertEqual(res.data['received'], size)
+        with open(UploadSession.objects.get().path, 'rb') as f:
+            self.assertEqual(f.read(), self.data)
+
+    def test_chunk_received_without_lock(self):
+        """test the body is streamed before a transaction is opened"""
+        session_id = self._create_session()
+        outer = len(connection.savepoint_ids)
+        depths = []
+
+        def receive(*args):
+            depths.append(len(connection.savepoint_ids))
+            return receive_chunk(*args)
+
+        with patch('recipe.views.receive_chunk', receive):
+            res = self._put(session_id, 0, 99)
+
+        self.assertEqual(res.data['received'], 100)
+        self.assertEqual(depths, [outer])
+
+    def test_concurrent_chunk_dropped(self):
+        """test a chunk losing to another one is not appended"""
+        session_id = self._create_session()
+        self._put(session_id, 0, 99)
+
+        def receive(session, *args):
+            path = receive_chunk(session, *args)
+            # another chunk is appended while this one streams
+            with open(session.path, 'ab') as partial:
+                partial.write(self.data[100:150])
+            UploadSession.objects.filter(pk=session.pk).update(received=150)
+            return path
+
+        with patch('recipe.views.receive_chunk', receive):
+            res = self._put(session_id, 100, 199)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['received'], 150)
+        session = UploadSession.objects.get()
+        with open(session.path, 'rb') as f:
+            self.assertEqual(f.read(), self.data[:150])
+        self.assertEqual(os.listdir(self.tmpdir.name), [f'{session_id}.part'])
+
+    def test_chunk_past_offset_rejected(self):
+        """test a chunk leaving a gap reports the offset to resume from"""
+        session_id = self._create_session()
+
+        res = self._put(session_id, 10, 20)
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['received'], 0)
+
+    def test_invalid_content_range(self):
+        """test chunks need a range within the announced size"""
+        session_id = self._create_session()
+        size = len(self.data)
+
+        res = self._put(session_id, 0, size)
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+        res = self.client.put(
+            session_url(session_id),
+            self.data,
+            content_type='application/octet-stream',
+        )
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_finalize_incomplete(self):
+        """test an incomplete upload can not be finalized"""
+        session_id = self._create_session()
+        self._put(session_id, 0, 99)
+
+        res = self.client.post(finalize_url(session_id))
+
+        self.assertEqual(res.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(res.data['received'], 100)
+
+    def test_finalize_invalid_image(self):
+        """test finalizing validates the file like direct uploads"""
+        self.data = b'not an image' * 10
+        session_id = self._create_session()
+        self._put(session_id, 0, len(self.data) - 1)
+
+        res = self.client.post(finalize_url(session_id))
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('image', res.data)
+
+    def test_size_limit(self):
+        """test sessions above the size limit are rejected"""
+        res = self.client.post(SESSIONS_URL, {
+            'recipe': self.recipe.id,
+            'filename': 'photo.jpg',
+            'size': 1024 * 1024 + 1,
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_other_users_recipe_rejected(self):
+        """test sessions can not target recipes of other users"""
+        other = get_user_model().objects.create_user(
+            'other@example.com',
+            'password123',
+        )
+        self.recipe.user = other
+        self.recipe.save()
+
+        res = self.client.post(SESSIONS_URL, {
+            'recipe': self.recipe.id,
+            'filename': 'photo.jpg',
+            'size': 100,
+        })
+        missing = self.client.post(SESSIONS_URL, {
+            'recipe': self.recipe.id + 1,
+            'filename': 'photo.jpg',
+            'size': 100,
+        })
+
+        self.assertEqual(res.status_code, status.HTTP_400_BAD_REQUEST)
+        # the same error as for a recipe that does not exist
+        self.assertEqual(
+            str(res.data['recipe'][0]),
+            str(missing.data['recipe'][0]).replace(
+                str(self.recipe.id + 1),
+                str(self.recipe.id),
+            ),
+        )
+
+    def test_expired_sessions_purged(self):
+        """test expired sessions are gone and their files deleted"""
+        session_id = self._create_session()
+        self._put(session_id, 0, 99)
+        session = UploadSession.objects.get()
+        session.expires_at = timezone.now() - timedelta(seconds=1)
+        session.save()
+
+        res = self.client.get(session_url(session_id))
+        self.assertEqual(res.status_code, status.HTTP_404_NOT_FOUND)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('purge_upload_sessions', stdout=io.StringIO())
+
+        self.assertFalse(UploadSession.objects.exists())
+        self.assertFalse(os.path.exists(session.path))
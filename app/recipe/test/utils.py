@@ -0,0 +1,19 @@
+"""
+helpers shared by the recipe tests
+"""
+from decimal import Decimal
+
+from core.models import Recipe
+
+
+def create_recipe(user, **params):
+    """create and return a sample recipe"""
+    defaults = {
+        'title': 'sample recipe title',
+        'time_minutes': 22,
+        'price': Decimal('5.25'),
+        'description': 'sample description',
+        'link': 'http://example.com/recipe.pdf',
+    }
+    defaults.update(params)
+    return Recipe.objects.create(user=user, **defaults)
@@ -0,0 +1,115 @@
+"""
+resumable chunked uploads of recipe images
+
+a session records the expected size and how many bytes arrived. chunks are
+sent as byte ranges, a chunk overlapping bytes already received is
+trimmed, so a client can always resume from the offset the session
+reports. abandoned sessions expire.
+
+a chunk is streamed onto a file of its own without a lock, a slow client
+holds no transaction. only then is the session locked, and the chunk
+appended to the partial file unless another chunk came first.
+"""
+import glob
+import os
+import re
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from core.models import UploadSession
+
+
+# bytes read from the request per write
+CHUNK_SIZE = 64 * 1024
+CONTENT_RANGE = re.compile(r'^bytes (\d+)-(\d+)/(\d+|\*)$')
+
+
+def session_expiry():
+    """return the expiry time of a session touched now"""
+    return timezone.now() + timedelta(seconds=settings.UPLOAD_SESSIONS['TTL'])
+
+
+def parse_content_range(header, size):
+    """return the first byte and length of a Content-Range header
+
+    returns None when the header is missing, malformed or does not fit
+    an upload of the given size.
+    """
+    match = CONTENT_RANGE.match(header or '')
+    if match is None:
+        return None
+    first, last, total = match.groups()
+    first, last = int(first), int(last)
+    if last < first or last >= size or total not in ('*', str(size)):
+        return None
+    return first, last - first + 1
+
+
+def receive_chunk(session, stream, first, length):
+    """stream a byte range of a session onto a chunk file, returning its path
+
+    bytes before the received offset are skipped, the range must not
+    start past it. the chunk is shorter than the range when the request
+    body ended early.
+    """
+    skip = session.received - first
+    remaining = length
+    os.makedirs(os.path.dirname(session.path), exist_ok=True)
+    fd, path = tempfile.mkstemp(
+        dir=os.path.dirname(session.path),
+        prefix=f'{os.path.basename(session.path)}.',
+        suffix='.chunk',
+    )
+    try:
+        with os.fdopen(fd, 'wb') as chunk:
+            while remaining > 0:
+                data = stream.read(min(CHUNK_SIZE, remaining))
+                if not data:
+                    break
+                remaining -= len(data)
+                if skip > 0:
+                    data, skip = data[skip:], max(skip - len(data), 0)
+                chunk.write(data)
+    except BaseException:
+        discard_chunk(path)
+        raise
+    return path
+
+
+def append_chunk(session, path):
+    """append a received chunk to the partial file of a session
+
+    the session has to be locked and still at the offset the chunk was
+    received for. returns the number of bytes appended.
+    """
+    with open(session.path, 'ab') as partial, open(path, 'rb') as chunk:
+        # drop bytes of a write that was not recorded in the session
+        partial.truncate(session.received)
+        shutil.copyfileobj(chunk, partial, CHUNK_SIZE)
+        return partial.tell() - session.received
+
+
+def discard_chunk(path):
+    """delete a received chunk"""
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def discard_upload(path):
+    """delete the partial file of a session and chunks left behind"""
+    for name in [path, *glob.glob(f'{glob.escape(path)}.*.chunk')]:
+        discard_chunk(name)
+
+
+def purge_expired_sessions():
+    """delete expired sessions, returning how many were deleted"""
+    count, _ = UploadSession.objects.filter(
+        expires_at__lte=timezone.now(),
+    ).delete()
+    return count
@@ -15,9 +15,20 @@ router = DefaultRouter()
 router.register('recipe', views.RecipeViewSet)
 router.register('tags', views.TagViewSet)
 router.register('ingredients', views.IngredientViewSet)
+router.register(
+    'upload-sessions',
+    views.UploadSessionViewSet,
+    basename='upload-session',
+)
 
 app_name = 'recipe'
 
 urlpatterns = [
     path('', include(router.urls)),
+    path('stats/', views.RecipeStatsView.as_view(), name='stats'),
+    path(
+        'images/<slug:key>/<slug:variant>.<slug:ext>',
+        views.image_variant,
+        name='image-variant',
+    ),
 ]
@@ -2,33 +2,223 @@
 view for the recipe api
 """
 
-from rest_framework import (viewsets, mixins, status)
+from asgiref.sync import sync_to_async
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import (Exists, OuterRef, Prefetch)
+from django.http import (Http404, HttpResponse, HttpResponseNotAllowed)
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+
+from drf_spectacular.utils import (
+    extend_schema_view,
+    extend_schema,
+    OpenApiParameter,
+    OpenApiTypes,
+)
+
+from rest_framework import (generics, viewsets, mixins, status)
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
-from rest_framework.authentication import TokenAuthentication
 from rest_framework.permissions import IsAuthenticated
 
-from core.models import (Recipe, Tag, Ingredient)
+from core.authentication import CachedTokenAuthentication
+from core.models import (Recipe, Tag, Ingredient, UploadSession)
+from recipe.cache import cache_response
+from recipe.conditional import (
+    conditional,
+    detail_validators,
+    list_validators,
+)
+from recipe.images import (
+    ensure_variant,
+    schedule_image_processing,
+    variant_formats,
+    variant_key,
+    variant_name,
+    VARIANTS,
+)
+from recipe.search import search_recipes
+from recipe.stats import user_stats
+from recipe.sparse import (SPARSE_PARAMETERS, SparseFieldsMixin)
+from recipe.suggest import (
+    MAX_QUERY_LENGTH,
+    MAX_SUGGEST_LIMIT,
+    SUGGEST_LIMIT,
+    suggest_names,
+)
+from recipe.uploads import (
+    append_chunk,
+    discard_chunk,
+    parse_content_range,
+    purge_expired_sessions,
+    receive_chunk,
+    session_expiry,
+)
+from recipe.pagination import (
+    RecipeCursorPagination,
+    RecipeAttrCursorPagination,
+)
 from recipe.serializers import (
     RecipeSerializers,
     RecipeDetailSerializers,
     TagSerializer,
     IngredientSerializer,
     RecipeImageSerializer,
+    RecipeStatsSerializer,
+    UploadSessionSerializer,
+    RecipeListReader,
 )
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+def _params_to_ints(qs):
+    """convert a comma separated list of ids to integers"""
+    try:
+        return [int(str_id) for str_id in qs.split(',')]
+    except ValueError:
+        raise ValidationError('Expected a comma separated list of ids.')
+
+
+def _through_rows(field_name):
+    """return the through model rows and target column for a recipe m2m"""
+    field = Recipe._meta.get_field(field_name)
+    through = field.remote_field.through
+    return through.objects.all(), f'{field.m2m_reverse_field_name()}_id'
+
+
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'tags',
+                OpenApiTypes.STR,
+                description='Comma separated list of tag IDs to filter',
+            ),
+            OpenApiParameter(
+                'ingredients',
+                OpenApiTypes.STR,
+                description='Comma separated list of ingredient IDs to filter',
+            ),
+            OpenApiParameter(
+                'match',
+                OpenApiTypes.STR,
+                enum=['any', 'all'],
+                description='Match any (default) or all of the given IDs',
+            ),
+            OpenApiParameter(
+                'search',
+                OpenApiTypes.STR,
+                description='Full text search, results ordered by rank',
+            ),
+        ] + SPARSE_PARAMETERS
+    ),
+    retrieve=extend_schema(parameters=SPARSE_PARAMETERS),
+)
+class RecipeViewSet(SparseFieldsMixin, viewsets.ModelViewSet):
     """view for manage recipe API"""
     serializer_class = RecipeDetailSerializers
     queryset = Recipe.objects.all()
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeCursorPagination
+    cache_resource = 'recipe'
+    bulk_max_items = 1000
+    # serialize lists from values() rows, see RecipeListReader
+    fast_list_serialization = True
+    sparse_field_sources = {'image_variants': ('image', 'image_status')}
+
+    @conditional(list_validators)
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        """list recipes through the response cache"""
+        if not self.fast_list_serialization:
+            return super().list(request, *args, **kwargs)
+        reader = RecipeListReader(
+            self.get_serializer_context(),
+            self.get_sparse_fields(),
+        )
+        ordering = self.get_cursor_ordering() or ()
+        page = self.paginate_queryset(reader.rows(
+            self.filter_queryset(self.get_queryset()),
+            *(field.lstrip('-') for field in ordering),
+        ))
+        return self.get_paginated_response(reader.to_representation(page))
 
+    @conditional(detail_validators)
+    @cache_response
+    def retrieve(self, request, *args, **kwargs):
+        """retrieve a recipe through the response cache"""
+        return super().retrieve(request, *args, **kwargs)
+
+    @conditional(detail_validators)
+    def update(self, request, *args, **kwargs):
+        """update a recipe, honoring If-Match"""
+        return super().update(request, *args, **kwargs)
+
+    @conditional(detail_validators)
+    def destroy(self, request, *args, **kwargs):
+        """delete a recipe, honoring If-Match"""
+        return super().destroy(request, *args, **kwargs)
+
+    def _filter_by_relation(self, queryset, field_name, ids, match):
+        """filter recipes with an EXISTS over the m2m through table"""
+        rows, target = _through_rows(field_name)
+        rows = rows.filter(recipe_id=OuterRef('pk'))
+        if match == 'all':
+            for pk in set(ids):
+                queryset = queryset.filter(Exists(rows.filter(**{target: pk})))
+            return queryset
+        return queryset.filter(Exists(rows.filter(**{f'{target}__in': ids})))
 
     def get_queryset(self):
         """retrieve query set for authenticated user"""
-        return self.queryset.filter(user=self.request.user).order_by('-id')
+        queryset = self.queryset.filter(user=self.request.user)
+        match = self.request.query_params.get('match', 'any')
+        if match not in ('any', 'all'):
+            raise ValidationError({'match': 'Expected "any" or "all".'})
+        for field_name in ('tags', 'ingredients'):
+            ids = self.request.query_params.get(field_name)
+            if ids:
+                queryset = self._filter_by_relation(
+                    queryset,
+                    field_name,
+                    _params_to_ints(ids),
+                    match,
+                )
+        if self.get_search_text():
+            queryset = search_recipes(queryset, self.get_search_text())
+
+        queryset = self.sparse_queryset(self._with_relations(queryset))
+        return queryset.order_by('-id')
+
+    def _with_relations(self, queryset):
+        """prefetch the tags and ingredients the response includes"""
+        selected = self.get_sparse_fields()
+        return queryset.prefetch_related(*(
+            Prefetch(field_name, queryset=model.objects.order_by('id'))
+            for field_name, model in (
+                ('tags', Tag),
+                ('ingredients', Ingredient),
+            )
+            if selected is None or field_name in selected
+        ))
+
+    def get_search_text(self):
+        """return the full text search query of the request"""
+        return self.request.query_params.get('search', '').strip()
+
+    def get_cursor_ordering(self):
+        """order search results by rank, newest first otherwise
+
+        the cursor of search results holds the rank and id, so pages of
+        equal ranks are ranges too.
+        """
+        if self.get_search_text():
+            return ('-search_rank', '-id')
+        return None
 
     def get_serializer_class(self):
         """return the serializer class for request"""
@@ -41,44 +231,388 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         """create a new recipe"""
         serializer.save(user=self.request.user)
-        return super().perform_create(serializer)
 
     @action(methods=['POST'], detail=True, url_path='upload-image')
     def upload_image(self, request, pk=None):
-        """function for uploading image to recipe"""
+        """function for uploading image to recipe
+
+        the upload is stored and processed in the background, the
+        response reports the pending ``image_status``.
+        """
         recipe = self.get_object()
+        previous = recipe.image.name
         serializer = self.get_serializer(recipe, data=request.data)
         if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data,  status=status.HTTP_200_OK)
+            serializer.save(image_status=Recipe.ImageStatus.PENDING)
+            schedule_image_processing(recipe, previous)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
 
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
+    def _get_bulk_instances(self, items):
+        """return the recipes referenced by the ids of a bulk update"""
+        ids = [item.get('id') if isinstance(item, dict) else None
+               for item in items]
+        found = self.queryset.filter(
+            user=self.request.user,
+            pk__in=[pk for pk in ids if isinstance(pk, int)],
+        ).in_bulk()
+        errors, seen = [], set()
+        for pk in ids:
+            if pk not in found:
+                errors.append({'id': ['Unknown recipe id.']})
+            elif pk in seen:
+                errors.append({'id': ['Duplicate recipe id.']})
+            else:
+                errors.append({})
+            seen.add(pk)
+        if any(errors):
+            raise ValidationError(errors)
+        return [found[pk] for pk in ids]
+
+    @extend_schema(
+        request=RecipeDetailSerializers(many=True),
+        responses=RecipeDetailSerializers(many=True),
+    )
+    @action(methods=['POST', 'PATCH'], detail=False, url_path='bulk')
+    def bulk(self, request):
+        """create (POST) or partially update (PATCH) many recipes
+
+        the whole batch is validated first, errors are reported per item
+        in request order, and all writes happen in one transaction.
+        """
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError('Expected a list of recipes.')
+        if len(items) > self.bulk_max_items:
+            raise ValidationError(
+                f'At most {self.bulk_max_items} recipes per request.'
+            )
+
+        is_update = request.method == 'PATCH'
+        instance = self._get_bulk_instances(items) if is_update else None
+        serializer = self.get_serializer(
+            instance,
+            data=items,
+            many=True,
+            partial=is_update,
+        )
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic():
+            if is_update:
+                recipes = serializer.save()
+            else:
+                recipes = serializer.save(user=request.user)
+
+        ids = [recipe.pk for recipe in recipes]
+        saved = self._with_relations(self.queryset).in_bulk(ids)
+        serializer = self.get_serializer([saved[pk] for pk in ids], many=True)
+        code = status.HTTP_200_OK if is_update else status.HTTP_201_CREATED
+        return Response(serializer.data, status=code)
+
 
 
-class BaseRecipeAttrrViewSet(mixins.UpdateModelMixin,
-                mixins.DestroyModelMixin,
-                 mixins.ListModelMixin,
-                 viewsets.GenericViewSet):
+@extend_schema_view(
+    list=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'assigned_only',
+                OpenApiTypes.INT,
+                enum=[0, 1],
+                description='Filter by items assigned to recipes',
+            ),
+            OpenApiParameter(
+                'ordering',
+                OpenApiTypes.STR,
+                enum=['name', '-name', 'recipe_count', '-recipe_count'],
+                description='Order by name (default -name) or usage',
+            ),
+        ]
+    )
+)
+@extend_schema_view(list=extend_schema(parameters=SPARSE_PARAMETERS))
+@extend_schema_view(
+    suggest=extend_schema(
+        parameters=[
+            OpenApiParameter(
+                'q',
+                OpenApiTypes.STR,
+                required=True,
+                description='Typed text to complete',
+            ),
+            OpenApiParameter(
+                'limit',
+                OpenApiTypes.INT,
+                description=f'Number of suggestions, at most '
+                            f'{MAX_SUGGEST_LIMIT}',
+            ),
+        ] + SPARSE_PARAMETERS
+    )
+)
+class BaseRecipeAttrrViewSet(SparseFieldsMixin,
+                             mixins.UpdateModelMixin,
+                             mixins.DestroyModelMixin,
+                             mixins.ListModelMixin,
+                             viewsets.GenericViewSet):
     """Base User for recipe attributes"""
-    authentication_classes = [TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [IsAuthenticated]
+    pagination_class = RecipeAttrCursorPagination
+    # recipe_count is read by the cursor when ordering by it
+    sparse_required_fields = ('id', 'name', 'recipe_count')
+    ordering_fields = ('name', 'recipe_count')
 
     def get_queryset(self):
         """filter query set to authenticated user"""
-        return self.queryset.filter(user = self.request.user).order_by('-name')
+        queryset = self.queryset.filter(user=self.request.user)
+        assigned_only = self.request.query_params.get('assigned_only', '0')
+        if assigned_only not in ('0', '1'):
+            raise ValidationError({'assigned_only': 'Expected 0 or 1.'})
+        if assigned_only == '1':
+            rows, target = _through_rows(self.recipe_field)
+            queryset = queryset.filter(
+                Exists(rows.filter(**{target: OuterRef('pk')}))
+            )
+        return self.sparse_queryset(queryset).order_by('-name')
+
+    def get_cursor_ordering(self):
+        """order by ``?ordering=``, the cursor pages on the field and id"""
+        ordering = self.request.query_params.get('ordering')
+        if not ordering:
+            return None
+        if ordering.lstrip('-') not in self.ordering_fields:
+            raise ValidationError({
+                'ordering': 'Expected one of '
+                            f'{", ".join(self.ordering_fields)}, '
+                            'optionally prefixed with -.',
+            })
+        direction = '-' if ordering.startswith('-') else ''
+        return (ordering, f'{direction}id')
+
+    @cache_response
+    def list(self, request, *args, **kwargs):
+        """list items through the response cache"""
+        return super().list(request, *args, **kwargs)
+
+    def _suggest_params(self):
+        """return the validated text and limit of a suggest request"""
+        params = self.request.query_params
+        text = params.get('q', '').strip()
+        if not text:
+            raise ValidationError({'q': 'This parameter is required.'})
+        if len(text) > MAX_QUERY_LENGTH:
+            raise ValidationError({
+                'q': f'At most {MAX_QUERY_LENGTH} characters.',
+            })
+        try:
+            limit = int(params.get('limit', SUGGEST_LIMIT))
+        except ValueError:
+            limit = 0
+        if not 1 <= limit <= MAX_SUGGEST_LIMIT:
+            raise ValidationError({
+                'limit': f'Expected 1 to {MAX_SUGGEST_LIMIT}.',
+            })
+        return text, limit
+
+    @action(methods=['GET'], detail=False)
+    @cache_response
+    def suggest(self, request):
+        """complete typed text, prefix matches first, most used first"""
+        text, limit = self._suggest_params()
+        suggestions = suggest_names(
+            self.queryset.filter(user=request.user),
+            text,
+            limit,
+        )
+        serializer = self.get_serializer(suggestions, many=True)
+        return Response(serializer.data)
 
 
 class TagViewSet(BaseRecipeAttrrViewSet):
     """manage tags in the database"""
     serializer_class = TagSerializer
     queryset = Tag.objects.all()
+    recipe_field = 'tags'
+    cache_resource = 'tag'
 
 
 class IngredientViewSet(BaseRecipeAttrrViewSet):
     """manage tags in the database"""
     serializer_class = IngredientSerializer
     queryset = Ingredient.objects.all()
+    recipe_field = 'ingredients'
+    cache_resource = 'ingredient'
+
+
+class UploadSessionViewSet(mixins.CreateModelMixin,
+                           mixins.RetrieveModelMixin,
+                           mixins.DestroyModelMixin,
+                           viewsets.GenericViewSet):
+    """resumable image uploads
+
+    create a session, PUT byte ranges with a ``Content-Range`` header and
+    finalize it to attach the image to its recipe. the session reports the
+    received offset to resume from after a failed chunk.
+    """
+    serializer_class = UploadSessionSerializer
+    queryset = UploadSession.objects.all()
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_queryset(self):
+        """filter to the unexpired sessions of the authenticated user"""
+        return self.queryset.filter(
+            user=self.request.user,
+            expires_at__gt=timezone.now(),
+        )
+
+    def perform_create(self, serializer):
+        """create a new session, dropping expired ones"""
+        purge_expired_sessions()
+        serializer.save(user=self.request.user, expires_at=session_expiry())
+
+    def _get_locked_session(self):
+        """return the requested session, locked until the transaction ends"""
+        return get_object_or_404(
+            self.get_queryset().select_for_update(),
+            pk=self.kwargs['pk'],
+        )
+
+    def _incomplete(self, session):
+        """return the response sent when bytes are missing"""
+        return Response(
+            {'received': session.received},
+            status=status.HTTP_409_CONFLICT,
+        )
+
+    @extend_schema(
+        request={'application/octet-stream': OpenApiTypes.BINARY},
+        parameters=[
+            OpenApiParameter(
+                'Content-Range',
+                OpenApiTypes.STR,
+                OpenApiParameter.HEADER,
+                required=True,
+                description='Byte range of the chunk, e.g. bytes 0-1023/4096',
+            ),
+        ],
+    )
+    def update(self, request, *args, **kwargs):
+        """append a byte range to the upload
+
+        the body is received before the session is locked, a chunk that
+        lost to another one is dropped with the offset to resume from.
+        """
+        session = self.get_object()
+        byte_range = parse_content_range(
+            request.META.get('HTTP_CONTENT_RANGE'),
+            session.size,
+        )
+        if byte_range is None:
+            raise ValidationError({
+                'Content-Range': 'Expected a byte range within the size.',
+            })
+        first, length = byte_range
+        if first > session.received:
+            return self._incomplete(session)
+        chunk = receive_chunk(session, request, first, length)
+        try:
+            with transaction.atomic():
+                locked = self._get_locked_session()
+                if locked.received != session.received:
+                    return self._incomplete(locked)
+                locked.received += append_chunk(locked, chunk)
+                locked.expires_at = session_expiry()
+                locked.save(update_fields=['received', 'expires_at'])
+        finally:
+            discard_chunk(chunk)
+        return Response(self.get_serializer(locked).data)
+
+    @extend_schema(request=None, responses={202: RecipeImageSerializer})
+    @action(methods=['POST'], detail=True)
+    def finalize(self, request, pk=None):
+        """attach the complete upload to the recipe"""
+        with transaction.atomic():
+            session = self._get_locked_session()
+            if session.received < session.size:
+                return self._incomplete(session)
+            recipe = session.recipe
+            previous = recipe.image.name
+            with open(session.path, 'rb') as upload:
+                serializer = RecipeImageSerializer(
+                    recipe,
+                    data={'image': File(upload, name=session.filename)},
+                    context=self.get_serializer_context(),
+                )
+                serializer.is_valid(raise_exception=True)
+                serializer.save(image_status=Recipe.ImageStatus.PENDING)
+            schedule_image_processing(recipe, previous)
+            session.delete()
+        return Response(serializer.data, status=status.HTTP_202_ACCEPTED)
+
+
+class RecipeStatsView(generics.RetrieveAPIView):
+    """statistics of the authenticated user's recipes
+
+    read from maintained totals, see recipe.stats, so the cost does not
+    grow with the number of recipes.
+    """
+    serializer_class = RecipeStatsSerializer
+    authentication_classes = [CachedTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get_object(self):
+        """return the statistics of the authenticated user"""
+        return user_stats(self.request.user)
+
+
+VARIANT_CONTENT_TYPES = {
+    'avif': 'image/avif',
+    'webp': 'image/webp',
+    'jpg': 'image/jpeg',
+    'png': 'image/png',
+}
+# a year, the longest lifetime caches are expected to honor
+VARIANT_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def _variant_content(key, variant, ext):
+    """return the bytes of a variant, rendering it when missing"""
+    path = variant_name(key, variant, ext)
+    if not default_storage.exists(path):
+        name = Recipe.objects.filter(
+            image_key=key,
+            image_status=Recipe.ImageStatus.READY,
+        ).values_list('image', flat=True).first()
+        if (
+            name is None
+            or variant_key(name) != key
+            or ext not in variant_formats(name)
+        ):
+            raise Http404
+        path = ensure_variant(name, variant, ext)
+    with default_storage.open(path, 'rb') as variant_file:
+        return variant_file.read()
 
 
+async def image_variant(request, key, variant, ext):
+    """serve a recipe image variant from the derivative cache
 
+    variant paths change with every upload, so responses are immutable.
+    missing variants of processed images are rendered on first request.
+    the file is read on the request's thread, under asgi django would
+    otherwise stream it from the event loop.
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return HttpResponseNotAllowed(['GET', 'HEAD'])
+    if variant not in VARIANTS or ext not in VARIANT_CONTENT_TYPES:
+        raise Http404
+    content = await sync_to_async(_variant_content)(key, variant, ext)
+    response = HttpResponse(content, content_type=VARIANT_CONTENT_TYPES[ext])
+    patch_cache_control(
+        response,
+        public=True,
+        max_age=VARIANT_MAX_AGE,
+        immutable=True,
+    )
+    return response
@@ -2,11 +2,13 @@
 user view for the user api
 """
 
-from rest_framework import generics, authentication, permissions
+from rest_framework import generics, permissions
 from user.serielizers import (UserSerielizers, AuthTokenSerilizer)
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.settings import api_settings
 
+from core.authentication import CachedTokenAuthentication
+
 # Create your views here.
 
 class CreateUserView(generics.CreateAPIView):
@@ -22,7 +24,7 @@ class CreateTokenView(ObtainAuthToken):
 class ManageUserView(generics.RetrieveUpdateAPIView):
     """manage authenticated user"""
     serializer_class = UserSerielizers
-    authentication_classes = [authentication.TokenAuthentication]
+    authentication_classes = [CachedTokenAuthentication]
     permission_classes = [permissions.IsAuthenticated]
 
     def get_object(self):